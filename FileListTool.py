@@ -29,11 +29,11 @@ class DatasetEntry(urwid.WidgetWrap):
         self.path    = path
 
         self.item = [
-                    ('fixed', 15, urwid.Padding(urwid.AttrWrap(urwid.Text('%s' % str(dataset)), 'body', 'focus'), left=2)),
-                    urwid.AttrWrap(urwid.Text('%s' % path), 'body', 'focus'),
+                    ('fixed', 15, '  %s' % str(dataset)),
+                    '%s' % path,
                     ]
 
-        w = urwid.Columns(self.item)
+        w = urwid.TextRow(self.item, attr='body', focus_attr='focus')
         super(DatasetEntry, self).__init__(w)
 
 
@@ -267,17 +267,23 @@ class FileListTool():
                           urwid.Padding( urwid.Button (   'n : set negative tags'   ), left=1, right=1)  ,
                           urwid.Padding( urwid.Button (   'q : Quit'                ), left=1, right=1)  ]
         header = urwid.AttrMap( urwid.Columns( headerButtons    ), 'head' )
-        footer = urwid.AttrMap( urwid.Text   ('selected: %d   |' % 0 ), 'head' )
+        # the status bar is kept and its fields updated in place
+        self.statusBar = urwid.StatusBar( [ ('selected', 'selected: %-6d|', 17), ('message', '%s') ], dividechars=3, attr='head' )
+        self.statusBar.set_fields( selected=0, message='' )
+        footer = self.statusBar
 
         # Create Sample Widgets
-        self.datasetList  = urwid.SimpleListWalker( datasetEntries )
+        self.datasetList  = urwid.IndexedListWalker( datasetEntries )
         self.selectedList = urwid.SimpleListWalker( [] )
         self.notDisplayed = urwid.SimpleListWalker( [] )
+        # DatasetEntry rows are always a single line
+        self.datasetList.fixed_rows  = 1
+        self.selectedList.fixed_rows = 1
         self.listbox_up   = urwid.ListBox( self.datasetList  )
         self.listbox_low  = urwid.ListBox( self.selectedList )
         self.samplesPile  = urwid.Pile(
                                 [
-                                    urwid.LineBox( self.listbox_up  , title='Available Samples'),
+                                    urwid.LineBox( urwid.ScrollBar( self.listbox_up, thumb_attr='head' ), title='Available Samples'),
                                     urwid.LineBox( self.listbox_low , title='Selected Samples' )
                                 ] )
 
@@ -301,9 +307,28 @@ class FileListTool():
 
         self.view = urwid.Frame( self.centralColumns, header=header, footer=footer )
 
-        self.loop = urwid.MainLoop(self.view, self.palette, unhandled_input=self.keystroke)
+        # Set FILELISTTOOL_PROFILE to a file name to collect render
+        # statistics, written there on exit, F12 shows them live
+        self.profiler = None
+        profileFile = os.environ.get('FILELISTTOOL_PROFILE')
+        if profileFile:
+            self.profiler = urwid.RenderProfiler()
+            self.profiler.enable()
+
+        # don't let a slow connection block input during large redraws
+        screen = urwid.raw_display.Screen()
+        screen.set_output_nonblocking()
+
+        # holding down a key redraws the footer at most once per frame
+        self.loop = urwid.MainLoop(self.view, self.palette, screen=screen,
+            unhandled_input=self.keystroke, max_fps=30)
         self.loop.run()
 
+        if self.profiler:
+            self.profiler.disable()
+            with open(profileFile, 'w') as f:
+                self.profiler.dump(f)
+
 
     #--------------------------------------------------------------------------
     def moveEntry(self, datasetEntry):
@@ -348,6 +373,14 @@ class FileListTool():
             raise urwid.ExitMainLoop()
             return
 
+        # Toggle the render profile overlay
+        if key == 'f12' and self.profiler:
+            if self.loop.widget is self.view:
+                self.loop.widget = self.profiler.overlay(self.view)
+            else:
+                self.loop.widget = self.view
+            return
+
         # create the filelist
         if key is 'c':
             self.createFileList()
@@ -386,15 +419,17 @@ class FileListTool():
         if u'' in negList: negList.remove(u'')
 
 
-        # Update selection list
-        for sample in self.datasetList[:]:
-            if sample.matchesCriteria(posList=posList, negList=negList) == False:
-                self.datasetList .remove( sample )
-                self.notDisplayed.append( sample )
-        for sample in self.notDisplayed[:]:
-            if sample.matchesCriteria(posList=posList, negList=negList) == True:
-                self.datasetList .append( sample )
-                self.notDisplayed.remove( sample )
+        # Update selection list, redrawing the lists only once
+        with self.datasetList.batch():
+            with self.notDisplayed.batch():
+                for sample in self.datasetList[:]:
+                    if sample.matchesCriteria(posList=posList, negList=negList) == False:
+                        self.datasetList .remove( sample )
+                        self.notDisplayed.append( sample )
+                for sample in self.notDisplayed[:]:
+                    if sample.matchesCriteria(posList=posList, negList=negList) == True:
+                        self.datasetList .append( sample )
+                        self.notDisplayed.remove( sample )
 
         self.centralColumns.set_focus(0)
 
@@ -403,7 +438,7 @@ class FileListTool():
     def setStatusMessage(self, msg=''):
         """ Set update status message in footer """
 
-        self.view.set_footer( urwid.AttrMap( urwid.Text('selected: %d   |   %s' % (len(self.selectedList), msg)), 'head' ) )
+        self.statusBar.set_fields( selected=len(self.selectedList), message=msg )
 
 
     #--------------------------------------------------------------------------
@@ -25,7 +25,8 @@ from urwid.widget import (FLOW, BOX, FIXED, LEFT, RIGHT, CENTER, TOP, MIDDLE,
     BOTTOM, SPACE, ANY, CLIP, PACK, GIVEN, RELATIVE, RELATIVE_100, WEIGHT,
     WidgetMeta,
     WidgetError, Widget, FlowWidget, BoxWidget, fixed_size, FixedWidget,
-    Divider, SolidFill, TextError, Text, EditError, Edit, IntEdit,
+    Divider, SolidFill, TextError, Text, TextRowError, TextRow, StatusBarError,
+    StatusBar, EditError, Edit, IntEdit,
     delegate_to_widget_mixin, WidgetWrapError, WidgetWrap)
 from urwid.decoration import (WidgetDecoration, WidgetPlaceholder,
     AttrMapError, AttrMap, AttrWrap, BoxAdapterError, BoxAdapter, PaddingError,
@@ -36,7 +37,8 @@ from urwid.container import (GridFlowError, GridFlow, OverlayError, Overlay,
 from urwid.wimp import (SelectableIcon, CheckBoxError, CheckBox, RadioButton,
     Button, PopUpLauncher, PopUpTarget)
 from urwid.listbox import (ListWalkerError, ListWalker, PollingListWalker,
-    SimpleListWalker, SimpleFocusListWalker, ListBoxError, ListBox)
+    SimpleListWalker, SimpleFocusListWalker, RowHeightIndex, IndexedListWalker,
+    ListBoxError, ListBox, ScrollBar, calculate_scroll_thumb)
 from urwid.graphics import (BigText, LineBox, BarGraphMeta, BarGraphError,
     BarGraph, GraphVScale, ProgressBar, scale_bar_values)
 from urwid.canvas import (CanvasCache, CanvasError, Canvas, TextCanvas,
@@ -52,18 +54,20 @@ from urwid.command_map import (CommandMap, command_map,
     REDRAW_SCREEN, CURSOR_UP, CURSOR_DOWN, CURSOR_LEFT, CURSOR_RIGHT,
     CURSOR_PAGE_UP, CURSOR_PAGE_DOWN, CURSOR_MAX_LEFT, CURSOR_MAX_RIGHT,
     ACTIVATE)
-from urwid.main_loop import ExitMainLoop, MainLoop, SelectEventLoop
+from urwid.main_loop import (ExitMainLoop, MainLoop, SelectEventLoop,
+    PollEventLoop, AsyncioEventLoop, JobQueueFull, ThreadJob, ThreadPool)
 try:
     from urwid.main_loop import GLibEventLoop, TwistedEventLoop
 except ImportError:
     pass
+from urwid.profiler import RenderProfiler, RenderProfileText
 from urwid.text_layout import (TextLayout, StandardTextLayout, default_layout,
     LayoutSegment)
 from urwid.display_common import (UPDATE_PALETTE_ENTRY, DEFAULT, BLACK,
     DARK_RED, DARK_GREEN, BROWN, DARK_BLUE, DARK_MAGENTA, DARK_CYAN,
     LIGHT_GRAY, DARK_GRAY, LIGHT_RED, LIGHT_GREEN, YELLOW, LIGHT_BLUE,
-    LIGHT_MAGENTA, LIGHT_CYAN, WHITE, AttrSpecError, AttrSpec, RealTerminal,
-    ScreenError, BaseScreen)
+    LIGHT_MAGENTA, LIGHT_CYAN, WHITE, AttrSpecError, AttrSpec, get_attrspec,
+    RealTerminal, ScreenError, BaseScreen)
 from urwid.util import (calc_text_pos, calc_width, is_wide_char,
     move_next_char, move_prev_char, within_double_byte, detected_encoding,
     set_encoding, get_encoding_mode, apply_target_encoding, supports_unicode,
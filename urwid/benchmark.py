@@ -0,0 +1,278 @@
+#!/usr/bin/python
+#
+# Urwid headless rendering benchmarks
+#    Copyright (C) 2004-2012  Ian Ward
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+# Urwid web site: http://excess.org/urwid/
+
+"""
+Headless rendering benchmarks.
+
+Each scenario drives a :class:`MainLoop` with scripted input against a
+:class:`BenchmarkScreen`, a raw_display Screen that counts the bytes it
+would send to the terminal instead of needing one.  Run with::
+
+    python -m urwid.benchmark [--json] [--scale SCALE] [scenario ...]
+"""
+
+import gc
+import os
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from urwid import raw_display
+from urwid.util import set_encoding
+from urwid.main_loop import MainLoop
+from urwid.widget import Text, TextRow, Edit
+from urwid.listbox import (SimpleFocusListWalker, IndexedListWalker,
+    ListBox, ScrollBar)
+from urwid.container import Columns, Frame
+from urwid.decoration import AttrWrap
+from urwid.graphics import LineBox
+
+
+class CountingOutput(object):
+    """
+    File-like object that only counts what is written to it.
+    """
+    def __init__(self):
+        self.bytes = 0
+        self.writes = 0
+
+    def write(self, data):
+        self.bytes += len(data)
+        self.writes += 1
+
+    def flush(self):
+        pass
+
+
+class BenchmarkScreen(raw_display.Screen):
+    """
+    A raw_display Screen that renders everything as it would for a
+    real terminal but writes to a :class:`CountingOutput` and reports
+    a screen size set by the benchmark.
+    """
+    def __init__(self, size=(80, 24)):
+        raw_display.Screen.__init__(self)
+        self.output = CountingOutput()
+        self._term_output_file = self.output
+        self.size = size
+
+    def start(self):
+        self._started = True
+        self._setup_G1_done = True
+
+    def stop(self):
+        self._started = False
+
+    def close(self):
+        """Release the resize pipe opened by raw_display.Screen."""
+        os.close(self._resize_pipe_rd)
+        os.close(self._resize_pipe_wr)
+
+    def set_mouse_tracking(self):
+        pass
+
+    def get_cols_rows(self):
+        return self.size
+
+
+def _memory_start():
+    gc.collect()
+    if tracemalloc is not None:
+        tracemalloc.start()
+
+def _memory_peak_kb():
+    """
+    Return the peak memory allocated since _memory_start() when
+    tracemalloc is available, otherwise the peak resident set size of
+    the process.
+    """
+    if tracemalloc is not None:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak // 1024
+    if resource is not None:
+        # kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return None
+
+
+def run_scenario(name, widget, steps, size=(80, 24), palette=None):
+    """
+    Draw widget, then run each step and draw again, returning a dict
+    of measurements.
+
+    steps -- iterable of steps, each one of:
+        list of keys or mouse events passed to MainLoop.process_input()
+        ('resize', (cols, rows)) to change the screen size
+        a function called with the MainLoop, eg. to change the widgets
+
+    The result has keys: scenario, frames, seconds, fps, bytes, writes
+    and peak_kb.
+    """
+    screen = BenchmarkScreen(size)
+    loop = MainLoop(widget, palette or [], screen=screen)
+    screen.start()
+    try:
+        _memory_start()
+        frames = 0
+        start = time.time()
+        loop.draw_screen()
+        frames += 1
+        for step in steps:
+            if callable(step):
+                step(loop)
+            elif type(step) == tuple and step[0] == 'resize':
+                screen.size = step[1]
+                loop.screen_size = None
+            else:
+                loop.process_input(step)
+            loop.draw_screen()
+            frames += 1
+        seconds = time.time() - start
+        peak_kb = _memory_peak_kb()
+    finally:
+        screen.stop()
+        screen.close()
+    return {
+        'scenario': name,
+        'frames': frames,
+        'seconds': seconds,
+        'fps': frames / max(seconds, 1e-9),
+        'bytes': screen.output.bytes,
+        'writes': screen.output.writes,
+        'peak_kb': peak_kb,
+        }
+
+
+def _rows(scale, full):
+    return max(10, int(full * scale))
+
+def scroll_listbox(scale):
+    """Scroll line by line and page by page through a long ListBox."""
+    body = SimpleFocusListWalker([Text(u"row %d" % i)
+        for i in xrange(_rows(scale, 100000))])
+    steps = ([['down']] * 100 + [['page down']] * 20 + [['end']] +
+        [['page up']] * 20 + [['home']])
+    return ListBox(body), steps
+
+def jump_indexed(scale):
+    """Jump to fractions of a long single-line TextRow list."""
+    body = IndexedListWalker([TextRow([(8, u"%d" % i), u"entry %d" % i])
+        for i in xrange(_rows(scale, 100000))])
+    body.fixed_rows = 1
+    listbox = ListBox(body)
+    def jump(fraction):
+        def step(loop):
+            listbox.set_scroll_fraction(
+                (loop.screen_size[0] - 1, loop.screen_size[1]), fraction)
+        return step
+    steps = [jump(i / 20.0) for i in range(21)] + [['page up']] * 20
+    return ScrollBar(listbox), steps
+
+def resize(scale):
+    """Resize a Frame with a list and a side panel."""
+    body = SimpleFocusListWalker([AttrWrap(Edit(u"%d: " % i, u"value"),
+        'body', 'focus') for i in xrange(_rows(scale, 1000))])
+    options = ListBox(SimpleFocusListWalker([Text(u"option %d" % i)
+        for i in range(10)]))
+    widget = Frame(Columns([LineBox(ListBox(body)),
+        ('fixed', 20, LineBox(options))]),
+        header=Text(u"header"), footer=Text(u"footer"))
+    sizes = [(80, 24), (120, 40), (60, 20), (200, 60)]
+    steps = [('resize', sizes[i % len(sizes)]) for i in range(40)]
+    return widget, steps
+
+def filter_update(scale):
+    """Replace the contents of a list with filtered entries."""
+    entries = [Text(u"dataset %d" % i) for i in xrange(_rows(scale, 10000))]
+    body = SimpleFocusListWalker(entries)
+    def apply_filter(query):
+        def step(loop):
+            with body.batch():
+                body[:] = [w for w in entries if query in w.text]
+        return step
+    queries = [u"1", u"12", u"123", u"2", u"", u"9", u"99", u""]
+    return ListBox(body), [apply_filter(q) for q in queries * 3]
+
+SCENARIOS = [
+    ('scroll_listbox', scroll_listbox),
+    ('jump_indexed', jump_indexed),
+    ('resize', resize),
+    ('filter_update', filter_update),
+    ]
+
+
+def run_benchmarks(names=None, scale=1.0):
+    """
+    Run the scenarios in names (all when None) and return a list of
+    results from run_scenario().  scale multiplies the number of list
+    entries each scenario creates.
+    """
+    results = []
+    for name, fn in SCENARIOS:
+        if names and name not in names:
+            continue
+        widget, steps = fn(scale)
+        results.append(run_scenario(name, widget, steps))
+    return results
+
+
+def main(args=None):
+    import optparse
+    import json
+    parser = optparse.OptionParser(
+        usage="%prog [options] [scenario ...]",
+        description="Scenarios: " + ", ".join(n for n, fn in SCENARIOS))
+    parser.add_option("--json", action="store_true",
+        help="write results as JSON")
+    parser.add_option("--scale", type="float", default=1.0,
+        help="multiply the size of the lists used (default 1.0)")
+    parser.add_option("--encoding", default="utf-8",
+        help="text encoding to render with (default utf-8, so the "
+        "results do not depend on the locale)")
+    options, names = parser.parse_args(args)
+    unknown = set(names) - set(n for n, fn in SCENARIOS)
+    if unknown:
+        parser.error("unknown scenario: %s" % ", ".join(sorted(unknown)))
+
+    set_encoding(options.encoding)
+    results = run_benchmarks(names, options.scale)
+    if options.json:
+        json.dump(results, sys.stdout, indent=1, sort_keys=True)
+        sys.stdout.write("\n")
+        return
+    sys.stdout.write("%-16s %7s %9s %11s %9s\n" % ("scenario", "frames",
+        "fps", "bytes", "peak kB"))
+    for r in results:
+        sys.stdout.write("%-16s %7d %9.1f %11d %9s\n" % (r['scenario'],
+            r['frames'], r['fps'], r['bytes'], r['peak_kb']))
+
+
+if __name__ == '__main__':
+    main()
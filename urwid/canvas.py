@@ -22,7 +22,8 @@
 import weakref
 
 from urwid.util import rle_len, rle_append_modify, rle_join_modify, rle_product, \
-    calc_width, calc_text_pos, apply_target_encoding, trim_text_attr_cs
+    calc_width, calc_text_pos, calc_trim_text, apply_target_encoding, \
+    RunLengthList
 from urwid.text_layout import trim_line, LayoutSegment
 from urwid.compat import bytes
 
@@ -309,6 +310,15 @@ class Canvas(object):
 
 
 
+    def _rows_fill_cols(self):
+        """
+        Return True if every row of this canvas's content is cols()
+        wide.  Canvases that can't tell without walking their content
+        return False.
+        """
+        return False
+
+
 class TextCanvas(Canvas):
     """
     class for storing rendered text and attributes
@@ -373,6 +383,11 @@ class TextCanvas(Canvas):
         self.cursor = cursor
         self._text = text
         self._maxcol = maxcol
+        # unchecked text may be narrower than maxcol
+        self._fills_cols = check_width or None
+        # built from text, attr and cs by the first call to content()
+        self._row_runs = None
+        self._content_rows = None
 
     def rows(self):
         """Return the number of rows in this canvas."""
@@ -383,6 +398,16 @@ class TextCanvas(Canvas):
     def cols(self):
         """Return the screen column width of this canvas."""
         return self._maxcol
+
+    def _rows_fill_cols(self):
+        if self._fills_cols is None:
+            maxcol = self._maxcol
+            self._fills_cols = True
+            for t in self._text:
+                if calc_width(t, 0, len(t)) != maxcol:
+                    self._fills_cols = False
+                    break
+        return self._fills_cols
     
     def translated_coords(self,dx,dy):
         """
@@ -415,28 +440,40 @@ class TextCanvas(Canvas):
         assert trim_top >=0 and trim_top < maxrow
         assert rows > 0 and trim_top + rows <= maxrow
         
-        if trim_top or rows < maxrow:
-            text_attr_cs = zip(
-                self._text[trim_top:trim_top+rows],
-                self._attr[trim_top:trim_top+rows], 
-                self._cs[trim_top:trim_top+rows])
-        else:
-            text_attr_cs = zip(self._text, self._attr, self._cs)
-        
-        for text, a_row, cs_row in text_attr_cs:
-            if trim_left or cols < self._maxcol:
-                text, a_row, cs_row = trim_text_attr_cs(
-                    text, a_row, cs_row, trim_left, 
-                    trim_left + cols)
-            attr_cs = rle_product(a_row, cs_row)
-            i = 0
+        if self._row_runs is None:
+            self._build_rows()
+        trim = trim_left or cols < self._maxcol
+        for y in range(trim_top, trim_top + rows):
+            if trim:
+                row = trim_segments(self._text[y], self._row_runs[y],
+                    trim_left, trim_left + cols)
+            else:
+                row = self._content_rows[y]
+            if attr_map:
+                row = [(attr_map.get(a, a), cs, t) for a, cs, t in row]
+            yield row
+
+    def _build_rows(self):
+        """
+        Combine the attributes and character sets of each row into a
+        RunLengthList and split the full rows into segments once, so
+        content() only has to slice them.  The text, attributes and
+        character sets must not be changed after this.
+        """
+        self._row_runs = []
+        self._content_rows = []
+        for text, a_row, cs_row in zip(self._text, self._attr, self._cs):
+            # rle_product() stops at an empty run, leave them out
+            runs = RunLengthList(rle_product(
+                [(a, run) for a, run in a_row if run],
+                [(cs, run) for cs, run in cs_row if run]))
+            self._row_runs.append(runs)
             row = []
-            for (a, cs), run in attr_cs:
-                if attr_map and a in attr_map:
-                    a = attr_map[a]
+            i = 0
+            for (a, cs), run in runs:
                 row.append((a, cs, text[i:i+run]))
                 i += run
-            yield row
+            self._content_rows.append(row)
             
 
     def content_delta(self, other):
@@ -480,6 +517,9 @@ class BlankCanvas(Canvas):
     
     def content_delta(self):
         raise NotImplementedError("BlankCanvas doesn't know its own size!")
+
+    def _rows_fill_cols(self):
+        return True
         
 blank_canvas = BlankCanvas()
 
@@ -503,6 +543,9 @@ class SolidCanvas(Canvas):
     def rows(self):
         return self.size[1]
 
+    def _rows_fill_cols(self):
+        return True
+
     def content(self, trim_left=0, trim_top=0, cols=None, rows=None, 
             attr=None):
         if cols is None:
@@ -556,7 +599,14 @@ class CompositeCanvas(Canvas):
             self.children = []
         else:
             if hasattr(canv, "shards"):
-                self.shards = canv.shards
+                if canv.widget_info and canv._reusable():
+                    # refer to the finalized canvas as a whole so that
+                    # its rows are only assembled from shards once
+                    self.shards = [(canv.rows(), [
+                        (0, 0, canv.cols(), canv.rows(),
+                        None, canv)])]
+                else:
+                    self.shards = canv.shards
             else:
                 self.shards = [(canv.rows(), [
                     (0, 0, canv.cols(), canv.rows(), 
@@ -584,10 +634,102 @@ class CompositeCanvas(Canvas):
         return cols
 
         
-    def content(self):
+    _content_rows = None
+    _static_value = None
+
+    def _static(self):
+        """
+        Return True if every canvas this one is built from is
+        cacheable, so its content can't change once finalized.
+        """
+        if self._static_value is not None:
+            return self._static_value
+        static = True
+        for num_rows, cviews in self.shards:
+            for cv in cviews:
+                canv = cv[5]
+                if isinstance(canv, CompositeCanvas):
+                    static = canv._static()
+                else:
+                    static = canv.cacheable
+                if not static:
+                    break
+            if not static:
+                break
+        if self.widget_info:
+            self._static_value = static
+        return static
+
+    def _reusable(self):
+        """
+        Return True if this finalized canvas is worth referring to as a
+        single cview from other canvases instead of copying its shards.
+        """
+        if not self.shards:
+            return False
+        if len(self.shards) == 1 and len(self.shards[0][1]) == 1:
+            return False
+        return self._static() and self._rows_fill_cols()
+
+    _fills_cols = None
+
+    def _rows_fill_cols(self):
+        """
+        Return True if every row of this canvas's content is cols()
+        wide.  Rows of canvases built from ones whose content is
+        narrower than their size can only be trimmed the same way by
+        walking the shards.  Only the canvases in the shards are asked,
+        the content itself is not assembled.
+        """
+        if self._fills_cols is not None:
+            return self._fills_cols
+        fills = True
+        for num_rows, cviews in self.shards:
+            for cv in cviews:
+                if not cv[5]._rows_fill_cols():
+                    fills = False
+                    break
+            if not fills:
+                break
+        if self.widget_info:
+            self._fills_cols = fills
+        return fills
+
+    def content(self, trim_left=0, trim_top=0, cols=None, rows=None,
+            attr_map=None):
         """
         Return the canvas content as a list of rows where each row
         is a list of (attr, cs, text) tuples.
+
+        trim_left, trim_top, cols, rows and attr_map are used when this
+        canvas is part of another CompositeCanvas.
+
+        Once finalized the rows are kept and returned again by later
+        calls, they must not be modified.
+        """
+        content = self._content_rows
+        if content is None:
+            content = list(self._shards_content())
+            if self.widget_info and self._static():
+                self._content_rows = content
+        maxcol, maxrow = self.cols(), self.rows()
+        if cols is None:
+            cols = maxcol - trim_left
+        if rows is None:
+            rows = maxrow - trim_top
+        if trim_top or rows < maxrow:
+            content = content[trim_top:trim_top + rows]
+        if trim_left or cols < maxcol:
+            return (row_trim_sides(row, trim_left, cols, attr_map)
+                for row in content)
+        if attr_map:
+            return ([(attr_map.get(a, a), cs, text)
+                for a, cs, text in row] for row in content)
+        return iter(content)
+
+    def _shards_content(self):
+        """
+        Generate the rows of this canvas by walking its shards.
         """
         shard_tail = []
         for num_rows, cviews in self.shards:
@@ -1055,33 +1197,76 @@ def shards_join(shard_lists):
     """
     Return the result of joining shard lists horizontally.
     All shards lists must have the same number of rows.
+
+    A new shard starts at every row where one of the shard lists
+    starts a shard, with that list's cviews in left to right order.
+    """
+    starts = {}
+    total = 0
+    for shards in shard_lists:
+        row = 0
+        for num_rows, cviews in shards:
+            starts.setdefault(row, []).extend(cviews)
+            row += num_rows
+        total = max(total, row)
+
+    rows = sorted(starts)
+    rows.append(total)
+    return [(rows[i + 1] - rows[i], starts[rows[i]])
+        for i in range(len(rows) - 1)]
+
+
+def row_trim_sides(row, trim_left, cols, attr_map=None):
+    """
+    Return the cols screen columns of a content row starting at
+    trim_left, with attr_map applied.
     """
-    shards_iters = [iter(sl) for sl in shard_lists]
-    shards_current = [i.next() for i in shards_iters]
+    text = bytes().join([t for a, cs, t in row])
+    runs = RunLengthList([((a, cs), len(t)) for a, cs, t in row])
+    new_row = trim_segments(text, runs, trim_left, trim_left + cols)
+    if attr_map:
+        new_row = [(attr_map.get(a, a), cs, t) for a, cs, t in new_row]
+    return new_row
 
-    new_shards = []
-    while True:
-        new_cviews = []
-        num_rows = min([r for r,cv in shards_current])
 
-        shards_next = []
-        for rows, cviews in shards_current:
-            if cviews:
-                new_cviews.extend(cviews)
-            shards_next.append((rows - num_rows, None))
+def trim_segments(text, runs, start_col, end_col):
+    """
+    Return the segments of one row of text between screen columns
+    start_col and end_col as a list of (attr, cs, text) tuples.
 
-        shards_current = shards_next
-        new_shards.append((num_rows, new_cviews))
+    text -- the row's text
+    runs -- RunLengthList of (attr, cs) values covering text
 
-        # advance to next shards
-        try:
-            for i in range(len(shards_current)):
-                if shards_current[i][0] > 0:
-                    continue
-                shards_current[i] = shards_iters[i].next()
-        except StopIteration:
-            break
-    return new_shards
+    A wide character cut by start_col or end_col is replaced with a
+    space in its attribute.
+
+    >>> runs = RunLengthList([(('a', None), 3), (('b', None), 3)])
+    >>> trim_segments("abcdef", runs, 2, 5)
+    [('a', None, 'c'), ('b', None, 'de')]
+    """
+    spos, epos, pad_left, pad_right = calc_trim_text(text, 0, len(text),
+        start_col, end_col)
+    row = []
+    def append(a, cs, t):
+        if row and row[-1][:2] == (a, cs):
+            row[-1] = (a, cs, row[-1][2] + t)
+        else:
+            row.append((a, cs, t))
+    def attr_at(pos):
+        # positions past the runs have no attribute
+        v = runs.get_at(pos)
+        if v:
+            return v[0]
+        return None
+    if pad_left:
+        append(attr_at(spos - 1), None, bytes().rjust(pad_left))
+    i = spos
+    for (a, cs), run in runs.subseg(spos, epos):
+        append(a, cs, text[i:i + run])
+        i += run
+    if pad_right:
+        append(attr_at(epos), None, bytes().rjust(pad_right))
+    return row
 
 
 def cview_trim_rows(cv, rows):
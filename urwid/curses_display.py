@@ -27,9 +27,10 @@ import curses
 import _curses
 
 from urwid import escape
+from urwid import signals
 
 from urwid.display_common import BaseScreen, RealTerminal, AttrSpec, \
-    UNPRINTABLE_TRANS_TABLE
+    get_attrspec, UNPRINTABLE_TRANS_TABLE, UPDATE_PALETTE_ENTRY
 from urwid.compat import bytes, PYTHON3
 
 KEY_RESIZE = 410 # curses.KEY_RESIZE (sometimes not defined)
@@ -70,9 +71,21 @@ class Screen(BaseScreen, RealTerminal):
         self.prev_input_resize = 0
         self.set_input_timeouts()
         self.last_bstate = 0
+        # attribute -> curses attribute value, see _curses_attr()
+        self._curses_attrs = {}
+        # rows last drawn, to skip the unchanged ones on the next frame
+        self._screen_buf = None
+        self._screen_buf_size = None
+        signals.connect_signal(self, UPDATE_PALETTE_ENTRY,
+            self._on_update_palette_entry)
 
         self.register_palette_entry(None, 'default','default')
 
+    def _on_update_palette_entry(self, name, *attrspecs):
+        # palette entries are looked up again on the next frame
+        self._curses_attrs = {}
+        self._screen_buf = None
+
     def set_mouse_tracking(self):
         """
         Enable mouse tracking.
@@ -108,6 +121,8 @@ class Screen(BaseScreen, RealTerminal):
             except _curses.error:
                 self.has_default_colors=False
         self._setup_colour_pairs()
+        self._curses_attrs = {}
+        self._screen_buf = None
         curses.noecho()
         curses.meta(1)
         curses.halfdelay(10) # use set_input_timeouts to adjust
@@ -330,13 +345,9 @@ class Screen(BaseScreen, RealTerminal):
                 keys.append(key)
             key = self._getch_nodelay()
 
-        processed = []
-        
-        try:
-            while keys:
-                run, keys = escape.process_keyqueue(keys, True)
-                processed += run
-        except escape.MoreInputRequired:
+        processed, keys = escape.process_keyqueue_all(keys, True)
+        if keys:
+            # wait for the rest of an incomplete sequence
             key = self._getch(self.complete_tenths)
             while key >= 0:
                 raw.append(key)
@@ -347,9 +358,8 @@ class Screen(BaseScreen, RealTerminal):
                 else:
                     keys.append(key)
                 key = self._getch_nodelay()
-            while keys:
-                run, keys = escape.process_keyqueue(keys, False)
-                processed += run
+            run, keys = escape.process_keyqueue_all(keys, False)
+            processed += run
 
         if resize:
             processed.append('window resize')
@@ -431,11 +441,23 @@ class Screen(BaseScreen, RealTerminal):
         
 
     def _setattr(self, a):
+        self.s.attrset(self._curses_attr(a))
+
+    def _curses_attr(self, a):
+        """
+        Return the curses attribute value for attribute a, a palette
+        entry name or AttrSpec instance, computed once per attribute.
+        """
+        attr = self._curses_attrs.get(a)
+        if attr is None:
+            attr = self._curses_attrs[a] = self._attr_to_curses(a)
+        return attr
+
+    def _attr_to_curses(self, a):
         if a is None:
-            self.s.attrset(0)
-            return
+            return 0
         elif not isinstance(a, AttrSpec):
-            p = self._palette.get(a, (AttrSpec('default', 'default'),))
+            p = self._palette.get(a, (get_attrspec('default', 'default'),))
             a = p[0]
 
         if self.has_color:
@@ -465,17 +487,28 @@ class Screen(BaseScreen, RealTerminal):
         if a.blink:
             attr |= curses.A_BLINK
 
-        self.s.attrset(attr)
+        return attr
 
     def draw_screen(self, (cols, rows), r ):
         """Paint screen with rendered canvas."""
         assert self._started
         
         assert r.rows() == rows, "canvas size and passed size don't match"
+
+        # only rows that changed since the last frame are drawn
+        osb = None
+        if self._screen_buf_size == (cols, rows):
+            osb = self._screen_buf
+        sb = []
+        self._screen_buf = None
+        curses_attr = self._curses_attr
     
         y = -1
         for row in r.content():
             y += 1
+            sb.append(row)
+            if osb and osb[y] == row:
+                continue
             try:
                 self.s.move( y, 0 )
             except _curses.error:
@@ -492,7 +525,7 @@ class Screen(BaseScreen, RealTerminal):
                     assert isinstance(seg, bytes)
 
                 if first or lasta != a:
-                    self._setattr(a)
+                    self.s.attrset(curses_attr(a))
                     lasta = a
                 try:
                     if cs in ("0", "U"):
@@ -516,6 +549,8 @@ class Screen(BaseScreen, RealTerminal):
                         # quietly abort.
                         return
                 nr += 1
+        self._screen_buf = sb
+        self._screen_buf_size = (cols, rows)
         if r.cursor is not None:
             x,y = r.cursor
             self._curs_set(1)
@@ -527,7 +562,8 @@ class Screen(BaseScreen, RealTerminal):
             self._curs_set(0)
             self.s.move(0,0)
         
-        self.s.refresh()
+        self.s.noutrefresh()
+        curses.doupdate()
         self.keep_cache_alive_link = r
 
 
@@ -536,6 +572,7 @@ class Screen(BaseScreen, RealTerminal):
         Force the screen to be completely repainted on the next
         call to draw_screen().
         """
+        self._screen_buf = None
         self.s.clear()
 
 
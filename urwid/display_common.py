@@ -33,6 +33,7 @@ UNPRINTABLE_TRANS_TABLE = B("?") * 32 + bytes3(range(32,256))
 # signals sent by BaseScreen
 UPDATE_PALETTE_ENTRY = "update palette entry"
 INPUT_DESCRIPTORS_CHANGED = "input descriptors changed"
+OUTPUT_PENDING = "output pending"
 
 
 # AttrSpec internal values
@@ -424,6 +425,37 @@ def _parse_color_88(desc):
 class AttrSpecError(Exception):
     pass
 
+# parsed AttrSpec values, cleared when they grow past _ATTRSPEC_CACHE_LIMIT
+# (fg, bg, colors) -> AttrSpec value
+_attrspec_values = {}
+# (foreground, 88 colors) -> foreground and settings part of the value
+_foreground_values = {}
+# (background, 88 colors) -> background part of the value
+_background_values = {}
+# (fg, bg, colors) -> shared AttrSpec instance, see get_attrspec()
+_interned_attrspecs = {}
+_ATTRSPEC_CACHE_LIMIT = 4096
+
+def _cache_store(cache, key, value):
+    if len(cache) >= _ATTRSPEC_CACHE_LIMIT:
+        cache.clear()
+    cache[key] = value
+
+def get_attrspec(fg, bg, colors=256):
+    """
+    Return a shared AttrSpec instance for fg, bg and colors, creating
+    it the first time.  The instance returned must not be modified.
+
+    >>> get_attrspec('yellow', 'dark blue') is get_attrspec('yellow', 'dark blue')
+    True
+    """
+    key = (fg, bg, colors)
+    a = _interned_attrspecs.get(key)
+    if a is None:
+        a = AttrSpec(fg, bg, colors)
+        _cache_store(_interned_attrspecs, key, a)
+    return a
+
 class AttrSpec(object):
     def __init__(self, fg, bg, colors=256):
         """
@@ -478,7 +510,19 @@ class AttrSpec(object):
         AttrSpec('#dda', '#006')
         >>> AttrSpec('#ddb', '#004', 88)
         AttrSpec('#ccc', '#000', colors=88)
+
+        Color strings are parsed once and the result is reused, and
+        AttrSpec instances compare and hash by their packed integer
+        value, so equal specifications are interchangeable.
+
+        >>> AttrSpec('yellow,bold', 'dark blue') == AttrSpec('yellow, bold', 'dark blue')
+        True
         """
+        key = (fg, bg, colors)
+        value = _attrspec_values.get(key)
+        if value is not None:
+            self._value = value
+            return
         if colors not in (1, 16, 88, 256):
             raise AttrSpecError('invalid number of colors (%d).' % colors)
         self._value = 0 | _HIGH_88_COLOR * (colors == 88)
@@ -488,6 +532,16 @@ class AttrSpec(object):
             raise AttrSpecError(('foreground/background (%s/%s) require ' +
                 'more colors than have been specified (%d).') %
                 (repr(fg), repr(bg), colors))
+        _cache_store(_attrspec_values, key, self._value)
+
+    def __eq__(self, other):
+        return isinstance(other, AttrSpec) and self._value == other._value
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self._value)
 
     foreground_basic = property(lambda s: s._value & _FG_BASIC_COLOR != 0)
     foreground_high = property(lambda s: s._value & _FG_HIGH_COLOR != 0)
@@ -543,6 +597,14 @@ class AttrSpec(object):
             ',blink' * self.blink + ',underline' * self.underline)
 
     def _set_foreground(self, foreground):
+        key = (foreground, self._value & _HIGH_88_COLOR)
+        value = _foreground_values.get(key)
+        if value is None:
+            value = self._parse_foreground(foreground)
+            _cache_store(_foreground_values, key, value)
+        self._value = (self._value & ~_FG_MASK) | value
+
+    def _parse_foreground(self, foreground):
         color = None
         flags = 0
         # handle comma-separated foreground
@@ -578,7 +640,7 @@ class AttrSpec(object):
             color = scolor
         if color is None:
             color = 0
-        self._value = (self._value & ~_FG_MASK) | color | flags
+        return color | flags
 
     foreground = property(_foreground, _set_foreground)
 
@@ -593,6 +655,14 @@ class AttrSpec(object):
         return _color_desc_256(self.background_number)
         
     def _set_background(self, background):
+        key = (background, self._value & _HIGH_88_COLOR)
+        value = _background_values.get(key)
+        if value is None:
+            value = self._parse_background(background)
+            _cache_store(_background_values, key, value)
+        self._value = (self._value & ~_BG_MASK) | value
+
+    def _parse_background(self, background):
         flags = 0
         if background in ('', 'default'):
             color = 0
@@ -608,7 +678,7 @@ class AttrSpec(object):
         if color is None:
             raise AttrSpecError(("Unrecognised color specification " +
                 "in background (%s)") % (repr(background),))
-        self._value = (self._value & ~_BG_MASK) | (color << _BG_SHIFT) | flags
+        return (color << _BG_SHIFT) | flags
 
     background = property(_background, _set_background)
 
@@ -705,7 +775,7 @@ class BaseScreen(object):
     Base class for Screen classes (raw_display.Screen, .. etc)
     """
     __metaclass__ = signals.MetaSignals
-    signals = [UPDATE_PALETTE_ENTRY, INPUT_DESCRIPTORS_CHANGED]
+    signals = [UPDATE_PALETTE_ENTRY, INPUT_DESCRIPTORS_CHANGED, OUTPUT_PENDING]
 
     def __init__(self):
         super(BaseScreen,self).__init__()
@@ -807,7 +877,7 @@ class BaseScreen(object):
 
             None = use background parameter value
         """
-        basic = AttrSpec(foreground, background, 16)
+        basic = get_attrspec(foreground, background, 16)
 
         if type(mono) == tuple:
             # old style of specifying mono attributes was to put them
@@ -815,14 +885,14 @@ class BaseScreen(object):
             mono = ",".join(mono)
         if mono is None:
             mono = DEFAULT
-        mono = AttrSpec(mono, DEFAULT, 1)
+        mono = get_attrspec(mono, DEFAULT, 1)
         
         if foreground_high is None:
             foreground_high = foreground
         if background_high is None:
             background_high = background
-        high_88 = AttrSpec(foreground_high, background_high, 88)
-        high_256 = AttrSpec(foreground_high, background_high, 256)
+        high_88 = get_attrspec(foreground_high, background_high, 88)
+        high_256 = get_attrspec(foreground_high, background_high, 256)
 
         signals.emit_signal(self, UPDATE_PALETTE_ENTRY,
             name, basic, mono, high_88, high_256)
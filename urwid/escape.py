@@ -128,53 +128,79 @@ input_sequences = [
 ]
 
 class KeyqueueTrie(object):
+    """
+    Trie of input sequences flattened into a list of nodes.  Each node
+    is a dict mapping a key code to either the index of the next node
+    or the resulting key name, so a lookup is a simple loop over the
+    key codes.
+    """
     def __init__( self, sequences ):
-        self.data = {}
+        self.nodes = [{}]
         for s, result in sequences:
-            assert type(result) != dict
-            self.add(self.data, s, result)
+            assert type(result) != int
+            self.add(s, result)
     
-    def add(self, root, s, result):
-        assert type(root) == dict, "trie conflict detected"
+    def add(self, s, result):
         assert len(s) > 0, "trie conflict detected"
-        
-        if root.has_key(ord(s[0])):
-            return self.add(root[ord(s[0])], s[1:], result)
-        if len(s)>1:
-            d = {}
-            root[ord(s[0])] = d
-            return self.add(d, s[1:], result)
-        root[ord(s)] = result
+        nodes = self.nodes
+        node = nodes[0]
+        for c in s[:-1]:
+            nxt = node.get(ord(c))
+            if nxt is None:
+                nxt = node[ord(c)] = len(nodes)
+                nodes.append({})
+            assert type(nxt) == int, "trie conflict detected"
+            node = nodes[nxt]
+        assert not node.has_key(ord(s[-1])), "trie conflict detected"
+        node[ord(s[-1])] = result
     
     def get(self, keys, more_available):
-        result = self.get_recurse(self.data, keys, more_available)
-        if not result:
-            result = self.read_cursor_position(keys, more_available)
-        return result
-    
-    def get_recurse(self, root, keys, more_available):
-        if type(root) != dict:
-            if root == "mouse":
-                return self.read_mouse_info(keys, 
-                    more_available)
-            return (root, keys)
-        if not keys:
+        """
+        Return (result, remaining keys) for the sequence at the start
+        of keys, or None if there is no match.
+        """
+        result = self.lookup(keys, 0, more_available)
+        if result is None:
+            return None
+        result, end = result
+        return result, keys[end:]
+
+    def lookup(self, keys, start, more_available):
+        """
+        Match the sequence beginning at keys[start].  Returns (result,
+        end) where end is the index after the sequence, or None if
+        there is no match.
+        """
+        nodes = self.nodes
+        node = nodes[0]
+        i = start
+        n = len(keys)
+        while i < n:
+            nxt = node.get(keys[i])
+            if nxt is None:
+                break
+            i += 1
+            if type(nxt) == int:
+                node = nodes[nxt]
+                continue
+            if nxt == "mouse":
+                return self.read_mouse_info(keys, i, more_available)
+            return (nxt, i)
+        else:
             # get more keys
             if more_available:
                 raise MoreInputRequired()
             return None
-        if not root.has_key(keys[0]):
-            return None
-        return self.get_recurse(root[keys[0]], keys[1:], more_available)
+        return self.read_cursor_position(keys, start, more_available)
     
-    def read_mouse_info(self, keys, more_available):
-        if len(keys) < 3:
+    def read_mouse_info(self, keys, start, more_available):
+        if len(keys) - start < 3:
             if more_available:
                 raise MoreInputRequired()
             return None
         
-        b = keys[0] - 32
-        x, y = (keys[1] - 33)%256, (keys[2] - 33)%256  # supports 0-255
+        b = keys[start] - 32
+        x, y = (keys[start+1] - 33)%256, (keys[start+2] - 33)%256  # supports 0-255
         
         prefix = ""
         if b & 4:    prefix = prefix + "shift "
@@ -194,24 +220,26 @@ class KeyqueueTrie(object):
         else:
             action = "press"
 
-        return ( (prefix + "mouse " + action, button, x, y), keys[3:] )
+        return ( (prefix + "mouse " + action, button, x, y), start + 3 )
     
-    def read_cursor_position(self, keys, more_available):
+    def read_cursor_position(self, keys, start, more_available):
         """
         Interpret cursor position information being sent by the
         user's terminal.  Returned as ('cursor position', x, y)
         where (x, y) == (0, 0) is the top left of the screen.
         """
-        if not keys:
+        n = len(keys)
+        if start >= n:
             if more_available:
                 raise MoreInputRequired()
             return None
-        if keys[0] != ord('['):
+        if keys[start] != ord('['):
             return None
         # read y value
         y = 0
-        i = 1
-        for k in keys[i:]:
+        i = start + 1
+        while i < n:
+            k = keys[i]
             i += 1
             if k == ord(';'):
                 if not y:
@@ -222,31 +250,30 @@ class KeyqueueTrie(object):
             if not y and k == ord('0'):
                 return None
             y = y * 10 + k - ord('0')
-        if not keys[i:]:
+        if i >= n:
             if more_available:
                 raise MoreInputRequired()
             return None
         # read x value
         x = 0
-        for k in keys[i:]:
+        while i < n:
+            k = keys[i]
             i += 1
             if k == ord('R'):
                 if not x:
                     return None
-                return (("cursor position", x-1, y-1), keys[i:])
+                return (("cursor position", x-1, y-1), i)
             if k < ord('0') or k > ord('9'):
                 return None
             if not x and k == ord('0'):
                 return None
             x = x * 10 + k - ord('0')
-        if not keys[i:]:
-            if more_available:
-                raise MoreInputRequired()
+        if more_available:
+            raise MoreInputRequired()
         return None
 
 
 
-
 # This is added to button value to signal mouse release by curses_display
 # and raw_display when we know which button was released.  NON-STANDARD 
 MOUSE_RELEASE_FLAG = 2048  
@@ -300,28 +327,75 @@ def process_keyqueue(codes, more_available):
     
     returns (list of input, list of remaining key codes).
     """
-    code = codes[0]
+    run, end = _process_key(codes, 0, more_available)
+    return run, codes[end:]
+
+
+def process_keyqueue_all(codes, more_available):
+    """
+    codes -- list of key codes
+    more_available -- if True then stop when the codes end in the
+        middle of a character sequence (escape/utf8/wide) and caller
+        will attempt to send more key codes on the next call.
+
+    Decode all of codes in one pass.  Returns (list of input, list of
+    remaining key codes) where the remaining key codes are the
+    incomplete sequence at the end, always empty when more_available
+    is False.
+
+    >>> process_keyqueue_all([ord('h'), ord('i'), 27, ord('['), ord('A'),
+    ...     13], False)
+    (['h', 'i', 'up', 'enter'], [])
+    >>> process_keyqueue_all([ord('x'), 27, ord('[')], True)
+    (['x'], [27, 91])
+    """
+    processed = []
+    append = processed.append
+    i = 0
+    n = len(codes)
+    try:
+        while i < n:
+            code = codes[i]
+            if code >= 32 and code <= 126:
+                # plain ASCII, eg. pasted text
+                append(chr(code))
+                i += 1
+                continue
+            run, i = _process_key(codes, i, more_available)
+            processed.extend(run)
+    except MoreInputRequired:
+        return processed, codes[i:]
+    return processed, []
+
+
+def _process_key(codes, i, more_available):
+    """
+    Decode the key starting at codes[i].  Returns (list of input,
+    index of the next key code).
+    """
+    code = codes[i]
     if code >= 32 and code <= 126:
         key = chr(code)
-        return [key], codes[1:]
+        return [key], i+1
     if _keyconv.has_key(code):
-        return [_keyconv[code]], codes[1:]
+        return [_keyconv[code]], i+1
     if code >0 and code <27:
-        return ["ctrl %s" % chr(ord('a')+code-1)], codes[1:]
+        return ["ctrl %s" % chr(ord('a')+code-1)], i+1
     if code >27 and code <32:
-        return ["ctrl %s" % chr(ord('A')+code-1)], codes[1:]
+        return ["ctrl %s" % chr(ord('A')+code-1)], i+1
     
     em = str_util.get_byte_encoding()
+    n = len(codes)
     
     if (em == 'wide' and code < 256 and  
         within_double_byte(chr(code),0,0)):
-        if not codes[1:]:
+        if i+1 >= n:
             if more_available:
                 raise MoreInputRequired()
-        if codes[1:] and codes[1] < 256:
-            db = chr(code)+chr(codes[1])
+        elif codes[i+1] < 256:
+            db = chr(code)+chr(codes[i+1])
             if within_double_byte(db, 0, 1):
-                return [db], codes[2:]
+                return [db], i+2
     if em == 'utf8' and code>127 and code<256:
         if code & 0xe0 == 0xc0: # 2-byte form
             need_more = 1
@@ -330,47 +404,46 @@ def process_keyqueue(codes, more_available):
         elif code & 0xf8 == 0xf0: # 4-byte form
             need_more = 3
         else:
-            return ["<%d>"%code], codes[1:]
+            return ["<%d>"%code], i+1
 
-        for i in range(need_more):
-            if len(codes)-1 <= i:
+        for j in range(need_more):
+            if n-i-1 <= j:
                 if more_available:
                     raise MoreInputRequired()
                 else:
-                    return ["<%d>"%code], codes[1:]
-            k = codes[i+1]
+                    return ["<%d>"%code], i+1
+            k = codes[i+j+1]
             if k>256 or k&0xc0 != 0x80:
-                return ["<%d>"%code], codes[1:]
+                return ["<%d>"%code], i+1
 
-        s = bytes3(codes[:need_more+1])
+        s = bytes3(codes[i:i+need_more+1])
 
         assert isinstance(s, bytes)
         try:
-            return [s.decode("utf-8")], codes[need_more+1:]
+            return [s.decode("utf-8")], i+need_more+1
         except UnicodeDecodeError:
-            return ["<%d>"%code], codes[1:]
+            return ["<%d>"%code], i+1
         
     if code >127 and code <256:
         key = chr(code)
-        return [key], codes[1:]
+        return [key], i+1
     if code != 27:
-        return ["<%d>"%code], codes[1:]
+        return ["<%d>"%code], i+1
 
-    result = input_trie.get(codes[1:], more_available)
+    result = input_trie.lookup(codes, i+1, more_available)
     
     if result is not None:
-        result, remaining_codes = result
-        return [result], remaining_codes
+        result, end = result
+        return [result], end
     
-    if codes[1:]:
+    if i+1 < n:
         # Meta keys -- ESC+Key form
-        run, remaining_codes = process_keyqueue(codes[1:], 
-            more_available)
+        run, end = _process_key(codes, i+1, more_available)
         if run[0] == "esc" or run[0].find("meta ") >= 0:
-            return ['esc']+run, remaining_codes
-        return ['meta '+run[0]]+run[1:], remaining_codes
+            return ['esc']+run, end
+        return ['meta '+run[0]]+run[1:], end
         
-    return ['esc'], codes[1:]
+    return ['esc'], i+1
 
 
 ####################
@@ -388,9 +461,14 @@ NUM_KEYPAD_MODE = ESC+">"
 SWITCH_TO_ALTERNATE_BUFFER = ESC+"7"+ESC+"[?47h"
 RESTORE_NORMAL_BUFFER = ESC+"[?47l"+ESC+"8"
 
-#RESET_SCROLL_REGION = ESC+"[;r"
+RESET_SCROLL_REGION = ESC+"[r"
 #RESET = ESC+"c"
 
+# synchronized output (DEC private mode 2026): the terminal shows what is
+# sent between these in one update
+BEGIN_SYNCHRONIZED_UPDATE = ESC+"[?2026h"
+END_SYNCHRONIZED_UPDATE = ESC+"[?2026l"
+
 REPORT_STATUS = ESC + "[5n"
 REPORT_CURSOR_POSITION = ESC+"[6n"
 
@@ -414,6 +492,18 @@ def move_cursor_down(x):
     if x < 1: return ""
     return ESC+"[%dB" % x
 
+def set_scroll_region(top, bottom):
+    """Limit scrolling to screen rows top to bottom, counting from 0."""
+    return ESC+"[%d;%dr" % (top+1, bottom+1)
+
+def insert_lines(n):
+    if n < 1: return ""
+    return ESC+"[%dL" % n
+
+def delete_lines(n):
+    if n < 1: return ""
+    return ESC+"[%dM" % n
+
 HIDE_CURSOR = ESC+"[?25l"
 SHOW_CURSOR = ESC+"[?25h"
 
@@ -78,6 +78,11 @@ def separate_glyphs(gdata, height):
         c = None
     return dout, utf8_required
 
+# glyph widths and lines of each font's data, so that creating another
+# instance of a font doesn't measure every character again
+# (gdata, height) -> separate_glyphs() result
+_separated_glyphs = {}
+
 _all_fonts = []
 def get_all_fonts():
     """
@@ -101,7 +106,10 @@ class Font(object):
         
 
     def add_glyphs(self, gdata):
-        d, utf8_required = separate_glyphs(gdata, self.height)
+        key = (gdata, self.height)
+        if key not in _separated_glyphs:
+            _separated_glyphs[key] = separate_glyphs(gdata, self.height)
+        d, utf8_required = _separated_glyphs[key]
         self.char.update(d)
         self.utf8_required |= utf8_required
 
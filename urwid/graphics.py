@@ -20,7 +20,12 @@
 #
 # Urwid web site: http://excess.org/urwid/
 
-from urwid.util import decompose_tagmarkup, get_encoding_mode
+from collections import deque
+from itertools import groupby, islice
+
+from urwid.util import decompose_tagmarkup, get_encoding_mode, \
+    apply_target_encoding, rle_join_modify, calc_width
+from urwid.compat import bytes
 from urwid.canvas import CompositeCanvas, CanvasJoin, TextCanvas, \
     CanvasCombine, SolidCanvas
 from urwid.widget import WidgetMeta, Widget, BOX, FIXED, FLOW, \
@@ -30,6 +35,12 @@ from urwid.container import Pile, Columns
 from urwid.display_common import AttrSpec
 from urwid.decoration import WidgetDecoration
 
+# composed BigText canvases, cleared when they grow past
+# _BIGTEXT_CACHE_LIMIT
+# (font, text, attributes) -> canvas
+_bigtext_cache = {}
+_BIGTEXT_CACHE_LIMIT = 256
+
 class BigText(Widget):
     _sizing = frozenset([FIXED])
 
@@ -57,13 +68,37 @@ class BigText(Widget):
     
     def pack(self, size=None, focus=False):
         rows = self.font.height
+        canv = _bigtext_cache.get(self._cache_key())
+        if canv is not None:
+            return canv.cols(), rows
         cols = 0
         for c in self.text:
             cols += self.font.char_width(c)
         return cols, rows
+
+    def _cache_key(self):
+        return self.font, self.text, tuple(self.attrib)
     
     def render(self, size, focus=False):
+        """
+        Render the text, reusing the canvas composed for the same text,
+        attributes and font when there is one so that text switching
+        between a few values (eg. a clock) isn't joined every time.
+        """
         fixed_size(size) # complain if parameter is wrong
+        key = self._cache_key()
+        canv = _bigtext_cache.get(key)
+        if canv is None:
+            canv = self._compose()
+            if len(_bigtext_cache) >= _BIGTEXT_CACHE_LIMIT:
+                _bigtext_cache.clear()
+            _bigtext_cache[key] = canv
+        # the shared canvas must not be finalized, so wrap it
+        canv = CompositeCanvas(canv)
+        canv.set_depends([])
+        return canv
+
+    def _compose(self):
         a = None
         ai = ak = 0
         o = []
@@ -84,13 +119,10 @@ class BigText(Widget):
                 c.fill_attr(a)
             o.append((c, None, False, width))
         if o:
-            canv = CanvasJoin(o)
-        else:
-            canv = TextCanvas([""]*rows, maxcol=0, 
-                check_width=False)
-            canv = CompositeCanvas(canv)
-        canv.set_depends([])
-        return canv
+            return CanvasJoin(o)
+        canv = TextCanvas([""]*rows, maxcol=0, 
+            check_width=False)
+        return CompositeCanvas(canv)
 
 
 class LineBox(WidgetDecoration, WidgetWrap):
@@ -205,6 +237,7 @@ class BarGraph(Widget):
         see set_segment_attributes for a description of the parameters.
         """
 
+        self._history = None
         self.set_segment_attributes( attlist, hatt, satt )
         self.set_data([], 1, None)
         self.set_bar_width(None)
@@ -279,6 +312,8 @@ class BarGraph(Widget):
             if fg<=bg:
                 raise BarGraphError, "fg (%s) not > bg (%s)" %(fg,bg)
         self.satt = satt
+        self._clear_display_cache()
+        self._invalidate()
             
             
         
@@ -304,8 +339,53 @@ class BarGraph(Widget):
         if hlines is not None:
             hlines = hlines[:] # shallow copy
             hlines.sort()
+        if self._history is not None:
+            bardata = deque(bardata, self._history)
         self.data = bardata, top, hlines
         self._invalidate()
+
+    def set_history(self, length):
+        """
+        Keep at most length bars, dropping the oldest ones when more are
+        added with append_data(), for graphs of streaming values.  Only
+        the newest bars are displayed when they don't all fit.
+
+        length -- number of bars to keep or None to keep all bars
+
+        >>> g = BarGraph(['bg', 'fg'])
+        >>> g.set_history(3)
+        >>> g.set_data([[1], [2]], 10)
+        >>> g.append_data([[3], [4]])
+        >>> list(g.data[0])
+        [[2], [3], [4]]
+        """
+        self._history = length
+        bardata, top, hlines = self.data
+        if length is None:
+            bardata = list(bardata)
+        else:
+            bardata = deque(bardata, length)
+        self.data = bardata, top, hlines
+        self._invalidate()
+
+    def append_data(self, bardata):
+        """
+        Add bar values after the current ones.
+
+        bardata -- a list of bar values, see set_data()
+        """
+        self.data[0].extend(bardata)
+        self._invalidate()
+
+    def set_bar(self, index, bar):
+        """
+        Replace the bar value at index.
+
+        Only the screen columns of bars whose values are new are
+        calculated again when the graph is next rendered.
+        """
+        self.data[0][index] = bar
+        self._invalidate()
     
     def _get_data(self, size):
         """
@@ -322,6 +402,9 @@ class BarGraph(Widget):
         widths = self.calculate_bar_widths((maxcol,maxrow),bardata)
         
         if len(bardata) > len(widths):
+            if self._history is not None:
+                return list(islice(bardata, len(bardata) - len(widths),
+                    None)), top, hlines
             return bardata[:len(widths)], top, hlines
 
         return bardata, top, hlines
@@ -416,7 +499,7 @@ class BarGraph(Widget):
 
         # reverse the hlines to match screen ordering
         rhl = []
-        for h in hlines:
+        for h in reversed(hlines):
             rh = float(top-h) * maxrow / top - shiftr
             if rh < 0:
                 continue
@@ -541,10 +624,146 @@ class BarGraph(Widget):
         return [(y // 8, row) for (y,row) in o]
             
             
+    _COLUMN_CACHE_LIMIT = 1024
+    _ROW_CACHE_LIMIT = 256
+
+    def _clear_display_cache(self):
+        # (maxrow, top, hlines, encoding) the caches are valid for
+        self._display_key = None
+        # tuple of bar values -> tuple of bar_type for each row
+        self._columns = {}
+        # (maxcol, row of bar_type for each column) -> TextCanvas
+        self._row_canvases = {}
+        # (bar_type, width) -> (encoded text, attr, cs)
+        self._segments = {}
+
+    def _bar_column(self, bar, top, hlines, maxrow):
+        """
+        Return a tuple with the bar_type of each row of a bar one
+        column wide.  Smoothing and hlines only depend on the row, so
+        each bar can be calculated on its own.
+        """
+        if self.use_smoothed():
+            disp = calculate_bargraph_display([bar], top, [1], maxrow * 8)
+            disp = self.smooth_display(disp)
+        else:
+            disp = calculate_bargraph_display([bar], top, [1], maxrow)
+        if hlines:
+            disp = self.hlines_display(disp, top, hlines, maxrow)
+        column = []
+        for y_count, row in disp:
+            column.extend([row[0][0]] * y_count)
+        return tuple(column)
+
+    def calculate_rows(self, size):
+        """
+        Return a list of (y_count, row) tuples, where row is a tuple of
+        the bar_type for each column, in the same way as
+        calculate_display() but reusing the columns calculated for bar
+        values already seen.  Columns past the last bar are left out.
+        """
+        (maxcol, maxrow) = size
+        bardata, top, hlines = self.get_data((maxcol, maxrow))
+        widths = self.calculate_bar_widths((maxcol, maxrow), bardata)
+
+        key = (maxrow, top, tuple(hlines or ()), get_encoding_mode())
+        if key != self._display_key:
+            self._clear_display_cache()
+            self._display_key = key
+        cache = self._columns
+
+        columns = []
+        for bar, width in zip(bardata, widths):
+            if width < 1:
+                continue
+            k = tuple(bar)
+            column = cache.get(k)
+            if column is None:
+                if len(cache) >= self._COLUMN_CACHE_LIMIT:
+                    cache.clear()
+                column = cache[k] = self._bar_column(bar, top, hlines,
+                    maxrow)
+            columns.extend([column] * width)
+        if columns:
+            rows = zip(*columns)
+        else:
+            rows = [()] * maxrow
+        return [(len(list(g)), row) for row, g in groupby(rows)]
+
+    def _segment(self, bar_type, width):
+        """
+        Return (encoded text, attr, cs) for width columns of bar_type.
+        """
+        seg = self._segments.get((bar_type, width))
+        if seg is not None:
+            return seg
+        if type(bar_type) == tuple:
+            if len(bar_type) == 3:
+                # vertical eighths
+                fg,bg,k = bar_type
+                a = self.satt[(fg,bg)]
+                t = self.eighths[k] * width
+            else:
+                # horizontal lines
+                bg,k = bar_type
+                a = self.hatt[bg]
+                t = self.hlines[k] * width
+        else:
+            a = self.attr[bar_type]
+            t = self.char[bar_type] * width
+        assert calc_width(t, 0, len(t)) == width, \
+            "Invalid characters in BarGraph!"
+        t, cs = apply_target_encoding(t)
+        seg = self._segments[(bar_type, width)] = (t, a, cs)
+        return seg
+
+    def _row_canvas(self, maxcol, row):
+        canv = self._row_canvases.get((maxcol, row))
+        if canv is not None:
+            return canv
+        text = []
+        attr = []
+        cs = []
+        col = 0
+        for bar_type, g in groupby(row):
+            width = min(len(list(g)), maxcol - col)
+            col += width
+            t, a, tcs = self._segment(bar_type, width)
+            text.append(t)
+            attr.append((a, len(t)))
+            rle_join_modify(cs, tcs)
+        if col < maxcol:
+            text.append(bytes().rjust(maxcol - col))
+            attr.append((None, maxcol - col))
+            rle_join_modify(cs, [(None, maxcol - col)])
+        canv = TextCanvas([bytes().join(text)], [attr], [cs], maxcol=maxcol,
+            check_width=False)
+        if len(self._row_canvases) >= self._ROW_CACHE_LIMIT:
+            self._row_canvases.clear()
+        self._row_canvases[(maxcol, row)] = canv
+        return canv
+
     def render(self, size, focus=False):
         """
         Render BarGraph.
+
+        Rows are built from columns and row canvases kept from earlier
+        renders, so after append_data() or set_bar() only the new bar
+        values are calculated.  Subclasses that override
+        calculate_display() are rendered from its result instead.
         """
+        (maxcol, maxrow) = size
+        if (type(self).calculate_display.im_func is not
+                BarGraph.calculate_display.im_func):
+            return self._render_display(size)
+
+        combinelist = []
+        for y_count, row in self.calculate_rows((maxcol, maxrow)):
+            c = self._row_canvas(maxcol, row)
+            combinelist += [(c, None, False)] * y_count
+        return CanvasCombine(combinelist)
+
+    def _render_display(self, size):
         (maxcol, maxrow) = size
         disp = self.calculate_display( (maxcol,maxrow) )
         
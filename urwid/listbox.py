@@ -19,16 +19,18 @@
 #
 # Urwid web site: http://excess.org/urwid/
 
-from urwid.util import is_mouse_press
-from urwid.canvas import SolidCanvas, CanvasCombine
+from urwid.util import is_mouse_press, get_encoding_mode
+from urwid.canvas import (SolidCanvas, CompositeCanvas, CanvasCombine,
+    CanvasJoin)
 from urwid.widget import Widget, nocache_widget_render_instance, BOX, GIVEN
-from urwid.decoration import calculate_top_bottom_filler, normalize_valign
+from urwid.decoration import (WidgetDecoration, calculate_top_bottom_filler,
+    normalize_valign)
 from urwid import signals
-from urwid.signals import connect_signal
+from urwid.signals import connect_signal, disconnect_signal
 from urwid.monitored_list import MonitoredList, MonitoredFocusList
 from urwid.container import WidgetContainerMixin
 from urwid.command_map import (CURSOR_UP, CURSOR_DOWN,
-    CURSOR_PAGE_UP, CURSOR_PAGE_DOWN)
+    CURSOR_PAGE_UP, CURSOR_PAGE_DOWN, CURSOR_MAX_LEFT, CURSOR_MAX_RIGHT)
 
 class ListWalkerError(Exception):
     pass
@@ -36,11 +38,30 @@ class ListWalkerError(Exception):
 class ListWalker(object):
     __metaclass__ = signals.MetaSignals
 
-    signals = ["modified"]
+    signals = ["modified", "modified_range"]
+
+    # set to the number of rows every widget in this list walker is
+    # known to have, so that ListBox won't ask each widget for its rows()
+    fixed_rows = None
 
     def _modified(self):
         signals.emit_signal(self, "modified")
 
+    def _modified_range(self, start, stop, new_stop):
+        """
+        Send "modified_range" with the positions of the items that
+        changed, then "modified".  The widgets previously at positions
+        range(start, stop) have been replaced by the ones now at
+        range(start, new_stop), positions after those have moved by
+        new_stop - stop.
+
+        A ListBox uses this to skip redrawing when nothing it displays
+        was changed, only list walkers with integer positions should
+        call it.
+        """
+        signals.emit_signal(self, "modified_range", start, stop, new_stop)
+        self._modified()
+
     def get_focus(self):
         """
         This default implementation relies on a focus attribute and a
@@ -138,7 +159,8 @@ class SimpleListWalker(MonitoredList, ListWalker):
 
         Changes made to this object (when it is treated as a list) are
         detected automatically and will cause ListBox objects using
-        this list walker to be updated.
+        this list walker to be updated.  Make many changes inside a
+        "with walker.batch():" block to update them only once.
         """
         if not getattr(contents, '__getitem__', None):
             raise ListWalkerError, "SimpleListWalker expecting list like object, got: %r"%(contents,)
@@ -159,6 +181,9 @@ class SimpleListWalker(MonitoredList, ListWalker):
             self.focus = max(0, len(self)-1)
         ListWalker._modified(self)
 
+    def _modified_range(self, start, stop, new_stop):
+        ListWalker._modified_range(self, start, stop, new_stop)
+
     def set_modified_callback(self, callback):
         """
         This function inherited from MonitoredList is not
@@ -216,6 +241,9 @@ class SimpleFocusListWalker(ListWalker, MonitoredFocusList):
         Also, items added or removed before the widget in focus with
         normal list methods will cause the focus to be updated
         intelligently.
+
+        Make many changes inside a "with walker.batch():" block to
+        update ListBox objects only once.
         """
         if not getattr(contents, '__getitem__', None):
             raise ListWalkerError("SimpleFocusListWalker expecting list like "
@@ -261,6 +289,218 @@ class SimpleFocusListWalker(ListWalker, MonitoredFocusList):
         return xrange(len(self))
 
 
+class RowHeightIndex(object):
+    """
+    Cumulative row counts for a sequence of widgets rendered at one
+    width, stored as a Fenwick tree so that the row offset of a
+    position and the position at a row offset are found in O(log n).
+    """
+    def __init__(self, heights=()):
+        """
+        heights -- iterable of row counts, one per position
+
+        >>> ri = RowHeightIndex([1, 3, 0, 2])
+        >>> len(ri), ri.total_rows()
+        (4, 6)
+        >>> [ri.rows_before(i) for i in range(5)]
+        [0, 1, 4, 4, 6]
+        """
+        self._heights = list(heights)
+        self._rebuild()
+
+    def _rebuild(self):
+        n = len(self._heights)
+        tree = [0] + self._heights
+        for i in xrange(1, n + 1):
+            j = i + (i & -i)
+            if j <= n:
+                tree[j] += tree[i]
+        self._tree = tree
+
+    def __len__(self):
+        return len(self._heights)
+
+    def height(self, position):
+        """Return the row count stored for position."""
+        return self._heights[position]
+
+    def rows_before(self, position):
+        """
+        Return the total rows of all positions before position.
+        """
+        tree = self._tree
+        total = 0
+        i = position
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def total_rows(self):
+        """Return the total rows of all positions."""
+        return self.rows_before(len(self._heights))
+
+    def position_at_row(self, row):
+        """
+        Return (position, inset) where position is the widget that
+        covers row and inset is the number of its rows above row.
+        Raise IndexError if row is outside the indexed rows.
+
+        >>> ri = RowHeightIndex([1, 3, 0, 2])
+        >>> [ri.position_at_row(r) for r in range(6)]
+        [(0, 0), (1, 0), (1, 1), (1, 2), (3, 0), (3, 1)]
+        >>> ri.position_at_row(6)
+        Traceback (most recent call last):
+        ...
+        IndexError: row out of range: 6
+        """
+        n = len(self._heights)
+        if row < 0 or row >= self.total_rows():
+            raise IndexError, "row out of range: %s" % (row,)
+        tree = self._tree
+        pos = 0
+        step = 1
+        while step * 2 <= n:
+            step *= 2
+        while step:
+            if pos + step <= n and tree[pos + step] <= row:
+                pos += step
+                row -= tree[pos]
+            step //= 2
+        return pos, row
+
+    def set_height(self, position, rows):
+        """Update the row count stored for position."""
+        delta = rows - self._heights[position]
+        if not delta:
+            return
+        self._heights[position] = rows
+        tree = self._tree
+        i = position + 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def append(self, rows):
+        """Add a row count for a new position at the end."""
+        self._heights.append(rows)
+        i = len(self._heights)
+        self._tree.append(rows + self.rows_before(i - 1) -
+            self.rows_before(i - (i & -i)))
+
+    def splice(self, start, stop, heights):
+        """
+        Replace the row counts of positions start to stop with heights,
+        like a slice assignment.  Appending at the end is O(log n) per
+        new position, other changes rebuild the tree in O(n) without
+        asking any widget for its rows.
+
+        >>> ri = RowHeightIndex([1, 1])
+        >>> ri.splice(2, 2, [2, 3]); ri.total_rows()
+        7
+        >>> ri.splice(0, 1, []); [ri.rows_before(i) for i in range(4)]
+        [0, 1, 3, 6]
+        """
+        if start == stop == len(self._heights):
+            for rows in heights:
+                self.append(rows)
+            return
+        self._heights[start:stop] = heights
+        self._rebuild()
+
+
+class IndexedListWalker(SimpleFocusListWalker):
+    """
+    A SimpleFocusListWalker that keeps a RowHeightIndex of its widgets
+    for each recently used width, so that the row offset of any
+    position, and the position at any row offset, can be found without
+    rendering the widgets in between.
+
+    Row counts are collected once per width and are kept up to date as
+    the list is modified.  Widgets that change their own height (eg. a
+    Text widget given longer text) must be reported with
+    invalidate_rows().
+    """
+    max_indexed_widths = 4
+
+    def __init__(self, contents):
+        """
+        contents -- list to copy into this object
+
+        >>> from urwid import Text
+        >>> w = IndexedListWalker([Text("a"), Text("b\\nc"), Text("d")])
+        >>> w.total_rows(5), w.rows_before(2, 5)
+        (4, 3)
+        >>> w.position_at_row(2, 5)
+        (1, 1)
+        >>> w.append(Text("efghij")); w.total_rows(5)
+        6
+        >>> w[1].set_text("b"); w.invalidate_rows(1); w.total_rows(5)
+        5
+        """
+        self._row_indexes = {}
+        SimpleFocusListWalker.__init__(self, contents)
+
+    def _modified_range(self, start, stop, new_stop):
+        for maxcol, index in self._row_indexes.items():
+            index.splice(start, stop, [self._widget_rows(w, maxcol)
+                for w in self[start:new_stop]])
+        SimpleFocusListWalker._modified_range(self, start, stop, new_stop)
+
+    def _widget_rows(self, w, maxcol):
+        if self.fixed_rows is not None:
+            return self.fixed_rows
+        return w.rows((maxcol,))
+
+    def row_index(self, maxcol):
+        """
+        Return the RowHeightIndex for widgets rendered maxcol columns
+        wide, collecting row counts from every widget the first time a
+        width is used.
+        """
+        index = self._row_indexes.get(maxcol)
+        if index is None:
+            if len(self._row_indexes) >= self.max_indexed_widths:
+                self._row_indexes.clear()
+            index = RowHeightIndex([self._widget_rows(w, maxcol)
+                for w in self])
+            self._row_indexes[maxcol] = index
+        return index
+
+    def invalidate_rows(self, position=None):
+        """
+        Update the row counts of the widget at position after it has
+        changed its height, or of all widgets if position is None.
+        """
+        if position is None:
+            self._row_indexes.clear()
+            return
+        w = self[position]
+        for maxcol, index in self._row_indexes.items():
+            index.set_height(position, self._widget_rows(w, maxcol))
+
+    def rows_before(self, position, maxcol):
+        """
+        Return the number of rows above position when rendered maxcol
+        columns wide.
+        """
+        return self.row_index(maxcol).rows_before(position)
+
+    def total_rows(self, maxcol):
+        """
+        Return the number of rows of all widgets rendered maxcol
+        columns wide.
+        """
+        return self.row_index(maxcol).total_rows()
+
+    def position_at_row(self, row, maxcol):
+        """
+        Return (position, inset) for the widget covering row when
+        rendered maxcol columns wide, see RowHeightIndex.position_at_row.
+        """
+        return self.row_index(maxcol).position_at_row(row)
+
+
 class ListBoxError(Exception):
     pass
 
@@ -283,13 +523,23 @@ class ListBox(Widget, WidgetContainerMixin):
         else:
             self.body = PollingListWalker(body)
 
+        # (top position, bottom position, filled, focus position, focus
+        # row offset) of the widgets shown by each canvas we have cached,
+        # keyed by render() parameters
+        self._visible_windows = {}
+        self._body_change_visible = True
         try:
-            connect_signal(self.body, "modified", self._invalidate)
+            connect_signal(self.body, "modified", self._body_modified)
         except NameError:
             # our list walker has no modified signal so we must not
             # cache our canvases because we don't know when our
             # content has changed
             self.render = nocache_widget_render_instance(self)
+        try:
+            connect_signal(self.body, "modified_range",
+                self._body_modified_range)
+        except NameError:
+            pass
 
         # offset_rows is the number of rows between the top of the view
         # and the top of the focused item
@@ -309,6 +559,46 @@ class ListBox(Widget, WidgetContainerMixin):
         # variable for delayed valign change used by set_focus_valign
         self.set_focus_valign_pending = None
 
+    def _invalidate(self):
+        self._visible_windows = {}
+        super(ListBox, self)._invalidate()
+
+    def _body_modified_range(self, start, stop, new_stop):
+        """
+        Check whether a change reported by our list walker touches any
+        widget we have displayed, sent just before "modified".
+        """
+        for top, bottom, filled, fpos, offset in \
+                self._visible_windows.values():
+            if not filled:
+                # the end of the list is showing, anything may move
+                # into view
+                break
+            if start > bottom:
+                continue
+            if stop <= top and stop == new_stop:
+                # widgets above the view replaced, no positions moved
+                continue
+            break
+        else:
+            self._body_change_visible = False
+
+    def _body_modified(self):
+        visible = self._body_change_visible
+        self._body_change_visible = True
+        if visible:
+            self._invalidate()
+
+
+    def _rows(self, widget, maxcol, focus=False):
+        """
+        Return the rows of widget, or the fixed_rows value of the list
+        walker when it declares one so widgets don't need to be asked.
+        """
+        rows = getattr(self.body, 'fixed_rows', None)
+        if rows is None:
+            return widget.rows((maxcol,), focus)
+        return rows
 
     def calculate_visible(self, size, focus=False ):
         """
@@ -369,7 +659,7 @@ class ListBox(Widget, WidgetContainerMixin):
 
         #    set trim_top by focus trimmimg
         trim_top = inset_rows
-        focus_rows = focus_widget.rows((maxcol,),True)
+        focus_rows = self._rows(focus_widget, maxcol, True)
 
         # 2. collect the widgets above the focus
         pos = focus_pos
@@ -383,7 +673,7 @@ class ListBox(Widget, WidgetContainerMixin):
                 break
             top_pos = pos
 
-            p_rows = prev.rows( (maxcol,) )
+            p_rows = self._rows(prev, maxcol)
             if p_rows: # filter out 0-height widgets
                 fill_above.append( (prev, pos, p_rows) )
             if p_rows > fill_lines: # crosses top edge?
@@ -403,7 +693,7 @@ class ListBox(Widget, WidgetContainerMixin):
             if next is None: # run out of widgets below?
                 break
 
-            n_rows = next.rows( (maxcol,) )
+            n_rows = self._rows(next, maxcol)
             if n_rows: # filter out 0-height widgets
                 fill_below.append( (next, pos, n_rows) )
             if n_rows > fill_lines: # crosses bottom edge?
@@ -430,7 +720,7 @@ class ListBox(Widget, WidgetContainerMixin):
             if prev is None:
                 break
 
-            p_rows = prev.rows( (maxcol,) )
+            p_rows = self._rows(prev, maxcol)
             fill_above.append( (prev, pos, p_rows) )
             if p_rows > fill_lines: # more than required
                 trim_top = p_rows-fill_lines
@@ -458,7 +748,7 @@ class ListBox(Widget, WidgetContainerMixin):
         if middle is None:
             return SolidCanvas(" ", maxcol, maxrow)
 
-        _ignore, focus_widget, focus_pos, focus_rows, cursor = middle
+        row_offset, focus_widget, focus_pos, focus_rows, cursor = middle
         trim_top, fill_above = top
         trim_bottom, fill_below = bottom
 
@@ -502,9 +792,18 @@ class ListBox(Widget, WidgetContainerMixin):
         if rows > maxrow:
             raise ListBoxError, "Listbox contents too long!  Probably urwid's fault (please report): %r" % ((top,middle,bottom),)
 
+        top_pos = bottom_pos = focus_pos
+        if fill_above: top_pos = fill_above[0][1]
+        if fill_below: bottom_pos = fill_below[-1][1]
+        # the view is only closed at the bottom when something follows
+        # the last widget shown, otherwise it may have been filled from
+        # above and an append would shift it
+        filled = rows == maxrow and (trim_bottom != 0 or
+            self.body.get_next(bottom_pos)[0] is not None)
+        self._visible_windows[(maxcol, maxrow), bool(focus)] = (
+            top_pos, bottom_pos, filled, focus_pos, row_offset)
+
         if rows < maxrow:
-            bottom_pos = focus_pos
-            if fill_below: bottom_pos = fill_below[-1][1]
             if trim_bottom != 0 or self.body.get_next(bottom_pos) != (None,None):
                 raise ListBoxError, "Listbox contents too short!  Probably urwid's fault (please report): %r" % ((top,middle,bottom),)
             final_canvas.pad_trim_top_bottom(0, maxrow - rows)
@@ -656,7 +955,7 @@ class ListBox(Widget, WidgetContainerMixin):
         if focus_widget is None:
             return
 
-        rows = focus_widget.rows((maxcol,), focus)
+        rows = self._rows(focus_widget, maxcol, focus)
         rtop, rbot = calculate_top_bottom_filler(maxrow,
             vt, va, GIVEN, rows, None, 0, 0)
 
@@ -741,7 +1040,7 @@ class ListBox(Widget, WidgetContainerMixin):
         # failed to find widget among visible widgets
         self.body.set_focus( position )
         widget, position = self.body.get_focus()
-        rows = widget.rows((maxcol,), focus)
+        rows = self._rows(widget, maxcol, focus)
 
         if coming_from=='below':
             offset = 0
@@ -777,7 +1076,7 @@ class ListBox(Widget, WidgetContainerMixin):
             self.inset_fraction = (0,1)
         else:
             target, _ignore = self.body.get_focus()
-            tgt_rows = target.rows( (maxcol,), True )
+            tgt_rows = self._rows(target, maxcol, True)
             if offset_inset + tgt_rows <= 0:
                 raise ListBoxError, "Invalid offset_inset: %r, only %r rows in target!" %(offset_inset, tgt_rows)
             self.offset_rows = 0
@@ -842,7 +1141,7 @@ class ListBox(Widget, WidgetContainerMixin):
         self._invalidate()
         self.body.set_focus(position)
         target, _ignore = self.body.get_focus()
-        tgt_rows = target.rows( (maxcol,), True)
+        tgt_rows = self._rows(target, maxcol, True)
         if snap_rows is None:
             snap_rows = maxrow - 1
 
@@ -921,7 +1220,7 @@ class ListBox(Widget, WidgetContainerMixin):
         """Return (offset rows, inset rows) for focus widget."""
         (maxcol, maxrow) = size
         focus_widget, pos = self.body.get_focus()
-        focus_rows = focus_widget.rows((maxcol,), True)
+        focus_rows = self._rows(focus_widget, maxcol, True)
         offset_rows = self.offset_rows
         inset_rows = 0
         if offset_rows == 0:
@@ -972,6 +1271,8 @@ class ListBox(Widget, WidgetContainerMixin):
          'down'      down one line (or widget)
          'page up'   move cursor up one listbox length
          'page down' move cursor down one listbox length
+         'home'      move to the first widget (if not handled by it)
+         'end'       move to the last widget (if not handled by it)
         """
         (maxcol, maxrow) = size
 
@@ -1006,8 +1307,49 @@ class ListBox(Widget, WidgetContainerMixin):
         if self._command_map[key] == CURSOR_PAGE_DOWN:
             return actual_key(self._keypress_page_down((maxcol, maxrow)))
 
+        if self._command_map[key] == CURSOR_MAX_LEFT:
+            return actual_key(self._keypress_max_left((maxcol, maxrow)))
+
+        if self._command_map[key] == CURSOR_MAX_RIGHT:
+            return actual_key(self._keypress_max_right((maxcol, maxrow)))
+
         return key
 
+    def _keypress_max_left(self, size):
+        """
+        Move the focus to the first position of a list walker that
+        supports positions(), without visiting the positions between.
+        """
+        positions = getattr(self.body, 'positions', None)
+        if positions is None:
+            return True
+        for pos in positions():
+            break
+        else:
+            return True
+        self.body.set_focus(pos)
+        self.shift_focus(size, 0)
+        self.make_cursor_visible(size)
+
+    def _keypress_max_right(self, size):
+        """
+        Move the focus to the last position of a list walker that
+        supports positions(), aligned with the bottom of the ListBox.
+        """
+        (maxcol, maxrow) = size
+        positions = getattr(self.body, 'positions', None)
+        if positions is None:
+            return True
+        for pos in positions(reverse=True):
+            break
+        else:
+            return True
+        self.body.set_focus(pos)
+        widget, pos = self.body.get_focus()
+        rows = self._rows(widget, maxcol, True)
+        self.shift_focus(size, min(maxrow - rows, maxrow - 1))
+        self.make_cursor_visible(size)
+
 
     def _keypress_up(self, size):
         (maxcol, maxrow) = size
@@ -1042,7 +1384,7 @@ class ListBox(Widget, WidgetContainerMixin):
             if widget is None:
                 # cannot scroll any further
                 return True # keypress not handled
-            rows = widget.rows((maxcol,), True)
+            rows = self._rows(widget, maxcol, True)
             row_offset -= rows
             if rows and widget.selectable():
                 # this one will do
@@ -1071,7 +1413,7 @@ class ListBox(Widget, WidgetContainerMixin):
                     widget, pos = self.body.get_prev(pos)
                     if widget is None:
                         return # can't do anything
-                    rows = widget.rows((maxcol,), True)
+                    rows = self._rows(widget, maxcol, True)
                     row_offset -= rows
 
                 if -row_offset >= rows:
@@ -1120,7 +1462,7 @@ class ListBox(Widget, WidgetContainerMixin):
             if widget is None:
                 # cannot scroll any further
                 return True # keypress not handled
-            rows = widget.rows((maxcol,))
+            rows = self._rows(widget, maxcol)
             if rows and widget.selectable():
                 # this one will do
                 self.change_focus((maxcol,maxrow), pos,
@@ -1222,7 +1564,7 @@ class ListBox(Widget, WidgetContainerMixin):
         while row_offset > -snap_rows:
             widget, pos = self.body.get_prev(pos)
             if widget is None: break
-            rows = widget.rows((maxcol,))
+            rows = self._rows(widget, maxcol)
             row_offset -= rows
             # determine if one below puts current one into snap rgn
             if row_offset > 0:
@@ -1348,7 +1690,7 @@ class ListBox(Widget, WidgetContainerMixin):
             # no dice, we're stuck here
             return
         # bring in only one row if possible
-        rows = widget.rows((maxcol,), True)
+        rows = self._rows(widget, maxcol, True)
         self.change_focus((maxcol,maxrow), pos, -(rows-1),
             'below', (self.pref_col, rows-1), 0 )
 
@@ -1407,7 +1749,7 @@ class ListBox(Widget, WidgetContainerMixin):
         while row_offset < maxrow+snap_rows:
             widget, pos = self.body.get_next(pos)
             if widget is None: break
-            rows = widget.rows((maxcol,))
+            rows = self._rows(widget, maxcol)
             t.append( (row_offset, widget, pos, rows) )
             row_offset += rows
             # determine if one above puts current one into snap rgn
@@ -1524,7 +1866,7 @@ class ListBox(Widget, WidgetContainerMixin):
             # no dice, we're stuck here
             return
         # bring in only one row if possible
-        rows = widget.rows((maxcol,), True)
+        rows = self._rows(widget, maxcol, True)
         self.change_focus((maxcol,maxrow), pos, maxrow-1,
             'above', (self.pref_col, 0), 0 )
 
@@ -1606,6 +1948,67 @@ class ListBox(Widget, WidgetContainerMixin):
 
         return l
 
+    def _row_index(self, maxcol):
+        row_index = getattr(self.body, 'row_index', None)
+        if row_index is None:
+            raise ListBoxError("Scroll position requires a list walker "
+                "with a row_index() method, eg. IndexedListWalker, "
+                "got: %r" % (self.body,))
+        return row_index(maxcol)
+
+    def get_scroll_position(self, size, focus=False):
+        """
+        Return (*top*, *total*) where *top* is the number of body rows
+        scrolled off the top of the ListBox and *total* is the number of
+        rows of all widgets in the body.  Only the visible widgets are
+        rendered, the rest come from the list walker's row index.
+
+        :raises ListBoxError: if :attr:`body` has no ``row_index()``
+        """
+        (maxcol, maxrow) = size
+        index = self._row_index(maxcol)
+        window = self._visible_windows.get(((maxcol, maxrow), bool(focus)))
+        if (window is not None and self.set_focus_pending is None and
+                self.set_focus_valign_pending is None):
+            # nothing has moved since our last render(), use its layout
+            top_pos, bottom_pos, filled, focus_pos, row_offset = window
+        else:
+            middle, top, bottom = self.calculate_visible(size, focus)
+            if middle is None:
+                return 0, 0
+            row_offset, focus_widget, focus_pos, focus_rows, cursor = middle
+        top_row = index.rows_before(focus_pos) - row_offset
+        return max(0, top_row), index.total_rows()
+
+    def set_scroll_position(self, size, row):
+        """
+        Scroll so that body row *row* is at the top of the ListBox and
+        put the focus on the widget containing it.  *row* is limited
+        so the ListBox stays filled when possible.
+
+        :raises ListBoxError: if :attr:`body` has no ``row_index()``
+        """
+        (maxcol, maxrow) = size
+        index = self._row_index(maxcol)
+        total = index.total_rows()
+        if not total:
+            return
+        row = max(0, min(row, total - maxrow))
+        position, inset = index.position_at_row(row)
+        self.body.set_focus(position)
+        rows = self._rows(self.body.get_focus()[0], maxcol, True)
+        self.shift_focus(size, -min(inset, rows - 1))
+
+    def set_scroll_fraction(self, size, fraction):
+        """
+        Scroll to *fraction* of the way through the body, from 0.0
+        (the top) to 1.0 (the bottom).  See :meth:`set_scroll_position`.
+        """
+        (maxcol, maxrow) = size
+        total = self._row_index(maxcol).total_rows()
+        self.set_scroll_position(size,
+            int(round(fraction * max(0, total - maxrow))))
+
     def __iter__(self):
         """
         Return an iterator over the positions in this ListBox.
@@ -1666,3 +2069,153 @@ class ListBox(Widget, WidgetContainerMixin):
             if not w: break
 
 
+def calculate_scroll_thumb(maxrow, top, total):
+    """
+    Return (*thumb top*, *thumb rows*) for a scroll bar maxrow rows
+    high showing a view scrolled top rows into a body of total rows.
+    The thumb only touches an end of the scroll bar when that end of
+    the body is visible.
+
+    >>> calculate_scroll_thumb(10, 0, 5)
+    (0, 10)
+    >>> calculate_scroll_thumb(10, 0, 100)
+    (0, 1)
+    >>> calculate_scroll_thumb(10, 1, 100), calculate_scroll_thumb(10, 89, 100)
+    ((1, 1), (8, 1))
+    >>> calculate_scroll_thumb(10, 90, 100), calculate_scroll_thumb(10, 20, 40)
+    ((9, 1), (5, 2))
+    """
+    if total <= maxrow:
+        return 0, maxrow
+    thumb_rows = max(1, maxrow * maxrow // total)
+    span = total - maxrow
+    free = maxrow - thumb_rows
+    top = max(0, min(top, span))
+    thumb_top = (top * free + span // 2) // span
+    if top < span and thumb_top == free and free > 1:
+        thumb_top = free - 1
+    if top and not thumb_top and free:
+        thumb_top = 1
+    return thumb_top, thumb_rows
+
+
+class ScrollBar(WidgetDecoration):
+    """
+    Add a one column scroll bar to the right of a ListBox.  The body of
+    the ListBox must have a row index (see :class:`IndexedListWalker`)
+    so that the position can be shown without rendering the whole body.
+    """
+    _sizing = frozenset([BOX])
+
+    def __init__(self, list_box, thumb_char=None, trough_char=u' ',
+            thumb_attr=None, trough_attr=None):
+        """
+        :param list_box: ListBox to decorate
+        :param thumb_char: character for the part showing the visible rows,
+            a full block in UTF-8 mode and ``#`` otherwise when ``None``
+        :param trough_char: character for the rest of the scroll bar
+        :param thumb_attr: display attribute for the thumb
+        :param trough_attr: display attribute for the trough
+
+        Clicking on the scroll bar scrolls to that part of the body.
+
+        >>> ScrollBar(ListBox(IndexedListWalker([])))
+        <ScrollBar selectable box widget <ListBox selectable box widget>>
+        """
+        WidgetDecoration.__init__(self, list_box)
+        self.thumb_char = thumb_char
+        self.trough_char = trough_char
+        self.thumb_attr = thumb_attr
+        self.trough_attr = trough_attr
+        self._connect_body(list_box)
+
+    def _connect_body(self, list_box):
+        # the ListBox isn't invalidated by changes to rows it doesn't
+        # show, but the thumb still has to change with the body length
+        try:
+            connect_signal(list_box.body, "modified", self._invalidate)
+        except NameError:
+            pass
+
+    def _disconnect_body(self, list_box):
+        try:
+            disconnect_signal(list_box.body, "modified", self._invalidate)
+        except NameError:
+            pass
+
+    def _set_original_widget(self, original_widget):
+        self._disconnect_body(self._original_widget)
+        self._connect_body(original_widget)
+        WidgetDecoration._set_original_widget(self, original_widget)
+    original_widget = property(WidgetDecoration._get_original_widget,
+        _set_original_widget)
+
+    def render(self, size, focus=False):
+        (maxcol, maxrow) = size
+        lsize = (maxcol - 1, maxrow)
+        canv = self._original_widget.render(lsize, focus)
+        top, total = self._original_widget.get_scroll_position(lsize, focus)
+        thumb_top, thumb_rows = calculate_scroll_thumb(maxrow, top, total)
+
+        thumb_char = self.thumb_char
+        if thumb_char is None:
+            if get_encoding_mode() == 'utf8':
+                thumb_char = u'\u2588'
+            else:
+                thumb_char = u'#'
+
+        parts = []
+        for char, attr, rows in [
+                (self.trough_char, self.trough_attr, thumb_top),
+                (thumb_char, self.thumb_attr, thumb_rows),
+                (self.trough_char, self.trough_attr,
+                    maxrow - thumb_top - thumb_rows)]:
+            if not rows:
+                continue
+            c = CompositeCanvas(SolidCanvas(char, 1, rows))
+            if attr is not None:
+                c.fill_attr(attr)
+            parts.append((c, None, False))
+        bar = CanvasCombine(parts)
+        return CanvasJoin([(canv, None, True, maxcol - 1),
+            (bar, None, False, 1)])
+
+    def keypress(self, size, key):
+        (maxcol, maxrow) = size
+        return self._original_widget.keypress((maxcol - 1, maxrow), key)
+
+    def mouse_event(self, size, event, button, col, row, focus):
+        (maxcol, maxrow) = size
+        lsize = (maxcol - 1, maxrow)
+        if col >= maxcol - 1:
+            if not is_mouse_press(event) or button != 1:
+                return False
+            self._original_widget.set_scroll_fraction(lsize,
+                row / float(max(1, maxrow - 1)))
+            return True
+        if not hasattr(self._original_widget, 'mouse_event'):
+            return False
+        return self._original_widget.mouse_event(lsize, event, button,
+            col, row, focus)
+
+    def get_cursor_coords(self, size):
+        (maxcol, maxrow) = size
+        if not hasattr(self._original_widget, 'get_cursor_coords'):
+            return None
+        return self._original_widget.get_cursor_coords((maxcol - 1, maxrow))
+
+    def get_pref_col(self, size):
+        (maxcol, maxrow) = size
+        if not hasattr(self._original_widget, 'get_pref_col'):
+            return None
+        return self._original_widget.get_pref_col((maxcol - 1, maxrow))
+
+    def move_cursor_to_coords(self, size, col, row):
+        (maxcol, maxrow) = size
+        if not hasattr(self._original_widget, 'move_cursor_to_coords'):
+            return True
+        if type(col) == int and col >= maxcol - 1:
+            # the scroll bar column, stay in the list box
+            col = maxcol - 2
+        return self._original_widget.move_cursor_to_coords(
+            (maxcol - 1, maxrow), col, row)
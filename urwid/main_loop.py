@@ -25,15 +25,22 @@
 import time
 import heapq
 import select
+import errno
 import fcntl
 import os
+import sys
+import threading
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 from urwid.util import is_mouse_event
-from urwid.compat import PYTHON3
+from urwid.compat import PYTHON3, B
 from urwid.command_map import command_map, REDRAW_SCREEN
 from urwid.wimp import PopUpTarget
 from urwid import signals
-from urwid.display_common import INPUT_DESCRIPTORS_CHANGED
+from urwid.display_common import INPUT_DESCRIPTORS_CHANGED, OUTPUT_PENDING
 
 PIPE_BUFFER_READ_SIZE = 4096 # can expect this much on Linux, so try for that
 
@@ -72,14 +79,20 @@ class MainLoop(object):
     :type unhandled_input: callable
 
     :param event_loop: if :attr:`.screen` supports external an event loop it may be
-                       given here, default is a new :class:`SelectEventLoop` instance;
-                       stored as :attr:`.event_loop`
+                       given here, default is a new :class:`PollEventLoop` instance
+                       where :func:`select.epoll` is available, otherwise a new
+                       :class:`SelectEventLoop` instance; stored as :attr:`.event_loop`
     :type event_loop: event loop instance
 
     :param pop_ups: `True` to wrap :attr:`.widget` with a :class:`PopUpTarget`
                     instance to allow any widget to open a pop-up anywhere on the screen
     :type pop_ups: boolean
 
+    :param max_fps: maximum number of times per second the screen is redrawn
+                    when entering idle, ``None`` to redraw on every idle;
+                    stored as :attr:`max_fps`
+    :type max_fps: float
+
 
     .. attribute:: screen
 
@@ -88,11 +101,30 @@ class MainLoop(object):
     .. attribute:: event_loop
 
         The event loop object this main loop uses for waiting on alarms and IO
+
+    .. attribute:: thread_pool
+
+        :class:`ThreadPool` used by :meth:`run_in_thread`, a default one
+        is created the first time it is needed
+
+    .. attribute:: max_fps
+
+        Maximum screen redraw rate. Changes that arrive faster than this
+        are coalesced into a single redraw at the start of the next frame.
+
+    .. attribute:: output_retry_delay
+
+        Seconds to wait before redrawing when the screen reports that the
+        terminal has not accepted all of its output, see
+        :meth:`raw_display.Screen.set_output_nonblocking`.  Only used
+        when the event loop has no ``watch_file_write()`` method to wait
+        for the terminal to accept more.
     """
+    output_retry_delay = 0.05
 
     def __init__(self, widget, palette=(), screen=None,
             handle_mouse=True, input_filter=None, unhandled_input=None,
-            event_loop=None, pop_ups=False):
+            event_loop=None, pop_ups=False, max_fps=None):
         self._widget = widget
         self.handle_mouse = handle_mouse
         self.pop_ups = pop_ups # triggers property setting side-effect
@@ -115,12 +147,21 @@ class MainLoop(object):
             raise NotImplementedError("screen object passed "
                 "%r does not support external event loops" % (screen,))
         if event_loop is None:
-            event_loop = SelectEventLoop()
+            if hasattr(select, 'epoll'):
+                event_loop = PollEventLoop()
+            else:
+                event_loop = SelectEventLoop()
         self.event_loop = event_loop
 
         self._input_timeout = None
         self._watch_pipes = {}
 
+        self.max_fps = max_fps
+        self.thread_pool = None
+        self._last_draw = 0
+        self._frame_alarm = None
+        self._output_watch = None
+
     def _set_widget(self, widget):
         self._widget = widget
         if self.pop_ups:
@@ -257,6 +298,39 @@ class MainLoop(object):
         return self.event_loop.remove_watch_file(handle)
 
 
+    def run_in_thread(self, fn, callback=None, user_data=None,
+            error_callback=None):
+        """
+        Call *fn* with no parameters in a worker thread of
+        :attr:`thread_pool`, then call *callback* from within the
+        :meth:`run` method with its result. Returns a :class:`ThreadJob`
+        that may be used to cancel the call.
+
+        Use this for blocking calls, such as running external commands or
+        checking files on slow filesystems, that would otherwise stop the
+        screen from being updated.  *fn* must not modify widgets.
+
+        :param fn: function to call in a worker thread
+        :type fn: callable
+        :param callback: function to call with three parameters: this main
+                         loop object, the value returned by *fn* and
+                         *user_data*
+        :type callback: callable
+        :param error_callback: function to call with three parameters if
+                               *fn* raises an exception: this main loop
+                               object, the ``sys.exc_info()`` tuple and
+                               *user_data*. If not given the exception is
+                               raised from within :meth:`run`
+        :type error_callback: callable
+
+        Raises :exc:`JobQueueFull` when too many calls are already waiting
+        for a worker thread.
+        """
+        if self.thread_pool is None:
+            self.thread_pool = ThreadPool(self)
+        return self.thread_pool.submit(
+            ThreadJob(fn, callback, error_callback, user_data))
+
     def run(self):
         """
         Start the main loop handling input events and updating the screen. The
@@ -329,6 +403,11 @@ class MainLoop(object):
                 reset_input_descriptors)
         except NameError:
             pass
+        try:
+            signals.connect_signal(self.screen, OUTPUT_PENDING,
+                self._output_pending)
+        except NameError:
+            pass
         # watch our input descriptors
         reset_input_descriptors()
         idle_handle = self.event_loop.enter_idle(self.entering_idle)
@@ -337,10 +416,15 @@ class MainLoop(object):
         self.event_loop.run()
 
         # tidy up
+        if self._output_watch is not None:
+            self.event_loop.remove_watch_file_write(self._output_watch)
+            self._output_watch = None
         self.event_loop.remove_enter_idle(idle_handle)
         reset_input_descriptors(True)
         signals.disconnect_signal(self.screen, INPUT_DESCRIPTORS_CHANGED,
             reset_input_descriptors)
+        signals.disconnect_signal(self.screen, OUTPUT_PENDING,
+            self._output_pending)
 
     def _update(self, timeout=False):
         """
@@ -394,8 +478,8 @@ class MainLoop(object):
         This method is used when the screen does not support using
         external event loops.
 
-        The alarms stored in the SelectEventLoop in :attr:`event_loop`
-        are modified by this method.
+        The alarms stored in the SelectEventLoop or PollEventLoop in
+        :attr:`event_loop` are modified by this method.
         """
         next_alarm = None
 
@@ -427,8 +511,9 @@ class MainLoop(object):
                 sec = next_alarm[0] - time.time()
                 if sec > 0:
                     break
-                tm, callback = next_alarm
-                callback()
+                callback = next_alarm[-1]
+                if callback is not None: # not removed
+                    callback()
 
                 if self.event_loop._alarms:
                     next_alarm = heapq.heappop(self.event_loop._alarms)
@@ -544,9 +629,102 @@ class MainLoop(object):
         This method is called whenever the event loop is about to enter the
         idle state. :meth:`draw_screen` is called here to update the
         screen when anything has changed.
+
+        When :attr:`max_fps` is set and the screen was drawn less than one
+        frame ago the redraw is postponed with an alarm instead, so any
+        number of changes within a frame cost a single redraw.
+        """
+        if not self.screen.started:
+            return
+        if self._frame_alarm is not None:
+            # a redraw is already pending for the next frame
+            return
+        if self.max_fps:
+            delay = self._last_draw + 1.0 / self.max_fps - time.time()
+            if delay > 0:
+                self._frame_alarm = self.event_loop.alarm(delay,
+                    self._next_frame)
+                return
+        self.draw_screen()
+
+    def _next_frame(self):
+        # the event loop enters idle right after an alarm, which will
+        # do the postponed redraw
+        self._frame_alarm = None
+
+    def _output_pending(self):
+        # the screen has output the terminal did not accept yet, redraw
+        # once it will take more so the rest is sent along with any
+        # frame that was dropped
+        if self._output_watch is not None:
+            return
+        get_fd = getattr(self.screen, 'get_output_descriptor', None)
+        watch = getattr(self.event_loop, 'watch_file_write', None)
+        fd = None
+        if get_fd is not None:
+            fd = get_fd()
+        if watch is not None and fd is not None:
+            self._output_watch = watch(fd, self._output_writable)
+        elif self._frame_alarm is None:
+            self._frame_alarm = self.event_loop.alarm(
+                self.output_retry_delay, self._next_frame)
+
+    def _output_writable(self):
+        # the event loop enters idle right after this, which flushes the
+        # output and redraws, watching again if it is still blocked
+        self.event_loop.remove_watch_file_write(self._output_watch)
+        self._output_watch = None
+
+    def _test_output_pending(self):
+        """
+        >>> w = _refl("widget")
+        >>> scr = _refl("screen")
+        >>> scr.get_output_descriptor_rval = 7
+        >>> evl = _refl("event_loop")
+        >>> evl.watch_file_write_rval = "output watch"
+        >>> ml = MainLoop(w, [], scr, event_loop=evl)
+        >>> ml._output_pending()
+        screen.get_output_descriptor()
+        event_loop.watch_file_write(7, <bound method ...>)
+        >>> ml._output_pending()  # already waiting
+        >>> ml._output_writable()
+        event_loop.remove_watch_file_write('output watch')
+        >>> scr.get_output_descriptor_rval = None
+        >>> evl.alarm_rval = "retry alarm"
+        >>> ml._output_pending()
+        screen.get_output_descriptor()
+        event_loop.alarm(0.05, <bound method ...>)
+        """
+
+    def _test_entering_idle(self):
+        """
+        >>> w = _refl("widget")
+        >>> w.render_rval = "fake canvas"
+        >>> scr = _refl("screen")
+        >>> scr.get_cols_rows_rval = (20, 10)
+        >>> scr.started = True
+        >>> evl = _refl("event_loop")
+        >>> evl.alarm_rval = "frame alarm"
+        >>> ml = MainLoop(w, [], scr, event_loop=evl, max_fps=10)
+        >>> ml.entering_idle()
+        screen.get_cols_rows()
+        widget.render((20, 10), focus=True)
+        screen.draw_screen((20, 10), 'fake canvas')
+        >>> ml.entering_idle()  # too soon, wait for the next frame
+        event_loop.alarm(..., <bound method ...>)
+        >>> ml.entering_idle()  # coalesced into the pending frame
+        >>> ml._next_frame()
+        >>> ml._last_draw -= 1
+        >>> ml.entering_idle()
+        widget.render((20, 10), focus=True)
+        screen.draw_screen((20, 10), 'fake canvas')
+        >>> ml.entering_idle()
+        event_loop.alarm(..., <bound method ...>)
+        >>> ml.draw_screen()  # forced redraw cancels the pending frame
+        event_loop.remove_alarm('frame alarm')
+        widget.render((20, 10), focus=True)
+        screen.draw_screen((20, 10), 'fake canvas')
         """
-        if self.screen.started:
-            self.draw_screen()
 
     def draw_screen(self):
         """
@@ -556,15 +734,234 @@ class MainLoop(object):
         If you modify the widgets displayed outside of handling input or
         responding to an alarm you will need to call this method yourself
         to repaint the screen.
+
+        This method always draws immediately, ignoring :attr:`max_fps`,
+        so it may also be used to flush changes that would otherwise wait
+        for the next frame.
         """
+        if self._frame_alarm is not None:
+            self.event_loop.remove_alarm(self._frame_alarm)
+            self._frame_alarm = None
+
         if not self.screen_size:
             self.screen_size = self.screen.get_cols_rows()
 
         canvas = self._topmost_widget.render(self.screen_size, focus=True)
         self.screen.draw_screen(self.screen_size, canvas)
+        self._last_draw = time.time()
+
+
+
+
+
+class JobQueueFull(Exception):
+    """
+    Raised by :meth:`ThreadPool.submit` when the maximum number of jobs
+    are already waiting for a worker thread.
+    """
+    pass
+
+class ThreadJob(object):
+    """
+    A function submitted to a :class:`ThreadPool`, returned by
+    :meth:`MainLoop.run_in_thread`.
+
+    .. attribute:: result
+
+        Value returned by the function once it has finished
+
+    .. attribute:: exc_info
+
+        ``sys.exc_info()`` tuple if the function raised an exception
+    """
+    PENDING, RUNNING, DONE, CANCELLED = 'pending', 'running', 'done', 'cancelled'
+
+    def __init__(self, fn, callback, error_callback, user_data):
+        self.fn = fn
+        self.callback = callback
+        self.error_callback = error_callback
+        self.user_data = user_data
+        self.state = self.PENDING
+        self.result = None
+        self.exc_info = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        """
+        Called by the worker thread, returns False if the job was
+        cancelled before it could start.
+        """
+        with self._lock:
+            if self.state != self.PENDING:
+                return False
+            self.state = self.RUNNING
+            return True
+
+    def cancel(self):
+        """
+        Make sure the callbacks for this job are never called.
+
+        Returns ``True`` if the function had not started running and
+        never will, ``False`` otherwise.  A running function can't be
+        interrupted, its result is discarded.
+        """
+        with self._lock:
+            was_pending = self.state == self.PENDING
+            if self.state != self.DONE:
+                self.state = self.CANCELLED
+        return was_pending
 
+class ThreadPool(object):
+    """
+    Worker threads for running blocking functions on behalf of a
+    :class:`MainLoop`.  Results are passed back through a pipe watched by
+    the main loop, so callbacks always run in the thread running the
+    main loop where it is safe to update widgets.
+
+    :param main_loop: main loop used to deliver results
+    :type main_loop: :class:`MainLoop` instance
+    :param workers: maximum number of worker threads, started as needed
+    :type workers: int
+    :param max_pending: maximum number of jobs waiting for a worker,
+                        ``None`` for no limit
+    :type max_pending: int
+    """
 
+    def __init__(self, main_loop, workers=4, max_pending=100):
+        self.main_loop = main_loop
+        self.workers = workers
+        self.max_pending = max_pending
+        self._queue = queue.Queue()
+        self._threads = []
+        self._idle_threads = 0
+        self._lock = threading.Lock()
+        self._finished = []
+        self._notify_fd = None
+        self._notified = False
+
+    def pending(self):
+        """
+        Return the number of jobs waiting for a worker thread.
+        """
+        return self._queue.qsize()
+
+    def submit(self, job):
+        """
+        Queue a :class:`ThreadJob` to be run by a worker thread.
+
+        Raises :exc:`JobQueueFull` if :attr:`max_pending` jobs are
+        already waiting.
+        """
+        if self.max_pending is not None and \
+                self._queue.qsize() >= self.max_pending:
+            raise JobQueueFull("%d jobs already waiting" %
+                self._queue.qsize())
+        if self._notify_fd is None:
+            self._notify_fd = self.main_loop.watch_pipe(self._deliver)
+        with self._lock:
+            start_thread = (not self._idle_threads and
+                len(self._threads) < self.workers)
+        if start_thread:
+            t = threading.Thread(target=self._work)
+            t.daemon = True
+            self._threads.append(t)
+            t.start()
+        self._queue.put(job)
+        return job
+
+    def _work(self):
+        while True:
+            with self._lock:
+                self._idle_threads += 1
+            job = self._queue.get()
+            with self._lock:
+                self._idle_threads -= 1
+            if not job._start():
+                continue
+            try:
+                job.result = job.fn()
+            except:
+                job.exc_info = sys.exc_info()
+            with self._lock:
+                self._finished.append(job)
+                notify = not self._notified
+                self._notified = True
+            if notify:
+                # one byte for any number of finished jobs
+                os.write(self._notify_fd, B('x'))
+
+    def _deliver(self, data):
+        with self._lock:
+            self._notified = False
+        try:
+            while True:
+                # take one job at a time so a callback that raises
+                # leaves the rest to be delivered later
+                with self._lock:
+                    if not self._finished:
+                        break
+                    job = self._finished.pop(0)
+                self._deliver_job(job)
+        finally:
+            with self._lock:
+                notify = self._finished and not self._notified
+                if notify:
+                    self._notified = True
+            if notify:
+                os.write(self._notify_fd, B('x'))
+
+    def _deliver_job(self, job):
+        if job.state == job.CANCELLED:
+            return
+        job.state = job.DONE
+        if job.exc_info is None:
+            if job.callback:
+                job.callback(self.main_loop, job.result, job.user_data)
+        elif job.error_callback:
+            job.error_callback(self.main_loop, job.exc_info,
+                job.user_data)
+        else:
+            exc_info = job.exc_info
+            raise exc_info[0], exc_info[1], exc_info[2]
 
+    def _test_submit(self):
+        """
+        >>> evl = SelectEventLoop()
+        >>> ml = MainLoop(None, screen=_refl("screen"), event_loop=evl)
+        >>> ml.thread_pool = ThreadPool(ml, workers=1, max_pending=1)
+        >>> go = threading.Event()
+        >>> def done(loop, result, user_data):
+        ...     print user_data, result
+        ...     raise ExitMainLoop
+        >>> job1 = ml.run_in_thread(go.wait, done, "first")
+        >>> while job1.state == job1.PENDING: time.sleep(0.001)
+        >>> job2 = ml.run_in_thread(lambda: 6 * 7, done, "second")
+        >>> ml.run_in_thread(lambda: None)
+        Traceback (most recent call last):
+           ...
+        JobQueueFull: 1 jobs already waiting
+        >>> job1.cancel()
+        False
+        >>> go.set()
+        >>> evl.run()
+        second 42
+        >>> def failed(loop, exc_info, user_data):
+        ...     print exc_info[0].__name__
+        ...     raise ExitMainLoop
+        >>> job3 = ml.run_in_thread(lambda: 1/0, error_callback=failed)
+        >>> evl.run()
+        ZeroDivisionError
+        >>> go.clear()
+        >>> job4 = ml.run_in_thread(go.wait, done, "fourth")
+        >>> while job4.state == job4.PENDING: time.sleep(0.001)
+        >>> job5 = ml.run_in_thread(lambda: 5, done, "fifth")
+        >>> go.set()
+        >>> while len(ml.thread_pool._finished) < 2: time.sleep(0.001)
+        >>> evl.run()  # the first callback exits, the other one still runs
+        fourth True
+        >>> evl.run()
+        fifth 5
+        """
 
 
 class SelectEventLoop(object):
@@ -575,6 +972,7 @@ class SelectEventLoop(object):
     def __init__(self):
         self._alarms = []
         self._watch_files = {}
+        self._watch_write_files = {}
         self._idle_handle = 0
         self._idle_callbacks = {}
 
@@ -667,6 +1065,47 @@ class SelectEventLoop(object):
         False
         """
 
+    def watch_file_write(self, fd, callback):
+        """
+        Call callback() when fd is ready to accept more output.  No
+        parameters are passed to callback.
+
+        Returns a handle that may be passed to remove_watch_file_write()
+
+        fd -- file descriptor to watch for output
+        callback -- function to call when output may be written
+        """
+        self._watch_write_files[fd] = callback
+        return fd
+
+    def remove_watch_file_write(self, handle):
+        """
+        Remove an output file.
+
+        Returns True if the output file exists, False otherwise
+        """
+        if handle in self._watch_write_files:
+            del self._watch_write_files[handle]
+            return True
+        return False
+
+    def _test_watch_file_write(self):
+        """
+        >>> import os
+        >>> rd, wr = os.pipe()
+        >>> evl = SelectEventLoop()
+        >>> def writable():
+        ...     print "writable"
+        ...     raise ExitMainLoop
+        >>> handle = evl.watch_file_write(wr, writable)
+        >>> evl.run()
+        writable
+        >>> evl.remove_watch_file_write(handle)
+        True
+        >>> evl.remove_watch_file_write(handle)
+        False
+        """
+
     def enter_idle(self, callback):
         """
         Add a callback for entering idle.
@@ -760,6 +1199,7 @@ class SelectEventLoop(object):
         A single iteration of the event loop
         """
         fds = self._watch_files.keys()
+        wfds = self._watch_write_files.keys()
         if self._alarms or self._did_something:
             if self._alarms:
                 tm = self._alarms[0][0]
@@ -768,24 +1208,719 @@ class SelectEventLoop(object):
                     (self._alarms and timeout > 0)):
                 timeout = 0
                 tm = 'idle'
-            ready, w, err = select.select(fds, [], fds, timeout)
+            ready, writable, err = select.select(fds, wfds, fds, timeout)
         else:
             tm = None
-            ready, w, err = select.select(fds, [], fds)
+            ready, writable, err = select.select(fds, wfds, fds)
 
-        if not ready:
+        if not ready and not writable:
             if tm == 'idle':
                 self._entering_idle()
                 self._did_something = False
             elif tm is not None:
                 # must have been a timeout
-                tm, alarm_callback = self._alarms.pop(0)
+                tm, alarm_callback = heapq.heappop(self._alarms)
                 alarm_callback()
                 self._did_something = True
 
         for fd in ready:
             self._watch_files[fd]()
             self._did_something = True
+        for fd in writable:
+            if fd in self._watch_write_files:
+                self._watch_write_files[fd]()
+                self._did_something = True
+
+
+class PollEventLoop(SelectEventLoop):
+    """
+    Event loop based on :func:`select.epoll` where available, otherwise
+    :func:`select.poll`
+
+    Unlike :class:`SelectEventLoop` the cost of waiting does not grow with
+    the number of files watched, and file descriptors above FD_SETSIZE
+    may be watched.  Alarms are kept in a heap and removed lazily so that
+    both setting and removing an alarm take O(log n) time.
+
+    The poller is only open while :meth:`run` is running.  Files that
+    epoll refuses to watch, such as regular files, are always readable
+    so they are treated as ready on every iteration, as select() would.
+    """
+
+    def __init__(self):
+        super(PollEventLoop, self).__init__()
+        self._alarm_count = 0
+        self._removed_alarms = 0
+        self._poller = None
+        # mask each file descriptor is registered with
+        self._poll_masks = {}
+        self._ready_files = set()
+        self._use_epoll = hasattr(select, 'epoll')
+        if self._use_epoll:
+            self._poll_mask = select.EPOLLIN | select.EPOLLPRI
+            self._write_mask = select.EPOLLOUT
+            self._error_mask = select.EPOLLERR | select.EPOLLHUP
+        else:
+            self._poll_mask = select.POLLIN | select.POLLPRI
+            self._write_mask = select.POLLOUT
+            self._error_mask = select.POLLERR | select.POLLHUP
+
+    def _open_poller(self):
+        if self._use_epoll:
+            self._poller = select.epoll()
+        else:
+            self._poller = select.poll()
+        self._poll_masks.clear()
+        self._ready_files.clear()
+        for fd in set(self._watch_files) | set(self._watch_write_files):
+            self._update_poller(fd)
+
+    def _close_poller(self):
+        if hasattr(self._poller, 'close'):
+            self._poller.close()
+        self._poller = None
+
+    def _update_poller(self, fd):
+        """
+        Register fd with the poller for the watches it has now.
+        """
+        mask = 0
+        if fd in self._watch_files:
+            mask |= self._poll_mask
+        if fd in self._watch_write_files:
+            mask |= self._write_mask
+        if fd in self._ready_files:
+            if not mask:
+                self._ready_files.remove(fd)
+            return
+        old = self._poll_masks.get(fd)
+        if mask == old:
+            return
+        if not mask:
+            del self._poll_masks[fd]
+            try:
+                self._poller.unregister(fd)
+            except (IOError, OSError):
+                # already closed, the kernel forgot about it for us
+                pass
+            return
+        try:
+            if old is None:
+                self._poller.register(fd, mask)
+            else:
+                self._poller.modify(fd, mask)
+        except (IOError, OSError), e:
+            if e.args[0] != errno.EPERM:
+                raise
+            self._ready_files.add(fd)
+            return
+        self._poll_masks[fd] = mask
+
+    def _test_event_loop(self):
+        """
+        >>> import os
+        >>> rd, wr = os.pipe()
+        >>> evl = PollEventLoop()
+        >>> def step1():
+        ...     print "writing"
+        ...     os.write(wr, "hi".encode('ascii'))
+        >>> def step2():
+        ...     print os.read(rd, 2).decode('ascii')
+        ...     raise ExitMainLoop
+        >>> handle = evl.alarm(0, step1)
+        >>> handle = evl.watch_file(rd, step2)
+        >>> evl.run()
+        writing
+        hi
+        """
+
+    def alarm(self, seconds, callback):
+        """
+        Call callback() given time from from now.  No parameters are
+        passed to callback.
+
+        Returns a handle that may be passed to remove_alarm()
+
+        seconds -- floating point time to wait before calling callback
+        callback -- function to call from event loop
+        """
+        # the counter keeps alarms set for the same time in order and
+        # stops the heap from ever comparing callbacks
+        self._alarm_count += 1
+        handle = [time.time() + seconds, self._alarm_count, callback]
+        heapq.heappush(self._alarms, handle)
+        return handle
+
+    def remove_alarm(self, handle):
+        """
+        Remove an alarm.
+
+        Returns True if the alarm exists, False otherwise
+        """
+        if handle[-1] is None:
+            return False
+        # leave the entry in the heap, it is discarded when it reaches
+        # the top unless enough removed entries pile up to rebuild it
+        handle[-1] = None
+        self._removed_alarms += 1
+        if self._removed_alarms > 64 and \
+                self._removed_alarms * 2 > len(self._alarms):
+            self._alarms[:] = [a for a in self._alarms if a[-1] is not None]
+            heapq.heapify(self._alarms)
+            self._removed_alarms = 0
+        return True
+
+    def _test_remove_alarm(self):
+        """
+        >>> evl = PollEventLoop()
+        >>> handle = evl.alarm(50, lambda: None)
+        >>> evl.remove_alarm(handle)
+        True
+        >>> evl.remove_alarm(handle)
+        False
+        >>> handles = [evl.alarm(50 + i, lambda: None) for i in range(200)]
+        >>> [evl.remove_alarm(h) for h in handles[:150]] == [True] * 150
+        True
+        >>> len(evl._alarms) <= 100
+        True
+        >>> min([a for a in evl._alarms if a[-1]]) is handles[150]
+        True
+        """
+
+    def watch_file(self, fd, callback):
+        """
+        Call callback() when fd has some data to read.  No parameters
+        are passed to callback.
+
+        Returns a handle that may be passed to remove_watch_file()
+
+        fd -- file descriptor to watch for input
+        callback -- function to call when input is available
+        """
+        self._watch_files[fd] = callback
+        if self._poller is not None:
+            self._update_poller(fd)
+        return fd
+
+    def remove_watch_file(self, handle):
+        """
+        Remove an input file.
+
+        Returns True if the input file exists, False otherwise
+        """
+        if handle not in self._watch_files:
+            return False
+        del self._watch_files[handle]
+        if self._poller is not None:
+            self._update_poller(handle)
+        return True
+
+    def watch_file_write(self, fd, callback):
+        """
+        Call callback() when fd is ready to accept more output.  No
+        parameters are passed to callback.
+
+        Returns a handle that may be passed to remove_watch_file_write()
+
+        fd -- file descriptor to watch for output
+        callback -- function to call when output may be written
+        """
+        self._watch_write_files[fd] = callback
+        if self._poller is not None:
+            self._update_poller(fd)
+        return fd
+
+    def remove_watch_file_write(self, handle):
+        """
+        Remove an output file.
+
+        Returns True if the output file exists, False otherwise
+        """
+        if handle not in self._watch_write_files:
+            return False
+        del self._watch_write_files[handle]
+        if self._poller is not None:
+            self._update_poller(handle)
+        return True
+
+    def _test_watch_file_write(self):
+        """
+        >>> import os
+        >>> rd, wr = os.pipe()
+        >>> evl = PollEventLoop()
+        >>> def readable():
+        ...     print "readable"
+        >>> def writable():
+        ...     print "writable"
+        ...     evl.remove_watch_file_write(wr)
+        ...     os.write(wr, "hi".encode('ascii'))
+        >>> def read():
+        ...     print os.read(rd, 2).decode('ascii')
+        ...     raise ExitMainLoop
+        >>> handle = evl.watch_file(wr, readable)
+        >>> handle = evl.watch_file_write(wr, writable)
+        >>> handle = evl.watch_file(rd, read)
+        >>> evl.run()
+        writable
+        hi
+        """
+
+    def _test_remove_watch_file(self):
+        """
+        >>> import os
+        >>> rd, wr = os.pipe()
+        >>> evl = PollEventLoop()
+        >>> handle = evl.watch_file(rd, lambda: None)
+        >>> evl.remove_watch_file(handle)
+        True
+        >>> evl.remove_watch_file(handle)
+        False
+        """
+
+    def run(self):
+        """
+        Start the event loop.  Exit the loop when any callback raises
+        an exception.  If ExitMainLoop is raised, exit cleanly.
+        """
+        self._open_poller()
+        try:
+            self._did_something = True
+            while True:
+                try:
+                    self._loop()
+                except (select.error, IOError, OSError), e:
+                    if e.args[0] != errno.EINTR:
+                        # not just something we need to retry
+                        raise
+        except ExitMainLoop:
+            pass
+        finally:
+            self._close_poller()
+
+    def _test_run(self):
+        """
+        >>> import os
+        >>> rd, wr = os.pipe()
+        >>> os.write(wr, "data".encode('ascii')) # something to read from rd
+        4
+        >>> evl = PollEventLoop()
+        >>> def say_hello():
+        ...     print "hello"
+        >>> def say_waiting():
+        ...     print "waiting"
+        >>> def exit_clean():
+        ...     print "clean exit"
+        ...     raise ExitMainLoop
+        >>> def exit_error():
+        ...     1/0
+        >>> handle = evl.alarm(0.01, exit_clean)
+        >>> handle = evl.alarm(0.005, say_hello)
+        >>> evl.remove_alarm(evl.alarm(0.001, exit_error))
+        True
+        >>> evl.enter_idle(say_waiting)
+        1
+        >>> evl.run()
+        waiting
+        hello
+        waiting
+        clean exit
+        >>> handle = evl.watch_file(rd, exit_clean)
+        >>> evl.run()
+        clean exit
+        >>> evl.remove_watch_file(handle)
+        True
+        >>> handle = evl.alarm(0, exit_error)
+        >>> evl.run()
+        Traceback (most recent call last):
+           ...
+        ZeroDivisionError: integer division or modulo by zero
+        >>> handle = evl.watch_file(rd, exit_error)
+        >>> evl.run()
+        Traceback (most recent call last):
+           ...
+        ZeroDivisionError: integer division or modulo by zero
+        >>> evl._poller is None
+        True
+        """
+
+    def _test_watch_regular_file(self):
+        """
+        >>> import tempfile
+        >>> f = tempfile.TemporaryFile()
+        >>> evl = PollEventLoop()
+        >>> def exit_clean():
+        ...     print "clean exit"
+        ...     raise ExitMainLoop
+        >>> handle = evl.watch_file(f.fileno(), exit_clean)
+        >>> evl.run()
+        clean exit
+        >>> evl.remove_watch_file(handle)
+        True
+        """
+
+    def _test_poll_without_epoll(self):
+        """
+        >>> import os, sys, select, types
+        >>> module = sys.modules[PollEventLoop.__module__]
+        >>> module.select = types.ModuleType('select')
+        >>> for name in dir(select):
+        ...     if name != 'epoll':
+        ...         setattr(module.select, name, getattr(select, name))
+        >>> rd, wr = os.pipe()
+        >>> os.write(wr, "data".encode('ascii'))
+        4
+        >>> try:
+        ...     evl = PollEventLoop()
+        ...     def exit_clean():
+        ...         print "clean exit"
+        ...         raise ExitMainLoop
+        ...     handle = evl.watch_file(rd, exit_clean)
+        ...     evl.run()
+        ... finally:
+        ...     module.select = select
+        clean exit
+        >>> evl._use_epoll
+        False
+        """
+
+    def _poll(self, timeout):
+        """
+        Wait up to timeout seconds, or forever if timeout is None, and
+        return lists of the file descriptors ready to read and ready to
+        write.
+        """
+        if self._ready_files:
+            timeout = 0
+        if self._use_epoll:
+            if timeout is None:
+                timeout = -1
+            events = self._poller.poll(timeout)
+        else:
+            if timeout is not None:
+                timeout = int(timeout * 1000)
+            events = self._poller.poll(timeout)
+        readable = []
+        writable = []
+        for fd, event in events:
+            if event & ~self._write_mask:
+                readable.append(fd)
+            if event & (self._write_mask | self._error_mask):
+                writable.append(fd)
+        # regular files are always ready for both
+        readable.extend(self._ready_files)
+        writable.extend(self._ready_files)
+        return readable, writable
+
+    def _loop(self):
+        """
+        A single iteration of the event loop
+        """
+        alarms = self._alarms
+        while alarms and alarms[0][-1] is None:
+            heapq.heappop(alarms)
+            self._removed_alarms -= 1
+        if alarms or self._did_something:
+            if alarms:
+                tm = alarms[0][0]
+                timeout = max(0, tm - time.time())
+            if self._did_something and (not alarms or
+                    (alarms and timeout > 0)):
+                timeout = 0
+                tm = 'idle'
+            ready, writable = self._poll(timeout)
+        else:
+            tm = None
+            ready, writable = self._poll(None)
+
+        if not ready and not writable:
+            if tm == 'idle':
+                self._entering_idle()
+                self._did_something = False
+            elif tm is not None:
+                # must have been a timeout
+                handle = heapq.heappop(alarms)
+                alarm_callback = handle[-1]
+                handle[-1] = None
+                alarm_callback()
+                self._did_something = True
+
+        for fd in ready:
+            if fd in self._watch_files:
+                self._watch_files[fd]()
+                self._did_something = True
+        for fd in writable:
+            if fd in self._watch_write_files:
+                self._watch_write_files[fd]()
+                self._did_something = True
+
+
+class AsyncioEventLoop(object):
+    """
+    Event loop based on the standard library asyncio module, or the
+    trollius backport on Python 2
+
+    Coroutines and futures scheduled on the same asyncio loop run
+    alongside the user interface, so asynchronous subprocesses and file
+    operations may be awaited directly from widget code.
+    """
+
+    def __init__(self, loop=None):
+        """
+        :param loop: asyncio event loop to use, default is the one
+                     returned by :func:`asyncio.get_event_loop`
+        """
+        try:
+            import asyncio
+        except ImportError:
+            import trollius as asyncio
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        self._loop = loop
+        self._alarms = set()
+        self._watch_files = {}
+        self._watch_write_files = {}
+        self._idle_handle = 0
+        self._idle_callbacks = {}
+        self._idle_asyncio_handle = None
+        self._exc_info = None
+
+    def _test_event_loop(self):
+        """
+        >>> import os
+        >>> rd, wr = os.pipe()
+        >>> evl = AsyncioEventLoop()
+        >>> def step1():
+        ...     print "writing"
+        ...     os.write(wr, "hi".encode('ascii'))
+        >>> def step2():
+        ...     print os.read(rd, 2).decode('ascii')
+        ...     raise ExitMainLoop
+        >>> handle = evl.alarm(0, step1)
+        >>> handle = evl.watch_file(rd, step2)
+        >>> evl.run()
+        writing
+        hi
+        """
+
+    def _also_call_idle(self, f):
+        """
+        Wrap f so the idle callbacks are scheduled to run after it,
+        asyncio has no idle hook of its own.
+        """
+        def wrapper():
+            f()
+            if self._idle_asyncio_handle is None:
+                self._idle_asyncio_handle = self._loop.call_soon(
+                    self._entering_idle)
+        return wrapper
+
+    def alarm(self, seconds, callback):
+        """
+        Call callback() given time from from now.  No parameters are
+        passed to callback.
+
+        Returns a handle that may be passed to remove_alarm()
+
+        seconds -- floating point time to wait before calling callback
+        callback -- function to call from event loop
+        """
+        handle = []
+        def fire():
+            self._alarms.discard(handle[0])
+            callback()
+        handle.append(self._loop.call_later(seconds,
+            self._also_call_idle(fire)))
+        self._alarms.add(handle[0])
+        return handle[0]
+
+    def remove_alarm(self, handle):
+        """
+        Remove an alarm.
+
+        Returns True if the alarm exists, False otherwise
+        """
+        if handle not in self._alarms:
+            return False
+        self._alarms.remove(handle)
+        handle.cancel()
+        return True
+
+    def _test_remove_alarm(self):
+        """
+        >>> evl = AsyncioEventLoop()
+        >>> handle = evl.alarm(50, lambda: None)
+        >>> evl.remove_alarm(handle)
+        True
+        >>> evl.remove_alarm(handle)
+        False
+        """
+
+    def watch_file(self, fd, callback):
+        """
+        Call callback() when fd has some data to read.  No parameters
+        are passed to callback.
+
+        Returns a handle that may be passed to remove_watch_file()
+
+        fd -- file descriptor to watch for input
+        callback -- function to call when input is available
+        """
+        self._loop.add_reader(fd, self._also_call_idle(callback))
+        self._watch_files[fd] = callback
+        return fd
+
+    def remove_watch_file(self, handle):
+        """
+        Remove an input file.
+
+        Returns True if the input file exists, False otherwise
+        """
+        if handle not in self._watch_files:
+            return False
+        del self._watch_files[handle]
+        self._loop.remove_reader(handle)
+        return True
+
+    def watch_file_write(self, fd, callback):
+        """
+        Call callback() when fd is ready to accept more output.  No
+        parameters are passed to callback.
+
+        Returns a handle that may be passed to remove_watch_file_write()
+
+        fd -- file descriptor to watch for output
+        callback -- function to call when output may be written
+        """
+        self._loop.add_writer(fd, self._also_call_idle(callback))
+        self._watch_write_files[fd] = callback
+        return fd
+
+    def remove_watch_file_write(self, handle):
+        """
+        Remove an output file.
+
+        Returns True if the output file exists, False otherwise
+        """
+        if handle not in self._watch_write_files:
+            return False
+        del self._watch_write_files[handle]
+        self._loop.remove_writer(handle)
+        return True
+
+    def _test_remove_watch_file(self):
+        """
+        >>> import os
+        >>> rd, wr = os.pipe()
+        >>> evl = AsyncioEventLoop()
+        >>> handle = evl.watch_file(rd, lambda: None)
+        >>> evl.remove_watch_file(handle)
+        True
+        >>> evl.remove_watch_file(handle)
+        False
+        """
+
+    def enter_idle(self, callback):
+        """
+        Add a callback for entering idle.
+
+        Returns a handle that may be passed to remove_enter_idle()
+        """
+        self._idle_handle += 1
+        self._idle_callbacks[self._idle_handle] = callback
+        if self._idle_asyncio_handle is None:
+            self._idle_asyncio_handle = self._loop.call_soon(
+                self._entering_idle)
+        return self._idle_handle
+
+    def remove_enter_idle(self, handle):
+        """
+        Remove an idle callback.
+
+        Returns True if the handle was removed.
+        """
+        try:
+            del self._idle_callbacks[handle]
+        except KeyError:
+            return False
+        return True
+
+    def _entering_idle(self):
+        """
+        Call all the registered idle callbacks.
+        """
+        self._idle_asyncio_handle = None
+        for callback in list(self._idle_callbacks.values()):
+            callback()
+
+    def _exception_handler(self, loop, context):
+        exc = context.get('exception')
+        if exc is None:
+            loop.default_exception_handler(context)
+            return
+        loop.stop()
+        if not isinstance(exc, ExitMainLoop):
+            # store the exception, it is raised again once the loop
+            # has stopped
+            self._exc_info = (type(exc), exc, getattr(exc,
+                '__traceback__', None))
+
+    def run(self):
+        """
+        Start the event loop.  Exit the loop when any callback raises
+        an exception.  If ExitMainLoop is raised, exit cleanly.
+        """
+        self._loop.set_exception_handler(self._exception_handler)
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.set_exception_handler(None)
+        if self._exc_info:
+            # An exception caused us to exit, raise it now
+            exc_info = self._exc_info
+            self._exc_info = None
+            raise exc_info[0], exc_info[1], exc_info[2]
+
+    def _test_run(self):
+        """
+        >>> import os
+        >>> rd, wr = os.pipe()
+        >>> os.write(wr, "data".encode('ascii')) # something to read from rd
+        4
+        >>> evl = AsyncioEventLoop()
+        >>> def say_hello():
+        ...     print "hello"
+        >>> def say_waiting():
+        ...     print "waiting"
+        >>> def exit_clean():
+        ...     print "clean exit"
+        ...     raise ExitMainLoop
+        >>> def exit_error():
+        ...     1/0
+        >>> handle = evl.alarm(0.01, exit_clean)
+        >>> handle = evl.alarm(0.005, say_hello)
+        >>> evl.enter_idle(say_waiting)
+        1
+        >>> evl.run()
+        waiting
+        hello
+        waiting
+        clean exit
+        >>> handle = evl.watch_file(rd, exit_clean)
+        >>> evl.run()
+        clean exit
+        >>> evl.remove_watch_file(handle)
+        True
+        >>> handle = evl.alarm(0, exit_error)
+        >>> evl.run()
+        Traceback (most recent call last):
+           ...
+        ZeroDivisionError: integer division or modulo by zero
+        >>> handle = evl.watch_file(rd, exit_error)
+        >>> evl.run()
+        Traceback (most recent call last):
+           ...
+        ZeroDivisionError: integer division or modulo by zero
+        """
 
 
 if not PYTHON3:
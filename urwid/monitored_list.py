@@ -19,21 +19,79 @@
 #
 # Urwid web site: http://excess.org/urwid/
 
+from contextlib import contextmanager
+
 from urwid.compat import PYTHON3
 
 
-def _call_modified(fn):
+def _call_modified(fn, changed_range):
+    """
+    Wrap list method fn so that it reports the range of items it changes.
+
+    changed_range(self, *args) is called before fn and returns the
+    (start, stop) range of existing items replaced by fn.
+    """
     def call_modified_wrapper(self, *args, **kwargs):
+        old_len = len(self)
+        start, stop = changed_range(self, old_len, *args)
         rval = fn(self, *args, **kwargs)
-        self._modified()
+        self._changed(start, stop, stop + len(self) - old_len)
         return rval
     return call_modified_wrapper
 
+def _index(i, n):
+    if i < 0:
+        i += n
+    return max(0, min(i, n))
+
+def _item_range(self, n, i, *args):
+    if isinstance(i, slice):
+        start, stop, step = i.indices(n)
+        if step == 1:
+            return start, max(start, stop)
+        r = range(start, stop, step)
+        if not r:
+            # extended slices must keep their length, nothing changes
+            start = max(0, min(start, n))
+            return start, start
+        if r[0] < r[-1]:
+            return r[0], r[-1] + 1
+        return r[-1], r[0] + 1
+    i = _index(i, n)
+    return i, min(i + 1, n)
+
+def _slice_range(self, n, i, j, *args):
+    # Python 2 has already added len() to negative indices
+    i = max(0, min(i, n))
+    return i, max(i, min(j, n))
+
+def _end_range(self, n, *args):
+    return n, n
+
+def _whole_range(self, n, *args):
+    return 0, n
+
+def _imul_range(self, n, count):
+    if count > 0:
+        return n, n
+    return 0, n
+
+def _insert_range(self, n, i, item):
+    i = _index(i, n)
+    return i, i
+
+def _pop_range(self, n, i=-1):
+    return _item_range(self, n, i)
+
+
 class MonitoredList(list):
     """
     This class can trigger a callback any time its contents are changed
     with the usual list operations append, extend, etc.
     """
+    _batch_depth = 0
+    _batch_range = None
+
     def _modified(self):
         pass
 
@@ -60,26 +118,140 @@ class MonitoredList(list):
         """
         self._modified = callback
 
+    def _modified_range(self, start, stop, new_stop):
+        """
+        Called after the list is modified with the range of items that
+        changed: items previously at range(start, stop) are now found at
+        range(start, new_stop).  Items before start are untouched and
+        items after stop have moved by new_stop - stop places.
+
+        The default implementation calls the modified callback.
+
+        >>> class ReportRange(MonitoredList):
+        ...     def _modified_range(self, start, stop, new_stop):
+        ...         print "%d:%d -> %d:%d" % (start, stop, start, new_stop)
+        >>> ml = ReportRange([0, 1, 2, 3, 4])
+        >>> ml.append(5)
+        5:5 -> 5:6
+        >>> ml.insert(-2, 9)
+        4:4 -> 4:5
+        >>> del ml[1]
+        1:2 -> 1:1
+        >>> ml[1:3] = [7, 7, 7]
+        1:3 -> 1:4
+        >>> ml.pop()
+        6:7 -> 6:6
+        5
+        >>> ml.reverse()
+        0:6 -> 0:6
+        >>> del ml[-9:2]
+        0:2 -> 0:0
+        >>> ml[slice(2, 2)] = [8, 8]
+        2:2 -> 2:4
+        >>> ml.remove(8)
+        2:3 -> 2:2
+        """
+        self._modified()
+
+    def _changed(self, start, stop, new_stop):
+        if not self._batch_depth:
+            self._modified_range(start, stop, new_stop)
+            return
+        if self._batch_range is None:
+            self._batch_range = (start, stop, new_stop)
+            return
+        # merge with the changes already made, the merged range covers
+        # both in the current list then maps its end back to the list
+        # as it was before the batch
+        b_start, b_stop, b_new_stop = self._batch_range
+        end = max(b_new_stop, stop)
+        self._batch_range = (min(b_start, start),
+            b_stop + end - b_new_stop,
+            end + new_stop - stop)
+
+    @contextmanager
+    def batch(self):
+        """
+        Return a context manager that holds back the modified callback
+        while the list is modified.  When the outermost batch ends the
+        callback is called once for all the changes made, with the
+        range given to :meth:`_modified_range` covering all of them.
+
+        >>> import sys
+        >>> ml = MonitoredList([1,2,3])
+        >>> ml.set_modified_callback(lambda: sys.stdout.write("modified\\n"))
+        >>> with ml.batch():
+        ...     for i in range(100):
+        ...         ml.append(i)
+        ...     ml.remove(2)
+        modified
+        >>> len(ml)
+        102
+        >>> with ml.batch():
+        ...     pass
+        >>> ml._changed(0, 0, 0)
+        modified
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth and self._batch_range is not None:
+                changed = self._batch_range
+                self._batch_range = None
+                self._modified_range(*changed)
+
+    def _test_batch_range(self):
+        """
+        >>> class ReportRange(MonitoredList):
+        ...     def _modified_range(self, start, stop, new_stop):
+        ...         print "%d:%d -> %d:%d" % (start, stop, start, new_stop)
+        >>> ml = ReportRange(range(10))
+        >>> with ml.batch():
+        ...     ml.append(10)
+        ...     del ml[2]
+        ...     ml.insert(4, 11)
+        2:10 -> 2:11
+        >>> ml
+        ReportRange([0, 1, 3, 4, 11, 5, 6, 7, 8, 9, 10])
+        >>> with ml.batch():
+        ...     ml[5] = 12
+        ...     with ml.batch():
+        ...         ml[3:5] = []
+        ...     ml[7] = 13
+        3:10 -> 3:8
+        >>> ml
+        ReportRange([0, 1, 3, 12, 6, 7, 8, 13, 10])
+        """
+
     def __repr__(self):
         return "%s(%r)" % (self.__class__.__name__, list(self))
 
-    __add__ = _call_modified(list.__add__)
-    __delitem__ = _call_modified(list.__delitem__)
+    __add__ = _call_modified(list.__add__, _end_range)
+    __delitem__ = _call_modified(list.__delitem__, _item_range)
     if not PYTHON3:
-        __delslice__ = _call_modified(list.__delslice__)
-    __iadd__ = _call_modified(list.__iadd__)
-    __imul__ = _call_modified(list.__imul__)
-    __rmul__ = _call_modified(list.__rmul__)
-    __setitem__ = _call_modified(list.__setitem__)
+        __delslice__ = _call_modified(list.__delslice__, _slice_range)
+    __iadd__ = _call_modified(list.__iadd__, _end_range)
+    __imul__ = _call_modified(list.__imul__, _imul_range)
+    __rmul__ = _call_modified(list.__rmul__, _end_range)
+    __setitem__ = _call_modified(list.__setitem__, _item_range)
     if not PYTHON3:
-        __setslice__ = _call_modified(list.__setslice__)
-    append = _call_modified(list.append)
-    extend = _call_modified(list.extend)
-    insert = _call_modified(list.insert)
-    pop = _call_modified(list.pop)
-    remove = _call_modified(list.remove)
-    reverse = _call_modified(list.reverse)
-    sort = _call_modified(list.sort)
+        __setslice__ = _call_modified(list.__setslice__, _slice_range)
+    append = _call_modified(list.append, _end_range)
+    extend = _call_modified(list.extend, _end_range)
+    insert = _call_modified(list.insert, _insert_range)
+    pop = _call_modified(list.pop, _pop_range)
+
+    def remove(self, value):
+        self._remove_index(self.index(value))
+
+    def _remove_index(self, i):
+        list.__delitem__(self, i)
+        self._changed(i, i + 1, i)
+
+    reverse = _call_modified(list.reverse, _whole_range)
+    sort = _call_modified(list.sort, _whole_range)
 
 
 class MonitoredFocusList(MonitoredList):
@@ -468,9 +640,8 @@ class MonitoredFocusList(MonitoredList):
         index = self.index(value)
         focus = self._adjust_focus_on_contents_modified(slice(index,
             index+1 or None))
-        rval = super(MonitoredFocusList, self).remove(value)
+        self._remove_index(index)
         self._set_focus(focus)
-        return rval
 
     def reverse(self):
         """
@@ -0,0 +1,184 @@
+#!/usr/bin/python
+#
+# Urwid render profiler
+#    Copyright (C) 2004-2012  Ian Ward
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+# Urwid web site: http://excess.org/urwid/
+
+"""
+Opt-in profiling of widget rendering.
+
+A :class:`RenderProfiler` that has been enabled is told about every
+widget render() call, and collects per widget class counts of renders
+and canvas cache hits, time spent and canvas sizes.
+"""
+
+import time
+import json
+
+from urwid import widget
+from urwid.widget import Text, RIGHT, TOP, PACK
+from urwid.container import Overlay
+from urwid.graphics import LineBox
+
+
+class RenderProfiler(object):
+    """
+    Collect render statistics per widget class.
+
+    >>> from urwid import Text, Pile
+    >>> p = RenderProfiler()
+    >>> p.enable()
+    >>> t = Text(u"hello")
+    >>> c = Pile([t, t]).render((10,))
+    >>> p.disable()
+    >>> sorted((r['widget'], r['renders'], r['cache_hits'], r['cells'])
+    ...     for r in p.report())
+    [('Pile', 1, 0, 20), ('Text', 1, 1, 20)]
+    """
+    report_fields = ['widget', 'renders', 'cache_hits', 'time',
+        'self_time', 'cells']
+
+    def __init__(self):
+        self.ignore = set([RenderProfileText])
+        self.reset()
+
+    def reset(self):
+        """Forget all statistics collected so far."""
+        # widget class -> [renders, cache hits, time, self time, cells]
+        self._stats = {}
+        # [start time, time spent in nested renders] for each
+        # render in progress
+        self._stack = []
+
+    def enable(self):
+        """Start collecting statistics for every widget render."""
+        widget.set_render_profiler(self)
+
+    def disable(self):
+        """Stop collecting statistics."""
+        if widget._render_profiler is self:
+            widget.set_render_profiler(None)
+
+    def _class_stats(self, w):
+        cls = w.__class__
+        stats = self._stats.get(cls)
+        if stats is None:
+            stats = self._stats[cls] = [0, 0, 0.0, 0.0, 0]
+        return stats
+
+    def cache_hit(self, w, canv):
+        """Called when a render of w was answered from the CanvasCache."""
+        if w.__class__ in self.ignore:
+            return
+        stats = self._class_stats(w)
+        stats[1] += 1
+        stats[4] += canv.cols() * canv.rows()
+
+    def enter(self):
+        """Called before a widget's render() method runs."""
+        self._stack.append([time.time(), 0.0])
+
+    def leave(self, w, canv):
+        """
+        Called after w has rendered canv, or with canv None when its
+        render() method raised an exception.
+        """
+        if not self._stack:
+            return
+        start, nested = self._stack.pop()
+        elapsed = time.time() - start
+        if self._stack:
+            self._stack[-1][1] += elapsed
+        if canv is None or w.__class__ in self.ignore:
+            return
+        stats = self._class_stats(w)
+        stats[0] += 1
+        stats[2] += elapsed
+        stats[3] += elapsed - nested
+        stats[4] += canv.cols() * canv.rows()
+
+    def report(self):
+        """
+        Return a list of dicts with the statistics for each widget
+        class, the classes with the most time spent in their own
+        render() first.  Keys are listed in :attr:`report_fields`,
+        times are in seconds and *cells* is the total screen cells of
+        the canvases returned.
+        """
+        rows = []
+        for cls, (renders, hits, elapsed, self_time, cells) in \
+                self._stats.items():
+            rows.append({
+                'widget': cls.__name__,
+                'renders': renders,
+                'cache_hits': hits,
+                'time': elapsed,
+                'self_time': self_time,
+                'cells': cells})
+        rows.sort(key=lambda r: (-r['self_time'], r['widget']))
+        return rows
+
+    def dump(self, f):
+        """Write report() to file object f as JSON."""
+        json.dump(self.report(), f, indent=1, sort_keys=True)
+        f.write("\n")
+
+    def overlay(self, bottom_w, count=8, width=60):
+        """
+        Return an Overlay that shows a live summary of this profiler
+        in the top right corner of bottom_w.  The summary widget's own
+        renders are not counted.
+        """
+        return Overlay(LineBox(RenderProfileText(self, count),
+            title="render profile"), bottom_w,
+            RIGHT, width, TOP, PACK)
+
+
+class RenderProfileText(Text):
+    """
+    Text widget showing the top entries of a RenderProfiler report,
+    updated every time it is rendered.
+    """
+    no_cache = ["render", "rows"]
+
+    def __init__(self, profiler, count=8):
+        """
+        profiler -- RenderProfiler to display
+        count -- number of widget classes to show
+
+        The widget is always count + 1 rows high.
+        """
+        self.profiler = profiler
+        self.count = count
+        self.__super.__init__(u"", wrap='clip')
+
+    def _update(self):
+        lines = [u"%-16s %7s %7s %9s" % (u"widget", u"renders",
+            u"hits", u"self ms")]
+        for r in self.profiler.report()[:self.count]:
+            lines.append(u"%-16s %7d %7d %9.1f" % (r['widget'][:16],
+                r['renders'], r['cache_hits'], r['self_time'] * 1000))
+        lines.extend([u""] * (self.count + 1 - len(lines)))
+        self.set_text(u"\n".join(lines))
+
+    def rows(self, size, focus=False):
+        return self.count + 1
+
+    def render(self, size, focus=False):
+        self._update()
+        return self.__super.render(size, focus)
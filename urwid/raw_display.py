@@ -23,6 +23,7 @@
 Direct terminal UI implementation
 """
 
+import errno
 import fcntl
 import termios
 import os
@@ -36,13 +37,51 @@ from urwid import util
 from urwid import escape
 from urwid.display_common import BaseScreen, RealTerminal, \
     UPDATE_PALETTE_ENTRY, AttrSpec, UNPRINTABLE_TRANS_TABLE, \
-    INPUT_DESCRIPTORS_CHANGED
+    INPUT_DESCRIPTORS_CHANGED, OUTPUT_PENDING
 from urwid import signals
 from urwid.compat import PYTHON3, bytes, B
 
 from subprocess import Popen, PIPE
 
 
+def _seg_width(seg):
+    run = seg[2]
+    return util.calc_width(run, 0, len(run))
+
+def _is_narrow(run):
+    """
+    Return True if every byte of run is a single column character, so
+    byte offsets may be used as column offsets.
+    """
+    if util.get_encoding_mode() == "wide":
+        return False
+    return util.calc_width(run, 0, len(run)) == len(run)
+
+def _common_prefix(a, b):
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+def _common_suffix(a, b):
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[-1-i] == b[-1-i]:
+        i += 1
+    return i
+
+
+# escape tables are cleared when they grow past this many entries
+_ESCAPE_CACHE_LIMIT = 4096
+
+_DEFAULT_ATTRSPEC = AttrSpec('default', 'default')
+
+# terminals known to support synchronized output, by $TERM
+_SYNCHRONIZED_UPDATE_TERMS = ('xterm-kitty', 'foot', 'foot-extra',
+    'alacritty', 'wezterm', 'contour')
+
+
 class Screen(BaseScreen, RealTerminal):
     def __init__(self):
         """Initialize a screen that directly prints escape codes to an output
@@ -50,6 +89,7 @@ class Screen(BaseScreen, RealTerminal):
         """
         super(Screen, self).__init__()
         self._pal_escape = {}
+        self._clear_escape_tables()
         signals.connect_signal(self, UPDATE_PALETTE_ENTRY, 
             self._on_update_palette_entry)
         self.colors = 16 # FIXME: detect this
@@ -60,6 +100,7 @@ class Screen(BaseScreen, RealTerminal):
         self.set_input_timeouts()
         self.screen_buf = None
         self._screen_buf_canvas = None
+        self._screen_buf_size = None
         self._resized = False
         self.maxrow = None
         self.gpm_mev = None
@@ -69,9 +110,18 @@ class Screen(BaseScreen, RealTerminal):
         self._rows_used = None
         self._cy = 0
         self.bright_is_bold = os.environ.get('TERM',None) != "xterm"
+        self.synchronized_update = (os.environ.get('TERM', None)
+            in _SYNCHRONIZED_UPDATE_TERMS)
         self._next_timeout = None
         self._term_output_file = sys.stdout
         self._term_input_file = sys.stdin
+        self._output_nonblocking = False
+        # output file descriptor while non-blocking output is active
+        self._output_fd = None
+        self._old_output_flags = None
+        # output the terminal has not accepted yet, from _output_offset on
+        self._output_queue = B("")
+        self._output_offset = 0
         # pipe for signalling external event loops about resize events
         self._resize_pipe_rd, self._resize_pipe_wr = os.pipe()
         fcntl.fcntl(self._resize_pipe_rd, fcntl.F_SETFL, os.O_NONBLOCK)
@@ -139,10 +189,112 @@ class Screen(BaseScreen, RealTerminal):
         After calling this function get_input will include mouse
         click events along with keystrokes.
         """
-        self._term_output_file.write(escape.MOUSE_TRACKING_ON)
+        self._write(escape.MOUSE_TRACKING_ON)
 
         self._start_gpm_tracking()
     
+    def set_output_nonblocking(self, nonblocking=True):
+        """
+        nonblocking -- if True, write to the terminal without blocking
+
+        Output the terminal (eg. a congested ssh connection) will not
+        accept yet is queued and sent as soon as possible, and frames
+        drawn while the queue is not empty are dropped, so input is
+        still handled while a large redraw is on its way.  The
+        OUTPUT_PENDING signal is sent while output is queued so the
+        main loop can try again once the descriptor returned by
+        get_output_descriptor() is writable.  The output file must have a
+        fileno() method.
+
+        When the output file is a terminal it is opened a second time
+        for the non-blocking writes, so other users of the same file
+        are not affected.  Otherwise O_NONBLOCK is set on the file
+        itself until output is made blocking again or the screen is
+        stopped, and anything else writing to it (or sharing it with
+        this process, like a child's stderr) may see EAGAIN errors.
+        """
+        self._output_nonblocking = nonblocking
+        if not self._started:
+            return
+        if nonblocking:
+            self._start_nonblocking_output()
+        else:
+            self._stop_nonblocking_output()
+
+    def _start_nonblocking_output(self):
+        if self._output_fd is not None:
+            return
+        self._term_output_file.flush()
+        fd = self._term_output_file.fileno()
+        if os.isatty(fd):
+            # a new open file description of our own to make non-blocking
+            self._output_fd = os.open(os.ttyname(fd),
+                os.O_WRONLY | os.O_NOCTTY | os.O_NONBLOCK)
+            self._old_output_flags = None
+            return
+        self._old_output_flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+        fcntl.fcntl(fd, fcntl.F_SETFL, self._old_output_flags | os.O_NONBLOCK)
+        self._output_fd = fd
+
+    def _stop_nonblocking_output(self):
+        """
+        Restore blocking output and send everything still queued.
+        """
+        if self._output_fd is None:
+            return
+        if self._old_output_flags is None:
+            # our own descriptor, wait for the terminal to take the rest
+            fcntl.fcntl(self._output_fd, fcntl.F_SETFL,
+                fcntl.fcntl(self._output_fd, fcntl.F_GETFL) & ~os.O_NONBLOCK)
+            self._flush_output()
+            os.close(self._output_fd)
+        else:
+            fcntl.fcntl(self._output_fd, fcntl.F_SETFL,
+                self._old_output_flags)
+            self._flush_output()
+        self._output_fd = None
+
+    def _write(self, data):
+        """
+        Send data to the terminal, or queue it when non-blocking output
+        is active and the terminal is not ready for it.
+        """
+        if self._output_fd is None:
+            self._term_output_file.write(data)
+            self._term_output_file.flush()
+            return
+        if PYTHON3 and not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        self._output_queue = (self._output_queue[self._output_offset:]
+            + data)
+        self._output_offset = 0
+        if not self._flush_output():
+            signals.emit_signal(self, OUTPUT_PENDING)
+
+    def _flush_output(self):
+        """
+        Write as much of the output queue as the terminal will accept.
+        Returns True if the queue is empty.
+        """
+        queue = self._output_queue
+        offset = self._output_offset
+        while offset < len(queue):
+            try:
+                n = os.write(self._output_fd, memoryview(queue)[offset:])
+            except OSError, e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+            offset += n
+        if offset < len(queue):
+            self._output_offset = offset
+            return False
+        self._output_queue = B("")
+        self._output_offset = 0
+        return True
+
     def _start_gpm_tracking(self):
         if not os.path.isfile("/usr/bin/mev"):
             return
@@ -167,8 +319,10 @@ class Screen(BaseScreen, RealTerminal):
         alternate_buffer -- use alternate screen buffer
         """
         assert not self._started
+        if self._output_nonblocking:
+            self._start_nonblocking_output()
         if alternate_buffer:
-            self._term_output_file.write(escape.SWITCH_TO_ALTERNATE_BUFFER)
+            self._write(escape.SWITCH_TO_ALTERNATE_BUFFER)
             self._rows_used = None
         else:
             self._rows_used = 0
@@ -216,7 +370,8 @@ class Screen(BaseScreen, RealTerminal):
         elif self.maxrow is not None:
             move_cursor = escape.set_cursor_position( 
                 0, self.maxrow)
-        self._term_output_file.write(self._attrspec_to_escape(AttrSpec('','')) 
+        self._stop_nonblocking_output()
+        self._write(self._attrspec_escape(_DEFAULT_ATTRSPEC)
             + escape.SI
             + escape.MOUSE_TRACKING_OFF
             + escape.SHOW_CURSOR
@@ -334,6 +489,14 @@ class Screen(BaseScreen, RealTerminal):
             fd_list.append(self.gpm_mev.stdout.fileno())
         return fd_list
 
+    def get_output_descriptor(self):
+        """
+        Return the file descriptor non-blocking output is written to,
+        or None when output is blocking.  External event loops may
+        watch it for writing after an OUTPUT_PENDING signal.
+        """
+        return self._output_fd
+
     def get_input_nonblocking(self):
         """
         Return a (next_input_timeout, keys_pressed, raw_keycodes)
@@ -365,25 +528,19 @@ class Screen(BaseScreen, RealTerminal):
                 self._get_keyboard_codes()
 
             original_codes = codes
-            try:
-                while codes:
-                    run, codes = escape.process_keyqueue(
-                        codes, True)
-                    processed.extend(run)
-            except escape.MoreInputRequired:
+            processed, codes = escape.process_keyqueue_all(codes, True)
+            if codes:
+                # wait for the rest of an incomplete sequence
                 k = len(original_codes) - len(codes)
                 yield (self.complete_wait, processed,
                     original_codes[:k])
                 empty_resize_pipe()
                 original_codes = codes
-                processed = []
 
                 codes += self._get_keyboard_codes() + \
                     self._get_gpm_codes()
-                while codes:
-                    run, codes = escape.process_keyqueue(
-                        codes, False)
-                    processed.extend(run)
+                processed, codes = escape.process_keyqueue_all(
+                    codes, False)
             
             if self._resized:
                 processed.append('window resize')
@@ -531,8 +688,7 @@ class Screen(BaseScreen, RealTerminal):
         
         while True:
             try:
-                self._term_output_file.write(escape.DESIGNATE_G1_SPECIAL)
-                self._term_output_file.flush()
+                self._write(escape.DESIGNATE_G1_SPECIAL)
                 break
             except IOError:
                 pass
@@ -545,6 +701,14 @@ class Screen(BaseScreen, RealTerminal):
 
         assert maxrow == r.rows()
 
+        if self._output_queue and not self._flush_output():
+            # the terminal has not accepted the last frame yet, drop
+            # this one so the screen catches up once it has
+            if r is not self._screen_buf_canvas:
+                self._screen_buf_canvas = None
+            signals.emit_signal(self, OUTPUT_PENDING)
+            return
+
         # quick return if nothing has changed
         if self.screen_buf and r is self._screen_buf_canvas:
             return
@@ -555,7 +719,10 @@ class Screen(BaseScreen, RealTerminal):
             # handle resize before trying to draw screen
             return
         
-        o = [escape.HIDE_CURSOR, self._attrspec_to_escape(AttrSpec('',''))]
+        default_escape = self._attrspec_escape(_DEFAULT_ATTRSPEC)
+        o = [escape.HIDE_CURSOR, default_escape]
+        if self.synchronized_update:
+            o.insert(0, escape.BEGIN_SYNCHRONIZED_UPDATE)
         
         def partial_display():
             # returns True if the screen is in partial display mode
@@ -565,10 +732,21 @@ class Screen(BaseScreen, RealTerminal):
         if not partial_display():
             o.append(escape.CURSOR_HOME)
 
-        if self.screen_buf:
+        # only diff against the previous frame when it was drawn with
+        # absolute cursor positioning at the same size
+        if (self.screen_buf and not partial_display() and
+                self._screen_buf_size == (maxcol, maxrow)):
             osb = self.screen_buf
         else:
             osb = []
+        rows = list(r.content())
+        if osb:
+            scroll = self._find_scroll(osb, rows)
+            if scroll:
+                # move the rows that are still on screen with the
+                # terminal's scrolling and only draw the rest
+                o.append(self._scroll_escape(*scroll))
+                osb = self._scroll_screen_buf(osb, maxcol, *scroll)
         sb = []
         cy = self._cy
         y = -1
@@ -602,28 +780,67 @@ class Screen(BaseScreen, RealTerminal):
                 return False
             return True
 
+        pal_escape = self._pal_escape
+        attrspec_escape = self._attrspec_escape
+        sgr_transition = self._sgr_transition
+
         def attr_to_escape(a):
-            if a in self._pal_escape:
-                return self._pal_escape[a]
+            esc = pal_escape.get(a)
+            if esc is not None:
+                return esc
             elif isinstance(a, AttrSpec):
-                return self._attrspec_to_escape(a)
+                return attrspec_escape(a)
             # undefined attributes use default/default
             # TODO: track and report these
-            return self._attrspec_to_escape(
-                AttrSpec('default','default'))
+            return default_escape
+
+        # escape sequence of the attribute and character set currently
+        # active on the terminal, kept across rows so unchanged
+        # attributes are not resent and changed ones only send the
+        # parameters that differ
+        unknown = object()
+        state = [default_escape, unknown]
+
+        def set_attr_cs(a, cs):
+            lastesc, lastcs = state
+            esc = attr_to_escape(a)
+            if lastesc is unknown:
+                o.append(esc)
+                state[0] = esc
+            elif lastesc != esc:
+                o.append(sgr_transition(lastesc, esc))
+                state[0] = esc
+            if lastcs is unknown or lastcs != cs:
+                assert cs in [None, "0", "U"], repr(cs)
+                if lastcs == "U":
+                    o.append( escape.IBMPC_OFF )
+
+                if cs is None:
+                    o.append( escape.SI )
+                elif cs == "U":
+                    o.append( escape.IBMPC_ON )
+                else:
+                    o.append( escape.SO )
+                state[1] = cs
 
         ins = None
         o.append(set_cursor_home())
         cy = 0
-        for row in r.content():
+        for row in rows:
             y += 1
-            if False and osb and osb[y] == row:
-                # this row of the screen buffer matches what is
-                # currently displayed, so we can skip this line
-                sb.append( osb[y] )
-                continue
-
             sb.append(row)
+            span = None
+            if osb:
+                span = self._diff_row(osb[y], row)
+                if span is None:
+                    # this row of the screen buffer matches what is
+                    # currently displayed, so we can skip this line
+                    continue
+                col, span_row, span_cols = span
+                if y == maxrow-1 and col + span_cols == maxcol:
+                    # the bottom right corner needs the full row
+                    # treatment below
+                    span = None
 
             # leave blank lines off display when we are using
             # the default screen buffer (allows partial screen)
@@ -632,44 +849,34 @@ class Screen(BaseScreen, RealTerminal):
                     continue
                 self._rows_used = y
 
-            if y or partial_display():
-                o.append(set_cursor_position(0, y))
+            if span:
+                # only draw the part of the row that changed
+                col, row, span_cols = span
+                o.append(set_cursor_position(col, y))
+                reaches_edge = col + span_cols == maxcol
+            else:
+                if y or partial_display():
+                    o.append(set_cursor_position(0, y))
+                reaches_edge = True
             # after updating the line we will be just over the
             # edge, but terminals still treat this as being
             # on the same line
             cy = y
 
             whitespace_at_end = False
-            if row and row[-1][2][-1:] == B(' '):
+            if reaches_edge and row and row[-1][2][-1:] == B(' '):
                 whitespace_at_end = True
                 a, cs, run = row[-1]
                 row = row[:-1] + [(a, cs, run.rstrip(B(' ')))]
-            elif y == maxrow-1 and maxcol>1:
+            elif not span and y == maxrow-1 and maxcol>1:
                 row, back, ins = self._last_row(row)
 
-            first = True
-            lasta = lastcs = None
             for (a,cs, run) in row:
                 assert isinstance(run, bytes) # canvases should render with bytes
                 if cs != 'U':
                     run = run.translate(UNPRINTABLE_TRANS_TABLE)
-                if first or lasta != a:
-                    o.append(attr_to_escape(a))
-                    lasta = a
-                if first or lastcs != cs:
-                    assert cs in [None, "0", "U"], repr(cs)
-                    if lastcs == "U":
-                        o.append( escape.IBMPC_OFF )
-
-                    if cs is None:
-                        o.append( escape.SI )
-                    elif cs == "U":
-                        o.append( escape.IBMPC_ON )
-                    else:
-                        o.append( escape.SO )
-                    lastcs = cs
+                set_attr_cs(a, cs)
                 o.append( run )
-                first = False
             if ins:
                 (inserta, insertcs, inserttext) = ins
                 ias = attr_to_escape(inserta)
@@ -687,6 +894,8 @@ class Screen(BaseScreen, RealTerminal):
 
                 if cs == "U":
                     o.append(escape.IBMPC_OFF)
+                state[:] = [unknown, unknown]
+                ins = None
             if whitespace_at_end:
                 o.append(escape.ERASE_IN_LINE_RIGHT)
 
@@ -695,16 +904,18 @@ class Screen(BaseScreen, RealTerminal):
             o += [set_cursor_position(x, y),
                 escape.SHOW_CURSOR  ]
             self._cy = y
+        if self.synchronized_update:
+            o.append(escape.END_SYNCHRONIZED_UPDATE)
 
         if self._resized:
             # handle resize before trying to draw screen
             return
+        if PYTHON3:
+            o = [l.decode('utf-8') if isinstance(l, bytes) else l
+                for l in o]
         try:
-            for l in o:
-                if isinstance(l, bytes) and PYTHON3:
-                    l = l.decode('utf-8')
-                self._term_output_file.write(l)
-            self._term_output_file.flush()
+            # send the whole frame with a single write
+            self._write("".join(o))
         except IOError, e:
             # ignore interrupted syscall
             if e.args[0] != 4:
@@ -712,6 +923,154 @@ class Screen(BaseScreen, RealTerminal):
 
         self.screen_buf = sb
         self._screen_buf_canvas = r
+        self._screen_buf_size = (maxcol, maxrow)
+
+    def _find_scroll(self, old, new):
+        """
+        Look for a block of rows in new that have moved up or down from
+        where they were in old.  Returns (top, bottom, lines) where top
+        and bottom are the first and last rows of the region to scroll
+        and lines is the number of rows to move its content up (or down
+        when negative), or None if scrolling would not save drawing at
+        least two rows.
+
+        >>> s = Screen()
+        >>> old = [[(None, None, B(c))] for c in "abcdef"]
+        >>> s._find_scroll(old, [[(None, None, B(c))] for c in "abcdxy"])
+        >>> s._find_scroll(old, [[(None, None, B(c))] for c in "acdexy"])
+        (1, 4, 1)
+        >>> s._find_scroll(old, [[(None, None, B(c))] for c in "xyabcf"])
+        (0, 4, -2)
+        """
+        # old row -> its position, or None when it appears more than once
+        positions = {}
+        for y, row in enumerate(old):
+            key = tuple(row)
+            if key in positions:
+                positions[key] = None
+            else:
+                positions[key] = y
+        votes = {}
+        for y, row in enumerate(new):
+            if row == old[y]:
+                continue
+            oy = positions.get(tuple(row))
+            if oy is not None:
+                votes[oy - y] = votes.get(oy - y, 0) + 1
+        best = None
+        best_saved = 1
+        n = len(new)
+        for lines in sorted(votes, key=votes.get, reverse=True)[:3]:
+            # longest run of rows moved by lines, counting the rows
+            # that scrolling would save from being drawn
+            start = max(0, -lines)
+            saved = 0
+            for y in range(start, min(n, n - lines) + 1):
+                if y < min(n, n - lines) and new[y] == old[y + lines]:
+                    if new[y] != old[y]:
+                        saved += 1
+                    continue
+                if saved > best_saved:
+                    best_saved = saved
+                    best = (start, y - 1, lines)
+                start = y + 1
+                saved = 0
+        if best is None:
+            return None
+        first, last, lines = best
+        if lines > 0:
+            return first, last + lines, lines
+        return first + lines, last, lines
+
+    def _scroll_escape(self, top, bottom, lines):
+        """
+        Return the escape sequence that scrolls rows top to bottom.
+        Rows are moved up when lines is positive and down when it is
+        negative, and the rows uncovered are cleared.
+        """
+        o = [escape.set_scroll_region(top, bottom),
+            escape.set_cursor_position(0, top)]
+        if lines > 0:
+            o.append(escape.delete_lines(lines))
+        else:
+            o.append(escape.insert_lines(-lines))
+        o.append(escape.RESET_SCROLL_REGION)
+        return "".join(o)
+
+    def _scroll_screen_buf(self, sb, maxcol, top, bottom, lines):
+        """
+        Return a copy of screen buffer sb with the scroll from
+        _scroll_escape() applied.  The terminal clears the rows it
+        uncovers with the default attributes sent just before the scroll.
+        """
+        blank = [(_DEFAULT_ATTRSPEC, None, B(" ") * maxcol)]
+        sb = list(sb)
+        if lines > 0:
+            sb[top:bottom+1] = sb[top+lines:bottom+1] + [blank] * lines
+        else:
+            sb[top:bottom+1] = [blank] * -lines + sb[top:bottom+1+lines]
+        return sb
+
+    def _diff_row(self, old, new):
+        """
+        Compare a row from the previous frame with its replacement.
+        Return None if they display the same, otherwise return a
+        (start_col, segments, cols) tuple where segments is the part
+        of new that must be drawn at start_col to update the row and
+        cols is its width in screen columns.
+
+        >>> util.set_encoding("utf-8")
+        >>> s = Screen()
+        >>> s._diff_row([('a', None, B('one two'))], [('a', None, B('one two'))])
+        >>> s._diff_row([('a', None, B('one two'))], [('a', None, B('one toe'))])
+        (5, [('a', None, 'oe')], 2)
+        >>> s._diff_row([('a', None, B('one')), ('b', None, B('two'))],
+        ...     [('a', None, B('one')), ('c', None, B('two'))])
+        (3, [('c', None, 'two')], 3)
+        """
+        if old == new:
+            return None
+        n = min(len(old), len(new))
+        # segments shared at the start and end of both rows
+        i = 0
+        col = 0
+        while i < n and old[i] == new[i]:
+            col += _seg_width(new[i])
+            i += 1
+        j = 0
+        while j < n - i and old[-1-j] == new[-1-j]:
+            j += 1
+        new_end = len(new) - j
+        old_end = len(old) - j
+        if i >= new_end:
+            return None
+        span = new[i:new_end]
+
+        # narrow the first and last changed segments to the characters
+        # that differ when they keep their attributes
+        prefix = 0
+        if i < old_end and old[i][:2] == new[i][:2] and \
+                _is_narrow(old[i][2]) and _is_narrow(new[i][2]):
+            prefix = _common_prefix(old[i][2], new[i][2])
+        suffix = 0
+        e, eo = new_end - 1, old_end - 1
+        if eo >= i and old[eo][:2] == new[e][:2] and \
+                _is_narrow(old[eo][2]) and _is_narrow(new[e][2]):
+            limit = min(len(new[e][2]) - prefix * (e == i),
+                len(old[eo][2]) - prefix * (eo == i))
+            suffix = min(_common_suffix(old[eo][2], new[e][2]), limit)
+        if prefix or suffix:
+            span = list(span)
+            a, cs, run = span[-1]
+            span[-1] = (a, cs, run[:len(run) - suffix])
+            a, cs, run = span[0]
+            span[0] = (a, cs, run[prefix:])
+        cols = 0
+        for seg in span:
+            cols += _seg_width(seg)
+        if not cols:
+            return None
+        return col + prefix, span, cols
 
 
     def _last_row(self, row):
@@ -770,6 +1129,61 @@ class Screen(BaseScreen, RealTerminal):
         self.setup_G1 = True
 
         
+    def _clear_escape_tables(self):
+        # AttrSpec value -> escape sequence
+        self._attrspec_escapes = {}
+        # escape sequence -> (foreground, settings, background) parameters
+        self._escape_sgr = {}
+        # (old escape sequence, new escape sequence) -> escape sequence
+        self._sgr_transitions = {}
+
+    def _attrspec_escape(self, a):
+        """
+        Return the escape sequence for AttrSpec instance a, memoized by
+        its value so each distinct attribute is only formatted once.
+        """
+        esc = self._attrspec_escapes.get(a._value)
+        if esc is None:
+            if len(self._attrspec_escapes) >= _ESCAPE_CACHE_LIMIT:
+                self._attrspec_escapes.clear()
+            esc = self._attrspec_escapes[a._value] = \
+                self._attrspec_to_escape(a)
+        return esc
+
+    def _sgr_transition(self, old, new):
+        """
+        Return the escape sequence that changes the terminal from
+        attribute escape sequence old to new.  When both have the same
+        settings (bold, underline, ..) only the colors that differ are
+        sent, otherwise new is returned unchanged.
+
+        >>> s = Screen()
+        >>> s.set_terminal_properties(colors=256)
+        >>> a2e = s._attrspec_to_escape
+        >>> blue, red = a2e(s.AttrSpec('', 'dark blue')), a2e(s.AttrSpec('', 'dark red'))
+        >>> s._sgr_transition(blue, red)
+        '\\x1b[41m'
+        >>> s._sgr_transition(blue, a2e(s.AttrSpec('#fea', 'dark blue')))
+        '\\x1b[38;5;229m'
+        >>> s._sgr_transition(blue, a2e(s.AttrSpec('bold', 'dark red')))
+        '\\x1b[0;39;1;41m'
+        """
+        key = (old, new)
+        esc = self._sgr_transitions.get(key)
+        if esc is not None:
+            return esc
+        esc = new
+        oldp = self._escape_sgr.get(old)
+        newp = self._escape_sgr.get(new)
+        if oldp is not None and newp is not None and oldp[1] == newp[1]:
+            params = [n for o, n in ((oldp[0], newp[0]), (oldp[2], newp[2]))
+                if o != n]
+            esc = escape.ESC + "[%sm" % ";".join(params)
+        if len(self._sgr_transitions) >= _ESCAPE_CACHE_LIMIT:
+            self._sgr_transitions.clear()
+        self._sgr_transitions[key] = esc
+        return esc
+
     def _attrspec_to_escape(self, a):
         """
         Convert AttrSpec instance a to an escape sequence for the terminal
@@ -782,12 +1196,14 @@ class Screen(BaseScreen, RealTerminal):
         >>> a2e(s.AttrSpec('#fea,underline', '#d0d'))
         '\\x1b[0;38;5;229;4;48;5;164m'
         """
+        bright = ""
         if a.foreground_high:
             fg = "38;5;%d" % a.foreground_number
         elif a.foreground_basic:
             if a.foreground_number > 7:
                 if self.bright_is_bold:
                     fg = "1;%d" % (a.foreground_number - 8 + 30)
+                    bright = "1;"
                 else:
                     fg = "%d" % (a.foreground_number - 8 + 90)
             else:
@@ -806,11 +1222,17 @@ class Screen(BaseScreen, RealTerminal):
                 bg = "%d" % (a.background_number + 40)
         else:
             bg = "49"
-        return escape.ESC + "[0;%s;%s%sm" % (fg, st, bg)
+        esc = escape.ESC + "[0;%s;%s%sm" % (fg, st, bg)
+        if len(self._escape_sgr) >= _ESCAPE_CACHE_LIMIT:
+            self._escape_sgr.clear()
+        # bold used for a bright foreground can only be turned off with
+        # the other settings, so it is kept with them
+        self._escape_sgr[esc] = (fg, bright + st, bg)
+        return esc
 
 
     def set_terminal_properties(self, colors=None, bright_is_bold=None,
-        has_underline=None):
+        has_underline=None, synchronized_update=None):
         """
         colors -- number of colors terminal supports (1, 16, 88 or 256)
             or None to leave unchanged
@@ -821,7 +1243,14 @@ class Screen(BaseScreen, RealTerminal):
         has_underline -- set to True if this terminal can use the
             underline setting, False if it cannot or None to leave
             unchanged
+        synchronized_update -- set to True if this terminal supports
+            synchronized output (mode 2026) so each frame is shown in
+            a single update, False if it does not or None to leave
+            unchanged
         """
+        if synchronized_update is not None:
+            self.synchronized_update = synchronized_update
+
         if colors is None:
             colors = self.colors
         if bright_is_bold is None:
@@ -839,6 +1268,7 @@ class Screen(BaseScreen, RealTerminal):
             
         self.clear()
         self._pal_escape = {}
+        self._clear_escape_tables()
         for p,v in self._palette.items():
             self._on_update_palette_entry(p, *v)
 
@@ -878,8 +1308,7 @@ class Screen(BaseScreen, RealTerminal):
 
         modify = ["%d;rgb:%02x/%02x/%02x" % (index, red, green, blue)
             for index, red, green, blue in entries]
-        self._term_output_file.write("\x1b]4;"+";".join(modify)+"\x1b\\")
-        self._term_output_file.flush()
+        self._write("\x1b]4;"+";".join(modify)+"\x1b\\")
 
 
     # shortcut for creating an AttrSpec with this screen object's
@@ -20,6 +20,8 @@
 #
 # Urwid web site: http://excess.org/urwid/
 
+import os
+import fcntl
 import unittest
 from doctest import DocTestSuite, ELLIPSIS, IGNORE_EXCEPTION_DETAIL
 
@@ -794,6 +796,16 @@ class TagMarkupTest(unittest.TestCase):
             assert restext == text, "got: %r expected: %r" % (restext, text)
             assert resattr == attr, "got: %r expected: %r" % (resattr, attr)
 
+    def test_cached(self):
+        markup = [('high', u"a"), u"b"]
+        text, attr = urwid.decompose_tagmarkup(markup)
+        attr.append(('extra', 1))
+        self.assertEqual(urwid.decompose_tagmarkup(list(markup)),
+            (u"ab", [('high', 1)]))
+        # equal byte string markup must not get the unicode result
+        text, attr = urwid.decompose_tagmarkup([('high', B("a")), B("b")])
+        self.assertEqual(type(text), type(B("")))
+
     def test_bad_tuple(self):
         self.assertRaises(urwid.TagMarkupException, lambda:
             urwid.decompose_tagmarkup((1,2,3)))
@@ -2741,6 +2753,720 @@ class CommonContainerTest(unittest.TestCase):
         f.set_focus_path(['body', 2]) # focus the overlay
         self.assertEquals(f.get_focus_path(), ['body', 2, 1])
 
+class RawDisplayDrawScreenTest(unittest.TestCase):
+    class FakeOutput(object):
+        def __init__(self):
+            self.writes = []
+        def write(self, data):
+            self.writes.append(data)
+        def flush(self):
+            pass
+
+    def setUp(self):
+        from urwid import raw_display
+        urwid.set_encoding("utf-8")
+        self.screen = raw_display.Screen()
+        self.out = self.FakeOutput()
+        self.screen._term_output_file = self.out
+        self.screen._started = True
+        self.screen._setup_G1_done = True
+
+    def draw(self, lines):
+        lb = urwid.ListBox(urwid.SimpleListWalker(
+            [urwid.Text(t) for t in lines]))
+        self.out.writes = []
+        self.screen.draw_screen((12, 3), lb.render((12, 3)))
+        assert len(self.out.writes) == 1, self.out.writes
+        return self.out.writes[0]
+
+    def test_unchanged_rows_skipped(self):
+        first = self.draw(["one", "two", "three"])
+        assert "three" in first
+        second = self.draw(["one", "two", "three"])
+        assert "one" not in second and "three" not in second
+
+    def test_changed_span_only(self):
+        self.draw(["one", "two", "three"])
+        out = self.draw(["one", "twx", "three"])
+        assert "\x1b[2;3H" in out and out.endswith("x"), repr(out)
+        assert "one" not in out and "three" not in out
+
+    def test_full_redraw_after_clear(self):
+        self.draw(["one", "two", "three"])
+        self.screen.clear()
+        out = self.draw(["one", "two", "three"])
+        assert "one" in out and "three" in out
+
+    def test_scroll_region(self):
+        self.draw(["one", "two", "three"])
+        out = self.draw(["two", "three", "four"])
+        assert "\x1b[1;3r\x1b[1;1H\x1b[1M\x1b[r" in out, repr(out)
+        assert "four" in out
+        assert "two" not in out and "three" not in out
+        out = self.draw(["one", "two", "three"])
+        assert "\x1b[1L" in out and "one" in out and "three" not in out
+
+    def test_scroll_in_blank_row(self):
+        # the terminal clears uncovered rows with the default colours
+        self.screen.register_palette_entry(None, 'white', 'dark blue')
+        self.draw(["one", "two", "three"])
+        out = self.draw(["two", "three", ""])
+        assert "\x1b[1M" in out, repr(out)
+        assert out.endswith("\x1b[3;1H\x1b[97;44m\x0f\x1b[K"), repr(out)
+
+    def test_synchronized_update(self):
+        self.screen.set_terminal_properties(synchronized_update=True)
+        out = self.draw(["one"])
+        assert out.startswith("\x1b[?2026h"), repr(out)
+        assert out.endswith("\x1b[?2026l"), repr(out)
+
+    def test_attr_transitions(self):
+        self.screen.set_terminal_properties(colors=256)
+        a, b = (self.screen.AttrSpec('#fea', 'dark blue'),
+            self.screen.AttrSpec('#fea', 'dark red'))
+        lb = urwid.ListBox(urwid.SimpleListWalker([urwid.Text([
+            (a, "ab"), (b, "cd"), (a, "ef"), ('undefined', "gh")])]))
+        self.screen.draw_screen((12, 1), lb.render((12, 1)))
+        out = self.out.writes[-1]
+        assert out.count("\x1b[0;") == 1, repr(out)
+        assert ("\x1b[38;5;229;44m\x0fab\x1b[41mcd\x1b[44mef\x1b[39;49mgh"
+            in out), repr(out)
+
+class ListBoxModifiedRangeTest(unittest.TestCase):
+    def setUp(self):
+        self.body = urwid.SimpleListWalker(
+            [urwid.Text(str(i)) for i in range(10)])
+        self.lbox = urwid.ListBox(self.body)
+        self.canvas = self.lbox.render((5, 3))
+
+    def test_change_below_view(self):
+        self.body.append(urwid.Text("new"))
+        self.body[8] = urwid.Text("x")
+        assert self.lbox.render((5, 3)) is self.canvas
+
+    def test_change_in_view(self):
+        self.body[1] = urwid.Text("x")
+        canvas = self.lbox.render((5, 3))
+        assert canvas is not self.canvas
+        assert canvas.text[1] == B("x    ")
+
+    def test_insert_above_bottom(self):
+        self.body.insert(2, urwid.Text("x"))
+        assert self.lbox.render((5, 3)).text[2] == B("x    ")
+
+    def test_end_of_list_visible(self):
+        body = urwid.SimpleListWalker([urwid.Text("0")])
+        lbox = urwid.ListBox(body)
+        lbox.render((5, 3))
+        body.append(urwid.Text("1"))
+        assert lbox.render((5, 3)).text[1] == B("1    ")
+
+    def test_append_scrolled_to_end(self):
+        body = urwid.SimpleFocusListWalker(
+            [urwid.Text(str(i)) for i in range(20)])
+        lbox = urwid.ListBox(body)
+        lbox.change_focus((5, 5), 19, 0)
+        canvas = lbox.render((5, 5))
+        assert canvas.text[0] == B("15   ")
+        body.append(urwid.Text("20"))
+        assert lbox.render((5, 5)).text == [
+            B("%-5d" % i) for i in range(16, 21)]
+
+    def test_focus_change(self):
+        self.body.set_focus(1)
+        assert self.lbox.render((5, 3)) is not self.canvas
+
+class IndexedListWalkerTest(unittest.TestCase):
+    def setUp(self):
+        self.body = urwid.IndexedListWalker(
+            [urwid.Text("%d\n-" % i) for i in range(1000)])
+        self.lbox = urwid.ListBox(self.body)
+
+    def test_offsets(self):
+        assert self.body.total_rows(5) == 2000
+        assert self.body.rows_before(500, 5) == 1000
+        assert self.body.position_at_row(1001, 5) == (500, 1)
+
+    def test_modified(self):
+        self.body.total_rows(5)
+        with self.body.batch():
+            del self.body[:10]
+            self.body.insert(0, urwid.Text("x"))
+        self.body.extend([urwid.Text("y")] * 3)
+        assert self.body.total_rows(5) == 1984
+        assert self.body.position_at_row(1981, 5) == (991, 0)
+
+    def test_end_home(self):
+        assert self.lbox.keypress((5, 3), 'end') is None
+        assert self.body.focus == 999
+        assert self.lbox.render((5, 3)).text[2] == B("-    ")
+        assert self.lbox.keypress((5, 3), 'home') is None
+        assert self.body.focus == 0
+        assert self.lbox.render((5, 3)).text[0] == B("0    ")
+
+    def test_end_unhandled(self):
+        lbox = urwid.ListBox(urwid.PollingListWalker([urwid.Text("a")]))
+        assert lbox.keypress((5, 3), 'end') == 'end'
+
+class ScrollBarTest(unittest.TestCase):
+    def setUp(self):
+        self.body = urwid.IndexedListWalker(
+            [urwid.Text(str(i)) for i in range(100)])
+        self.lbox = urwid.ListBox(self.body)
+
+    def test_scroll_position(self):
+        assert self.lbox.get_scroll_position((5, 10)) == (0, 100)
+        self.lbox.set_scroll_fraction((5, 10), 0.5)
+        assert self.lbox.get_scroll_position((5, 10)) == (45, 100)
+        assert self.lbox.render((5, 10)).text[0] == B("45   ")
+        self.lbox.set_scroll_position((5, 10), 1000)
+        assert self.lbox.get_scroll_position((5, 10)) == (90, 100)
+
+    def test_no_row_index(self):
+        lbox = urwid.ListBox(urwid.SimpleFocusListWalker([]))
+        self.assertRaises(urwid.ListBoxError,
+            lbox.get_scroll_position, (5, 10))
+
+    def test_render(self):
+        sb = urwid.ScrollBar(self.lbox, thumb_char=u'#', trough_char=u'|')
+        text = sb.render((6, 10)).text
+        assert text[0] == B("0    #"), text
+        assert text[1] == B("1    |"), text
+        sb.keypress((6, 10), 'end')
+        text = sb.render((6, 10)).text
+        assert text[8:] == [B("98   |"), B("99   #")], text
+
+    def test_body_grows_off_screen(self):
+        body = urwid.IndexedListWalker([urwid.Text(str(i)) for i in range(5)])
+        sb = urwid.ScrollBar(urwid.ListBox(body), thumb_char=u'#')
+        canv = sb.render((6, 5))
+        assert canv.text[4] == B("4    #"), canv.text
+        body.extend([urwid.Text(str(i)) for i in range(5, 100)])
+        assert sb.render((6, 5)).text[4] == B("4     ")
+
+    def test_default_thumb(self):
+        sb = urwid.ScrollBar(self.lbox)
+        try:
+            urwid.set_encoding("ascii")
+            assert sb.render((6, 10)).text[0] == B("0    #")
+        finally:
+            urwid.set_encoding("utf-8")
+        assert sb.render((6, 10)).text[0] == u"0    \u2588".encode("utf-8")
+
+    def test_mouse(self):
+        sb = urwid.ScrollBar(self.lbox)
+        assert sb.mouse_event((6, 10), 'mouse press', 1, 5, 9, True)
+        assert self.lbox.get_scroll_position((5, 10)) == (90, 100)
+
+    def test_layout_once(self):
+        calls = []
+        class CountingListBox(urwid.ListBox):
+            def calculate_visible(self, size, focus=False):
+                calls.append(size)
+                return urwid.ListBox.calculate_visible(self, size, focus)
+        sb = urwid.ScrollBar(CountingListBox(self.body), thumb_char=u'#')
+        sb.keypress((6, 10), 'page down')
+        del calls[:]
+        text = sb.render((6, 10)).text
+        assert len(calls) == 1, calls
+        assert text[:2] == [B("10    "), B("11   #")], text
+
+    def test_cursor(self):
+        calls = []
+        class CursorListBox(urwid.ListBox):
+            def get_pref_col(self, size):
+                calls.append(('get_pref_col', size))
+                return 2
+            def move_cursor_to_coords(self, size, col, row):
+                calls.append(('move_cursor_to_coords', size, col, row))
+                return True
+        sb = urwid.ScrollBar(CursorListBox(self.body))
+        assert sb.get_pref_col((6, 10)) == 2
+        assert sb.move_cursor_to_coords((6, 10), 3, 4)
+        # the scroll bar column moves the cursor to the last list column
+        assert sb.move_cursor_to_coords((6, 10), 5, 4)
+        assert sb.move_cursor_to_coords((6, 10), 'right', 0)
+        assert calls == [('get_pref_col', (5, 10)),
+            ('move_cursor_to_coords', (5, 10), 3, 4),
+            ('move_cursor_to_coords', (5, 10), 4, 4),
+            ('move_cursor_to_coords', (5, 10), 'right', 0)], calls
+        assert urwid.ScrollBar(self.lbox).get_pref_col((6, 10)) is None
+
+class ListBoxFixedRowsTest(unittest.TestCase):
+    class CountingText(urwid.Text):
+        calls = 0
+        def rows(self, size, focus=False):
+            ListBoxFixedRowsTest.CountingText.calls += 1
+            return urwid.Text.rows(self, size, focus)
+
+    def setUp(self):
+        self.CountingText.calls = 0
+        self.body = urwid.SimpleFocusListWalker(
+            [self.CountingText(str(i)) for i in range(100)])
+        self.body.fixed_rows = 1
+        self.lbox = urwid.ListBox(self.body)
+
+    def test_no_rows_calls(self):
+        self.lbox.render((5, 10))
+        self.lbox.keypress((5, 10), 'page down')
+        self.lbox.keypress((5, 10), 'down')
+        canvas = self.lbox.render((5, 10))
+        assert canvas.text[9] == B("20   "), canvas.text
+        assert self.CountingText.calls == 0
+
+    def test_wrong_fixed_rows(self):
+        self.body.fixed_rows = 2
+        self.assertRaises(urwid.ListBoxError, self.lbox.render, (5, 10))
+
+class TextRowTest(unittest.TestCase):
+    def setUp(self):
+        urwid.set_encoding("utf-8")
+
+    def test_matches_columns(self):
+        cells = [('fixed', 6, u"name"), ('weight', 2, u"long value here"),
+            u"été"]
+        cols = urwid.Columns([(t, n, urwid.Text(m, wrap='clip'))
+            for t, n, m in cells[:2]] + [urwid.Text(cells[2], wrap='clip')],
+            dividechars=1)
+        row = urwid.TextRow(cells, dividechars=1)
+        for maxcol in (30, 17):
+            assert (row.render((maxcol,)).text ==
+                cols.render((maxcol,)).text), maxcol
+
+    def test_focus_attr(self):
+        row = urwid.TextRow([(2, u"ab"), ('x', u"cd")], attr='a',
+            focus_attr='f')
+        c = row.render((4,), focus=True)
+        assert [a for a, cs, t in list(c.content())[0]] == ['f', 'x']
+        assert isinstance(c, urwid.TextCanvas)
+
+class CompositeCanvasReuseTest(unittest.TestCase):
+    def setUp(self):
+        a = urwid.TextCanvas([B("ab"), B("cd")], [[('x', 2)], [('y', 2)]])
+        b = urwid.TextCanvas([B("ef")], [[('y', 1)]])
+        self.child = urwid.CanvasCombine([(a, None, False), (b, None, False)])
+        self.child.finalize(urwid.Text(""), (2,), False)
+
+    def test_reference(self):
+        c = urwid.CompositeCanvas(self.child)
+        assert c.shards[0][1][0][5] is self.child
+        assert c.text == [B("ab"), B("cd"), B("ef")]
+        assert self.child._content_rows is not None
+
+    def test_trim_and_map(self):
+        c = urwid.CompositeCanvas(self.child)
+        c.trim(1)
+        c.pad_trim_left_right(-1, 1)
+        c.fill_attr_apply({'y': 'z'})
+        assert list(c.content()) == [
+            [('z', None, B("d")), (None, None, B(" "))],
+            [(None, None, B("f")), (None, None, B(" "))]]
+
+    def test_not_static(self):
+        class LiveCanvas(urwid.TextCanvas):
+            cacheable = False
+        a = LiveCanvas([B("ab")])
+        child = urwid.CanvasCombine([(a, None, False), (a, None, False)])
+        child.finalize(urwid.Text(""), (2,), False)
+        assert urwid.CompositeCanvas(child).shards is child.shards
+        list(child.content())
+        assert child._content_rows is None
+
+    def test_shards_join(self):
+        from urwid.canvas import shards_join
+        assert shards_join([[(2, ['a']), (1, ['b'])],
+            [(1, ['c']), (2, ['d'])]]) == [
+            (1, ['a', 'c']), (1, ['d']), (1, ['b'])]
+
+    def test_overlay_over_clipped_text(self):
+        urwid.set_encoding("utf-8")
+        w = urwid.Overlay(urwid.SolidFill(u'#'), urwid.Filler(urwid.Columns([
+            urwid.Text(u''), urwid.Text([('a', u'hello world'), u'e x'],
+            align='center', wrap='clip')]), 'top'),
+            'center', 6, 'top', 1)
+        c = w.render((26, 1))
+        # same as walking the shards of uncached canvases
+        self.assertEqual(c.text, [B("          ######lo worlde ")])
+
+    def test_narrow_rows_not_reused(self):
+        # unchecked text narrower than cols()
+        a = urwid.TextCanvas([B("ab")], maxcol=4, check_width=False)
+        b = urwid.TextCanvas([B("ef")], maxcol=2)
+        joined = urwid.CanvasJoin([(a, None, False, 4), (b, None, False, 2)])
+        joined.finalize(urwid.Text(u""), (6,), False)
+        self.assertFalse(joined._reusable())
+        expected = list(joined._shards_content())
+        wrapped = urwid.CompositeCanvas(joined)
+        self.assertEqual(list(wrapped.content()), expected)
+
+    def test_columns_with_fixed_listbox(self):
+        urwid.set_encoding("utf-8")
+        lbox = urwid.ListBox(urwid.SimpleListWalker([urwid.Text(t)
+            for t in [u"ab", u"\u4e2d\u6587x", u"abc def", u"q"]]))
+        w = urwid.Columns([urwid.Filler(urwid.Text(u"left")), (3, lbox)])
+        canvas = lbox.render((3, 4))
+        c = w.render((8, 4))
+        # wrapping the list box canvas does not assemble its rows
+        assert canvas._content_rows is None
+        self.assertEqual(c.text, [B("     ab "), B("left \xe4\xb8\xad "),
+            B("     \xe6\x96\x87x"), B("     abc")])
+
+class RenderProfilerTest(unittest.TestCase):
+    def setUp(self):
+        self.profiler = urwid.RenderProfiler()
+        self.profiler.enable()
+
+    def tearDown(self):
+        self.profiler.disable()
+
+    def test_nested_times(self):
+        t = urwid.Text(u"x")
+        urwid.Filler(urwid.Padding(t, left=1)).render((5, 3))
+        report = dict((r['widget'], r) for r in self.profiler.report())
+        assert sorted(report) == ['Filler', 'Padding', 'Text']
+        assert report['Filler']['time'] >= report['Padding']['time']
+        assert report['Filler']['cells'] == 15
+        for r in report.values():
+            assert 0 <= r['self_time'] <= r['time']
+
+    def test_dump(self):
+        import json
+        from StringIO import StringIO
+        urwid.Text(u"x").render((5,))
+        f = StringIO()
+        self.profiler.dump(f)
+        [r] = json.loads(f.getvalue())
+        assert sorted(r) == sorted(self.profiler.report_fields)
+
+    def test_overlay(self):
+        w = self.profiler.overlay(urwid.SolidFill(u'.'), width=50)
+        w.render((60, 10))
+        text = w.render((60, 10)).text
+        assert [l for l in text if B("SolidFill") in l], text
+
+    def test_render_error(self):
+        class Broken(urwid.Text):
+            def render(self, size, focus=False):
+                1/0
+        w = urwid.Filler(urwid.Padding(Broken(u"x")))
+        self.assertRaises(ZeroDivisionError, w.render, (5, 3))
+        assert not self.profiler._stack
+        urwid.Text(u"x").render((5,))
+        assert [r['widget'] for r in self.profiler.report()] == ['Text']
+
+class BenchmarkTest(unittest.TestCase):
+    def setUp(self):
+        urwid.set_encoding("utf-8")
+
+    def test_scenarios(self):
+        from urwid import benchmark
+        results = benchmark.run_benchmarks(scale=0.0001)
+        assert ([r['scenario'] for r in results] ==
+            [name for name, fn in benchmark.SCENARIOS])
+        for r in results:
+            assert r['frames'] > 1, r
+            assert r['bytes'] > 0, r
+
+    def test_resize_step(self):
+        from urwid import benchmark
+        r = benchmark.run_scenario('fill', urwid.SolidFill(u'x'),
+            [('resize', (10, 2))], size=(5, 1))
+        assert r['frames'] == 2
+        # a full redraw of both sizes: at least every cell once
+        assert r['bytes'] >= 5 + 20, r
+
+class KeyqueueTest(unittest.TestCase):
+    def setUp(self):
+        urwid.set_encoding("utf-8")
+
+    def codes(self, s):
+        return [ord(c) for c in s]
+
+    def test_paste_and_keys(self):
+        codes = self.codes("abc\x1b[5~\x1bx\x1b[1;5A\r\xc3\xa9\x1b")
+        processed, rest = urwid.escape.process_keyqueue_all(codes, False)
+        assert processed == ['a', 'b', 'c', 'page up', 'meta x',
+            'ctrl up', 'enter', u'\xe9', 'esc'], processed
+        assert rest == []
+
+    def test_mouse_flood(self):
+        drag = self.codes("\x1b[M@!!")
+        processed, rest = urwid.escape.process_keyqueue_all(
+            drag * 1000 + self.codes("\x1b[M#!"), True)
+        assert processed == [('mouse drag', 1, 0, 0)] * 1000
+        assert rest == self.codes("\x1b[M#!")
+
+    def test_incomplete(self):
+        for s in ["\x1b[1", "\x1b[12;4", "\xe2\x82", "\x1b"]:
+            processed, rest = urwid.escape.process_keyqueue_all(
+                self.codes("x" + s), True)
+            assert processed == ['x'], (s, processed)
+            assert rest == self.codes(s), (s, rest)
+
+    def test_cursor_position(self):
+        processed, rest = urwid.escape.process_keyqueue_all(
+            self.codes("\x1b[12;40R"), False)
+        assert processed == [("cursor position", 39, 11)]
+
+class AttrSpecCacheTest(unittest.TestCase):
+    def test_cached_parse(self):
+        a = urwid.AttrSpec('#fea,bold', 'g50')
+        b = urwid.AttrSpec('#fea,bold', 'g50')
+        assert a is not b and a == b and hash(a) == hash(b)
+        assert a != urwid.AttrSpec('#fea', 'g50')
+        assert a != 'body'
+        # modifying one instance does not affect the cached value
+        b.foreground = 'dark red'
+        assert b.foreground == 'dark red'
+        assert urwid.AttrSpec('#fea,bold', 'g50') == a
+
+    def test_errors_not_cached(self):
+        for i in range(2):
+            self.assertRaises(urwid.AttrSpecError, urwid.AttrSpec,
+                '#fea', 'default', 16)
+            self.assertRaises(urwid.AttrSpecError, urwid.AttrSpec,
+                'orange', 'default')
+
+    def test_88_colors(self):
+        assert (urwid.AttrSpec('#ccc', '', 88).foreground_number !=
+            urwid.AttrSpec('#ccc', '', 256).foreground_number)
+
+    def test_palette_shares_instances(self):
+        from urwid import raw_display
+        s = raw_display.Screen()
+        s.register_palette_entry('a', 'yellow', 'dark blue')
+        s.register_palette_entry('b', 'yellow', 'dark blue')
+        assert s._palette['a'][0] is s._palette['b'][0]
+
+class RawDisplayNonblockingTest(unittest.TestCase):
+    def setUp(self):
+        from urwid import raw_display
+        urwid.set_encoding("utf-8")
+        self.rd, wr = os.pipe()
+        self.out = os.fdopen(wr, 'w')
+        self.screen = raw_display.Screen()
+        self.screen._term_output_file = self.out
+        self.screen._started = True
+        self.screen._setup_G1_done = True
+        self.screen.set_output_nonblocking()
+        self.pending = []
+        urwid.connect_signal(self.screen, urwid.display_common.OUTPUT_PENDING,
+            lambda: self.pending.append(True))
+
+    def tearDown(self):
+        self.screen.set_output_nonblocking(False)
+        os.close(self.rd)
+        self.out.close()
+
+    def read_all(self):
+        fcntl.fcntl(self.rd, fcntl.F_SETFL, os.O_NONBLOCK)
+        data = []
+        try:
+            while True:
+                data.append(os.read(self.rd, 65536))
+        except OSError:
+            pass
+        return B("").join(data)
+
+    def fill_pipe(self):
+        for size in (4096, 1):
+            try:
+                while True:
+                    os.write(self.out.fileno(), B("x") * size)
+            except OSError:
+                pass
+
+    def canvas(self, text):
+        return urwid.Filler(urwid.Text(text)).render((12, 3))
+
+    def test_queue_and_drop(self):
+        self.fill_pipe()
+        first = self.canvas("first")
+        self.screen.draw_screen((12, 3), first)
+        assert self.pending and self.screen._output_queue
+        self.screen.draw_screen((12, 3), self.canvas("second"))
+        assert len(self.pending) == 2
+        assert self.screen._screen_buf_canvas is None
+        data = self.read_all()
+        assert B("first") not in data
+        # the queued frame is sent before the dropped one is redrawn
+        third = self.canvas("third")
+        self.screen.draw_screen((12, 3), third)
+        data = self.read_all()
+        assert data.index(B("first")) < data.index(B("third"))
+        assert not self.screen._output_queue
+        assert self.screen._screen_buf_canvas is third
+
+    def test_single_write(self):
+        self.screen.draw_screen((12, 3), self.canvas("frame"))
+        assert not self.pending
+        assert B("frame") in self.read_all()
+
+    def test_partial_flush(self):
+        self.fill_pipe()
+        self.screen.draw_screen((12, 3), self.canvas("frame"))
+        assert self.screen._output_queue
+        self.read_all()
+        self.screen.draw_screen((12, 3), self.canvas("frame"))
+        assert not self.screen._output_queue
+        assert self.screen._output_offset == 0
+
+    def test_terminal_flags_untouched(self):
+        master, slave = os.openpty()
+        out = os.fdopen(slave, 'w')
+        try:
+            self.screen.set_output_nonblocking(False)
+            self.screen._term_output_file = out
+            self.screen.set_output_nonblocking()
+            assert self.screen._output_fd != slave
+            assert not fcntl.fcntl(slave, fcntl.F_GETFL) & os.O_NONBLOCK
+            self.screen.draw_screen((12, 3), self.canvas("frame"))
+            self.screen.set_output_nonblocking(False)
+            assert self.screen._output_fd is None
+            assert B("frame") in os.read(master, 65536)
+        finally:
+            self.screen._term_output_file = self.out
+            out.close()
+            os.close(master)
+
+class CursesDrawScreenTest(unittest.TestCase):
+    class FakeWindow(object):
+        def __init__(self):
+            self.calls = []
+        def __getattr__(self, name):
+            return lambda *args: self.calls.append((name,) + args)
+
+    def setUp(self):
+        from urwid import curses_display
+        urwid.set_encoding("utf-8")
+        self.curses = curses_display.curses
+        self.doupdate = self.curses.doupdate
+        self.curses.doupdate = lambda: None
+        self.screen = curses_display.Screen()
+        self.screen.register_palette_entry('hi', 'yellow', 'dark blue',
+            'bold')
+        self.screen.s = self.window = self.FakeWindow()
+        self.screen._started = True
+        self.screen.cursor_state = "fixed"
+
+    def tearDown(self):
+        self.curses.doupdate = self.doupdate
+
+    def draw(self, lines):
+        self.window.calls = []
+        c = urwid.ListBox(urwid.SimpleListWalker([urwid.Text(t)
+            for t in lines])).render((8, 3))
+        self.screen.draw_screen((8, 3), c)
+        return self.window.calls
+
+    def test_unchanged_rows_skipped(self):
+        self.draw(["one", ("hi", "two"), "three"])
+        calls = self.draw(["one", ("hi", "two"), "four"])
+        moves = [c for c in calls if c[0] == 'move']
+        assert moves == [('move', 2, 0), ('move', 0, 0)], calls
+        assert ('addstr', B("four    ")) in calls
+        assert calls[-1] == ('noutrefresh',)
+
+    def test_attr_cache(self):
+        self.draw(["one", ("hi", "two"), "three"])
+        assert 'hi' in self.screen._curses_attrs
+        self.screen.register_palette_entry('hi', 'yellow', 'dark blue')
+        assert 'hi' not in self.screen._curses_attrs
+        calls = self.draw(["one", ("hi", "two"), "three"])
+        assert ('addstr', B("three   ")) in calls
+
+    def test_clear(self):
+        self.draw(["one", "two", "three"])
+        self.screen.clear()
+        calls = self.draw(["one", "two", "three"])
+        assert len([c for c in calls if c[0] == 'addstr']) == 3
+
+class RunLengthListTest(unittest.TestCase):
+    def test_subseg(self):
+        rl = urwid.util.RunLengthList([('a', 3), ('a', 2), ('b', 0),
+            ('c', 4)])
+        self.assertEqual(rl.runs(), [('a', 5), ('c', 4)])
+        self.assertEqual(rl.subseg(4, 7).runs(), [('a', 1), ('c', 2)])
+        self.assertEqual(rl.get_at(5), 'c')
+        self.assertEqual(rl.get_at(9), None)
+
+    def test_trimmed_content(self):
+        urwid.set_encoding("utf-8")
+        c = urwid.TextCanvas(["abcdefgh"], [[('a', 3), ('b', 5)]],
+            [[(None, 8)]])
+        self.assertEqual(list(c.content(2, 0, 3, 1)),
+            [[('a', None, "c"), ('b', None, "de")]])
+        self.assertEqual(list(c.content(0, 0, 8, 1)),
+            [[('a', None, "abc"), ('b', None, "defgh")]])
+
+    def test_empty_run(self):
+        c = urwid.TextCanvas(["abcd"], [[(None, 0), ('a', 3), (None, 1)]],
+            [[(None, 4)]])
+        self.assertEqual(list(c.content()),
+            [[('a', None, "abc"), (None, None, "d")]])
+        self.assertEqual(list(c.content(1, 0, 2, 1)), [[('a', None, "bc")]])
+
+    def test_trim_past_runs(self):
+        runs = urwid.util.RunLengthList([(('a', None), 3)])
+        self.assertEqual(urwid.canvas.trim_segments("abc", runs, 1, 5),
+            [('a', None, "bc"), (None, None, " ")])
+
+class StatusBarTest(unittest.TestCase):
+    def test_invalidate_on_change(self):
+        s = urwid.StatusBar([('count', u"%d", 4), ('msg', u"%s")])
+        invalidated = []
+        s._invalidate = lambda: invalidated.append(1)
+        s.set_fields(count=1, msg=u"a")
+        s.set_field('count', 1)
+        s.set_fields(msg=u"a")
+        self.assertEqual(len(invalidated), 1)
+        s.set_field('msg', u"b")
+        self.assertEqual(len(invalidated), 2)
+        self.assertEqual(s.get_field('msg'), u"b")
+        self.assertRaises(urwid.StatusBarError, lambda: s.set_field('x', 1))
+
+class BigTextTest(unittest.TestCase):
+    def test_shared_composition(self):
+        font = urwid.Thin3x3Font()
+        a = urwid.BigText([('x', u"12"), u"3"], font)
+        b = urwid.BigText([('x', u"12"), u"3"], font)
+        ca = a.render(())
+        cb = b.render(())
+        self.assertEqual(list(ca.content()), list(cb.content()))
+        self.assertEqual(ca.cols(), a.pack()[0])
+        b.set_text(u"123")
+        self.assertEqual(b.render(()).text, ca.text)
+        self.assertNotEqual(list(b.render(()).content()),
+            list(ca.content()))
+
+class BarGraphHistoryTest(unittest.TestCase):
+    def setUp(self):
+        urwid.set_encoding('utf-8')
+        self.g = urwid.BarGraph(['bg', 'fg'], None, {(1, 0): 'sm'})
+        self.g.set_history(4)
+        self.g.set_data([[1], [2], [3]], 4, [2])
+
+    def rows(self):
+        return list(self.g.render((4, 2)).content())
+
+    def test_append(self):
+        self.g.append_data([[4], [0]])
+        self.assertEqual(list(self.g.data[0]), [[2], [3], [4], [0]])
+        expected = urwid.BarGraph(['bg', 'fg'], None, {(1, 0): 'sm'})
+        expected.set_data([[2], [3], [4], [0]], 4, [2])
+        self.assertEqual(self.rows(), list(expected.render((4, 2)).content()))
+        self.assertEqual(len(self.g._columns), 4)
+
+    def test_set_bar(self):
+        before = self.rows()
+        self.g.set_bar(0, [3])
+        self.assertNotEqual(self.rows(), before)
+        self.g.set_bar(0, [1])
+        self.assertEqual(self.rows(), before)
+
+    def test_newest_shown(self):
+        self.g.append_data([[4]])
+        self.assertEqual(self.g.get_data((2, 2))[0], [[3], [4]])
 
 
 def test_all():
@@ -2801,24 +3527,55 @@ def test_all():
         WidgetSquishTest,
         TermTest,
         CommonContainerTest,
+        RawDisplayDrawScreenTest,
+        ListBoxModifiedRangeTest,
+        IndexedListWalkerTest,
+        ScrollBarTest,
+        ListBoxFixedRowsTest,
+        TextRowTest,
+        CompositeCanvasReuseTest,
+        RenderProfilerTest,
+        BenchmarkTest,
+        KeyqueueTest,
+        AttrSpecCacheTest,
+        RawDisplayNonblockingTest,
+        CursesDrawScreenTest,
+        RunLengthListTest,
+        StatusBarTest,
+        BigTextTest,
+        BarGraphHistoryTest,
         ]
     module_doctests = [
         urwid.widget,
         urwid.wimp,
         urwid.decoration,
         urwid.display_common,
+        urwid.escape,
         urwid.main_loop,
+        urwid.listbox,
         urwid.monitored_list,
+        urwid.profiler,
         urwid.raw_display,
         'urwid.split_repr', # override function with same name
         urwid.util,
         ]
+    skip_doctests = []
     tests = unittest.TestSuite()
     for t in unittests:
         tests.addTest(unittest.TestLoader().loadTestsFromTestCase(t))
+    try:
+        import asyncio
+    except ImportError:
+        try:
+            import trollius
+        except ImportError:
+            # AsyncioEventLoop can't be tested without either of them
+            skip_doctests.append('urwid.main_loop.AsyncioEventLoop.')
     for m in module_doctests:
-        tests.addTest(DocTestSuite(
-            m, optionflags=ELLIPSIS | IGNORE_EXCEPTION_DETAIL))
+        suite = DocTestSuite(
+            m, optionflags=ELLIPSIS | IGNORE_EXCEPTION_DETAIL)
+        tests.addTests([t for t in suite
+            if not [p for p in skip_doctests if t.id().startswith(p)]])
     return tests
 
 if __name__ == '__main__':
@@ -20,6 +20,9 @@
 #
 # Urwid web site: http://excess.org/urwid/
 
+from array import array
+from bisect import bisect_left, bisect_right
+
 from urwid import escape
 from urwid.compat import bytes
 
@@ -293,7 +296,7 @@ def rle_append_beginning_modify( rle, (a, r) ):
         if a == al:
             rle[0] = (a,run+r)
         else:
-            rle[0:0] = [(al, r)]
+            rle[0:0] = [(a, r)]
             
             
 def rle_append_modify( rle, (a, r) ):
@@ -363,11 +366,159 @@ def rle_factor( rle ):
     return rle1, rle2
 
 
+class RunLengthList(object):
+    """
+    Immutable run length encoded list stored as a list of values and an
+    array of the offsets where each run ends, so looking up an offset
+    or taking a slice is a binary search instead of a walk over the
+    runs.
+
+    >>> r = RunLengthList([('a', 3), ('b', 2), ('a', 4)])
+    >>> len(r), r.get_at(4), r.get_at(9)
+    (9, 'b', None)
+    >>> r.subseg(2, 6).runs()
+    [('a', 1), ('b', 2), ('a', 1)]
+    >>> (r.subseg(0, 3) + r.subseg(5, 9)).runs()
+    [('a', 7)]
+    """
+    __slots__ = ('values', 'ends')
+
+    def __init__(self, rle=()):
+        """
+        rle -- run length encoded list of (value, run) tuples
+        """
+        values = []
+        ends = array('l')
+        x = 0
+        for a, run in rle:
+            if not run:
+                continue
+            x += run
+            if values and values[-1] == a:
+                ends[-1] = x
+                continue
+            values.append(a)
+            ends.append(x)
+        self.values = values
+        self.ends = ends
+
+    @classmethod
+    def _from_arrays(cls, values, ends):
+        r = cls.__new__(cls)
+        r.values = values
+        r.ends = ends
+        return r
+
+    def __len__(self):
+        """Return the number of positions covered by the runs."""
+        if not self.ends:
+            return 0
+        return self.ends[-1]
+
+    def __iter__(self):
+        x = 0
+        for a, end in zip(self.values, self.ends):
+            yield a, end - x
+            x = end
+
+    def runs(self):
+        """Return a run length encoded list of (value, run) tuples."""
+        return list(self)
+
+    def get_at(self, pos):
+        """Return the value at offset pos, or None if out of range."""
+        if pos < 0:
+            return None
+        i = bisect_right(self.ends, pos)
+        if i >= len(self.values):
+            return None
+        return self.values[i]
+
+    def subseg(self, start, end):
+        """Return the runs covering offsets start to end."""
+        end = min(end, len(self))
+        if start >= end:
+            return RunLengthList()
+        i = bisect_right(self.ends, start)
+        j = bisect_left(self.ends, end)
+        ends = array('l', [e - start for e in self.ends[i:j]])
+        ends.append(end - start)
+        return RunLengthList._from_arrays(self.values[i:j + 1], ends)
+
+    def __add__(self, other):
+        """Join two run length encoded lists, merging the runs that
+        meet when they have the same value."""
+        if not other.values:
+            return self
+        if not self.values:
+            return other
+        offset = len(self)
+        merge = self.values[-1] == other.values[0]
+        values = self.values + other.values[merge:]
+        ends = array('l', self.ends)
+        if merge:
+            del ends[-1]
+        ends.extend([e + offset for e in other.ends])
+        return RunLengthList._from_arrays(values, ends)
+
+
 class TagMarkupException(Exception): pass
 
+# decomposed tag markup, cleared when it grows past _TAGMARKUP_CACHE_LIMIT
+# markup (lists as tuples) -> (text, tuple of attribute runs)
+_tagmarkup_cache = {}
+_TAGMARKUP_CACHE_LIMIT = 1024
+
 def decompose_tagmarkup(tm):
-    """Return (text string, attribute list) for tagmarkup passed."""
+    """Return (text string, attribute list) for tagmarkup passed.
+
+    Results for repeated markup are remembered, so callers that set the
+    same markup again (eg. a status line) don't walk it every time.
+
+    >>> decompose_tagmarkup(u"plain")
+    (u'plain', [])
+    >>> decompose_tagmarkup([('b', u"bold"), u" text"])
+    (u'bold text', [('b', 4)])
+    """
+    if isinstance(tm, (basestring, bytes)):
+        return tm, []
+    if type(tm) == tuple and len(tm) == 2 and isinstance(tm[1],
+            (basestring, bytes)):
+        attr, text = tm
+        if attr is None or not text:
+            return text, []
+        return text, [(attr, len(text))]
+
+    key = tm
+    if type(tm) == list:
+        key = tuple(tm)
+    try:
+        cached = _tagmarkup_cache.get(key)
+    except TypeError:
+        # unhashable markup, eg. nested lists
+        return _decompose_tagmarkup(tm)
+    # byte strings may compare equal to unicode strings, so only unicode
+    # results are kept and they are only used when the first string in
+    # the markup, which decides the type of the text, is unicode too
+    if cached is not None and _first_text_type(tm) == unicode:
+        return cached[0], list(cached[1])
+
+    text, al = _decompose_tagmarkup(tm)
+    if type(text) == unicode:
+        if len(_tagmarkup_cache) >= _TAGMARKUP_CACHE_LIMIT:
+            _tagmarkup_cache.clear()
+        _tagmarkup_cache[key] = (text, tuple(al))
+    return text, al
+
+def _first_text_type(tm):
+    while type(tm) in (list, tuple) and tm:
+        if type(tm) == tuple:
+            tm = tm[-1]
+        else:
+            tm = tm[0]
+    return type(tm)
 
+def _decompose_tagmarkup(tm):
     tl, al = _tagmarkup_recurse(tm, None)
     # join as unicode or bytes based on type of first element
     text = tl[0][:0].join(tl)
@@ -942,7 +942,7 @@ class TermCanvas(Canvas):
 
         while lines > 0:
             self.term.insert(row, self.empty_line())
-            self.term.pop(self.scrollregion_end)
+            self.term.pop(self.scrollregion_end + 1)
             lines -= 1
 
     def remove_lines(self, row=None, lines=1):
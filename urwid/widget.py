@@ -22,12 +22,14 @@
 from operator import attrgetter
 
 from urwid.util import (MetaSuper, decompose_tagmarkup, calc_width,
-    is_wide_char, move_prev_char, move_next_char)
+    calc_text_pos, is_wide_char, move_prev_char, move_next_char,
+    apply_target_encoding, rle_append_modify, rle_join_modify)
 from urwid.text_layout import calc_pos, calc_coords, shift_line
 from urwid import signals
 from urwid import text_layout
 from urwid.canvas import (CanvasCache, CompositeCanvas, SolidCanvas,
-    apply_text_layout)
+    TextCanvas, apply_text_layout)
+from urwid.compat import bytes
 from urwid.command_map import (command_map, CURSOR_LEFT, CURSOR_RIGHT,
     CURSOR_UP, CURSOR_DOWN, CURSOR_MAX_LEFT, CURSOR_MAX_RIGHT)
 from urwid.split_repr import split_repr, remove_defaults, python3_repr
@@ -125,6 +127,18 @@ def update_wrapper(new_fn, fn):
         pass # python2.3 ignore read-only attributes
 
 
+# profiler given every render call when set, see urwid.profiler
+_render_profiler = None
+
+def set_render_profiler(profiler):
+    """
+    Install profiler to be told about every widget render, or remove
+    it when profiler is None.  Used by
+    :meth:`urwid.profiler.RenderProfiler.enable`.
+    """
+    global _render_profiler
+    _render_profiler = profiler
+
 def cache_widget_render(cls):
     """
     Return a function that wraps the cls.render() method
@@ -135,15 +149,25 @@ def cache_widget_render(cls):
     def cached_render(self, size, focus=False):
         focus = focus and not ignore_focus
         canv = CanvasCache.fetch(self, cls, size, focus)
+        profiler = _render_profiler
         if canv:
+            if profiler is not None:
+                profiler.cache_hit(self, canv)
             return canv
 
-        canv = fn(self, size, focus=focus)
-        validate_size(self, size, canv)
-        if canv.widget_info:
-            canv = CompositeCanvas(canv)
-        canv.finalize(self, size, focus)
-        CanvasCache.store(cls, canv)
+        if profiler is not None:
+            profiler.enter()
+        canv = None
+        try:
+            canv = fn(self, size, focus=focus)
+            validate_size(self, size, canv)
+            if canv.widget_info:
+                canv = CompositeCanvas(canv)
+            canv.finalize(self, size, focus)
+            CanvasCache.store(cls, canv)
+        finally:
+            if profiler is not None:
+                profiler.leave(self, canv)
         return canv
     cached_render.original_fn = fn
     update_wrapper(cached_render, fn)
@@ -158,11 +182,19 @@ def nocache_widget_render(cls):
     if hasattr(fn, "original_fn"):
         fn = fn.original_fn
     def finalize_render(self, size, focus=False):
-        canv = fn(self, size, focus=focus)
-        if canv.widget_info:
-            canv = CompositeCanvas(canv)
-        validate_size(self, size, canv)
-        canv.finalize(self, size, focus)
+        profiler = _render_profiler
+        if profiler is not None:
+            profiler.enter()
+        canv = None
+        try:
+            canv = fn(self, size, focus=focus)
+            if canv.widget_info:
+                canv = CompositeCanvas(canv)
+            validate_size(self, size, canv)
+            canv.finalize(self, size, focus)
+        finally:
+            if profiler is not None:
+                profiler.leave(self, canv)
         return canv
     finalize_render.original_fn = fn
     update_wrapper(finalize_render, fn)
@@ -176,10 +208,18 @@ def nocache_widget_render_instance(self):
     """
     fn = self.render.original_fn
     def finalize_render(size, focus=False):
-        canv = fn(self, size, focus=focus)
-        if canv.widget_info:
-            canv = CompositeCanvas(canv)
-        canv.finalize(self, size, focus)
+        profiler = _render_profiler
+        if profiler is not None:
+            profiler.enter()
+        canv = None
+        try:
+            canv = fn(self, size, focus=focus)
+            if canv.widget_info:
+                canv = CompositeCanvas(canv)
+            canv.finalize(self, size, focus)
+        finally:
+            if profiler is not None:
+                profiler.leave(self, canv)
         return canv
     finalize_render.original_fn = fn
     update_wrapper(finalize_render, fn)
@@ -1091,6 +1131,286 @@ class Text(Widget):
         return (cols, text.count('\n') + 1)
 
 
+class TextRowError(TextError):
+    pass
+
+class TextRow(Widget):
+    """
+    a single line of text cells laid out like Columns of clipped Text
+    widgets, rendered directly to one TextCanvas
+
+    Use this in place of a Columns of Text widgets for list rows that
+    are always one line high, so each row costs one canvas instead of a
+    tree of them.
+    """
+    _sizing = frozenset([FLOW])
+
+    def __init__(self, cells, dividechars=0, attr=None, focus_attr=None):
+        """
+        :param cells: list of cells, each one of:
+
+            *text markup*
+              given an equal portion of the available columns (weight 1)
+
+            (``'weight'``, *weight*, *text markup*)
+              given a portion of the available columns by weight
+
+            (``'fixed'``, *columns*, *text markup*) or (*columns*, *text markup*)
+              given exactly *columns* screen columns
+
+        :param dividechars: blank columns between cells
+        :type dividechars: int
+        :param attr: display attribute applied to text with no attribute
+        :param focus_attr: replaces *attr* when the row is in focus
+
+        Text is clipped to the width of its cell and must not contain
+        newlines.
+
+        >>> TextRow([(4, u"ab"), u"cdef"]).render((7,)).text
+        [...'ab  cde']
+        >>> TextRow([u"a", (2, u"b"), u"c"], dividechars=1)
+        <TextRow flow widget cells=3>
+        """
+        self.__super.__init__()
+        self.dividechars = dividechars
+        self._attr = attr
+        self._focus_attr = focus_attr
+        self._cells = []
+        for cell in cells:
+            if type(cell) == tuple and len(cell) == 3:
+                t, width, markup = cell
+                if t == 'fixed':
+                    t = GIVEN
+                if t not in (GIVEN, WEIGHT):
+                    raise TextRowError("invalid cell type: %r" % (cell,))
+            elif type(cell) == tuple and type(cell[0]) == int:
+                (width, markup), t = cell, GIVEN
+            else:
+                t, width, markup = WEIGHT, 1, cell
+            text, attrib = decompose_tagmarkup(markup)
+            self._cells.append([t, width, text, attrib])
+        self._cache_line = None
+
+    def _repr_attrs(self):
+        return dict(self.__super._repr_attrs(), cells=len(self._cells))
+
+    def _invalidate(self):
+        self._cache_line = None
+        self.__super._invalidate()
+
+    def set_cell_text(self, index, markup):
+        """
+        Set the content of the cell at index.
+
+        >>> r = TextRow([(3, u"a"), u"b"])
+        >>> r.set_cell_text(1, u"cd"); r.get_cell_text(1)
+        (u'cd', [])
+        """
+        cell = self._cells[index]
+        cell[2], cell[3] = decompose_tagmarkup(markup)
+        self._invalidate()
+
+    def get_cell_text(self, index):
+        """
+        Return (*text*, *display attributes*) of the cell at index.
+        """
+        return tuple(self._cells[index][2:])
+
+    def set_attr(self, attr, focus_attr=None):
+        """Set the display attributes for text with no attribute."""
+        self._attr = attr
+        self._focus_attr = focus_attr
+        self._invalidate()
+
+    def column_widths(self, maxcol):
+        """
+        Return a list of cell widths for maxcol screen columns,
+        dividing the space left by fixed cells between weighted cells
+        the same way Columns does.  Cells that don't fit are clipped
+        instead of being hidden.
+
+        >>> TextRow([(5, u""), (u"weight", 2, u""), u""]).column_widths(14)
+        [5, 6, 3]
+        """
+        divide = self.dividechars
+        shared = maxcol + divide
+        widths = []
+        weighted = []
+        for i, (t, width, text, attrib) in enumerate(self._cells):
+            if t == GIVEN:
+                widths.append(width)
+                shared -= width + divide
+            else:
+                widths.append(0)
+                shared -= divide
+                weighted.append((width, i))
+        if shared > 0 and weighted:
+            wtotal = sum(weight for weight, i in weighted)
+            for weight, i in weighted:
+                width = int(float(shared) * weight / wtotal + 0.5)
+                widths[i] = width
+                shared -= width
+                wtotal -= weight
+        return widths
+
+    def rows(self, size, focus=False):
+        return 1
+
+    def _render_line(self, maxcol):
+        """
+        Return (text, attr, cs) for one line maxcol columns wide with
+        cell text that has no attribute left as None.
+        """
+        if self._cache_line and self._cache_line[0] == maxcol:
+            return self._cache_line[1]
+        line = []
+        linea = []
+        linec = []
+        col = 0
+        spaces = bytes().rjust
+        for i, width in enumerate(self.column_widths(maxcol)):
+            width = min(width, maxcol - col)
+            if i and self.dividechars and col < maxcol:
+                gap = min(self.dividechars, maxcol - col)
+                line.append(spaces(gap))
+                rle_append_modify(linea, (None, gap))
+                rle_append_modify(linec, (None, gap))
+                col += gap
+                width = min(width, maxcol - col)
+            if width <= 0:
+                continue
+            t, w, text, attrib = self._cells[i]
+            used = 0
+            offs = 0
+            for a, run in attrib + [(None, len(text))]:
+                seg = text[offs:offs + run]
+                offs += run
+                end, cols = calc_text_pos(seg, 0, len(seg), width - used)
+                if end:
+                    tseg, cs = apply_target_encoding(seg[:end])
+                    line.append(tseg)
+                    rle_append_modify(linea, (a, len(tseg)))
+                    rle_join_modify(linec, cs)
+                    used += cols
+                if end < len(seg) or offs >= len(text):
+                    break
+            if used < width:
+                line.append(spaces(width - used))
+                rle_append_modify(linea, (None, width - used))
+                rle_append_modify(linec, (None, width - used))
+            col += width
+        result = (bytes().join(line), linea, linec)
+        self._cache_line = (maxcol, result)
+        return result
+
+    def render(self, size, focus=False):
+        """
+        Render the row as a single TextCanvas.
+
+        >>> r = TextRow([(3, (u"x", u"ab")), u"cde"], attr=u"y")
+        >>> c = r.render((5,))
+        >>> c.text, list(c.content())[0]
+        ([...'ab cd'], [(u'x', None, ...'ab'), (u'y', None, ...' cd')])
+        """
+        (maxcol,) = size
+        text, attr, cs = self._render_line(maxcol)
+        a = self._attr
+        if focus and self._focus_attr is not None:
+            a = self._focus_attr
+        if a is not None:
+            attr = [(a if at is None else at, run) for at, run in attr]
+        return TextCanvas([text], [list(attr)], [list(cs)], maxcol=maxcol)
+
+
+class StatusBarError(TextRowError):
+    pass
+
+class StatusBar(TextRow):
+    """
+    a single line of named fields, such as counts, messages or progress,
+    that are updated in place
+
+    Setting a field only changes that field's cell and invalidates this
+    widget when its text actually changes, so the widgets around it keep
+    their canvases.  MainLoop redraws at most once per frame, so fields
+    may be updated as often as needed.
+    """
+    def __init__(self, fields, dividechars=1, attr=None):
+        """
+        :param fields: list of fields, each one of:
+
+            (*name*, *template*)
+              given an equal portion of the available columns
+
+            (*name*, *template*, *columns*)
+              given exactly *columns* screen columns
+
+            A field shows ``template % value`` once its value is set
+            and is blank until then.
+
+        :param dividechars: blank columns between fields
+        :type dividechars: int
+        :param attr: display attribute for the whole bar
+
+        >>> s = StatusBar([(u"count", u"%d selected", 12), (u"msg", u"%s")])
+        >>> s.set_field(u"count", 3)
+        >>> s.render((20,)).text
+        [...'3 selected          ']
+        >>> s.set_fields(count=4, msg=u"done")
+        >>> s.render((20,)).text
+        [...'4 selected   done   ']
+        """
+        cells = []
+        self._field_index = {}
+        self._templates = []
+        for i, field in enumerate(fields):
+            if len(field) == 3:
+                name, template, columns = field
+                cells.append((columns, u""))
+            else:
+                name, template = field
+                cells.append(u"")
+            self._field_index[name] = i
+            self._templates.append(template)
+        self._values = {}
+        self.__super.__init__(cells, dividechars, attr)
+
+    def set_field(self, name, value):
+        """
+        Set the value of the field name.
+        """
+        self.set_fields(**{name: value})
+
+    def set_fields(self, **values):
+        """
+        Set the values of any number of fields by name, invalidating
+        this widget once if any of their text changed.
+        """
+        changed = False
+        for name, value in values.items():
+            if name not in self._field_index:
+                raise StatusBarError("unknown field: %r" % (name,))
+            if name in self._values and self._values[name] == value:
+                continue
+            self._values[name] = value
+            i = self._field_index[name]
+            text, attrib = decompose_tagmarkup(self._templates[i] % (value,))
+            cell = self._cells[i]
+            if cell[2] != text or cell[3] != attrib:
+                cell[2], cell[3] = text, attrib
+                changed = True
+        if changed:
+            self._invalidate()
+
+    def get_field(self, name):
+        """
+        Return the value of the field name, or None if it is not set.
+        """
+        if name not in self._field_index:
+            raise StatusBarError("unknown field: %r" % (name,))
+        return self._values.get(name)
+
+
 class EditError(TextError):
     pass
 